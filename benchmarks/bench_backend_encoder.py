@@ -0,0 +1,78 @@
+# benchmarks/bench_backend_encoder.py
+# Paridad y latencia de los backends del encoder (BACKENDS_ENCODER): compara las similitudes oración x frase clave
+# de cada backend contra torch fp32 y mide el tiempo de encode en CPU, oración por oración y por lote.
+# Uso: python benchmarks/bench_backend_encoder.py [--backends torch int8 onnx] [--repeticiones 5]
+# Sale con código 1 si algún backend supera TOLERANCIA_SIMILITUD o cambia la frase clave más similar de una oración.
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+import torch
+from sentence_transformers import util
+from src import nlp_pipeline
+
+TOLERANCIA_SIMILITUD = 0.05 # diferencia absoluta máxima aceptada frente a fp32
+
+
+def cargar_oraciones_ejemplo():
+    oraciones = []
+    for ruta in sorted(glob.glob(os.path.join(nlp_pipeline.DATA_DIR, "*.txt"))):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            oraciones.extend(o.strip() for o in re.split(r"(?<=[.?!])\s+|\n+", f.read()) if o.strip())
+    return oraciones
+
+def medir_encode(modelo, oraciones, repeticiones):
+    modelo.encode(oraciones[:2], convert_to_tensor=True) # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for oracion in oraciones: modelo.encode([oracion], convert_to_tensor=True)
+    t_individual = (time.perf_counter() - inicio) / (repeticiones * len(oraciones))
+    inicio = time.perf_counter()
+    for _ in range(repeticiones): modelo.encode(oraciones, convert_to_tensor=True, batch_size=32)
+    t_lote = (time.perf_counter() - inicio) / (repeticiones * len(oraciones))
+    return t_individual, t_lote
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(nlp_pipeline.BACKENDS_ENCODER), choices=nlp_pipeline.BACKENDS_ENCODER)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    torch.set_num_threads(max(1, os.cpu_count() or 1))
+
+    frases = [f for cat in nlp_pipeline.CATEGORIAS_SIMILITUD for f in nlp_pipeline.FRASES_CLAVE_PARAMETROS[cat]]
+    limites = {}; inicio = 0
+    for cat in nlp_pipeline.CATEGORIAS_SIMILITUD:
+        limites[cat] = (inicio, inicio + len(nlp_pipeline.FRASES_CLAVE_PARAMETROS[cat])); inicio = limites[cat][1]
+    oraciones = cargar_oraciones_ejemplo() + frases[::5] # oraciones de data/ y una muestra de las propias frases clave
+
+    referencia = None; reporte = []; fallos = []
+    print(f"Oraciones: {len(oraciones)} | Frases clave: {len(frases)}")
+    print(f"{'Backend':<8} {'Carga (s)':>9} {'ms/oración':>11} {'ms/oración lote':>16} {'Máx |Δsim|':>11} {'Media |Δsim|':>13} {'Top-1 distinto':>15}")
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        inicio = time.perf_counter()
+        modelo, backend_cargado = nlp_pipeline.cargar_encoder(backend)
+        t_carga = time.perf_counter() - inicio
+        if backend_cargado != backend: print(f"{backend:<8} no disponible (se cargó {backend_cargado}); se omite."); continue
+        similitudes = util.cos_sim(modelo.encode(oraciones, convert_to_tensor=True), modelo.encode(frases, convert_to_tensor=True)).cpu().float()
+        t_individual, t_lote = medir_encode(modelo, oraciones, args.repeticiones)
+        if referencia is None: referencia = similitudes
+        diferencia = (similitudes - referencia).abs()
+        top1_distinto = sum(int((similitudes[:, i:f].argmax(dim=1) != referencia[:, i:f].argmax(dim=1)).sum()) for i, f in limites.values())
+        if diferencia.max() > TOLERANCIA_SIMILITUD or top1_distinto: fallos.append(backend)
+        print(f"{backend:<8} {t_carga:>9.2f} {t_individual * 1e3:>11.2f} {t_lote * 1e3:>16.2f} {float(diferencia.max()):>11.4f} {float(diferencia.mean()):>13.4f} {top1_distinto:>15}")
+        reporte.append({"backend": backend, "ms_oracion": round(t_individual * 1e3, 3), "ms_oracion_lote": round(t_lote * 1e3, 3),
+                        "max_diferencia_similitud": round(float(diferencia.max()), 5), "top1_distinto": top1_distinto})
+        del modelo
+
+    print(json.dumps(reporte, ensure_ascii=False))
+    if fallos: print(f"ADVERTENCIA: {fallos} superan la tolerancia de paridad ({TOLERANCIA_SIMILITUD}) o cambian la frase clave más similar.")
+    sys.exit(1 if fallos else 0)
@@ -0,0 +1,79 @@
+# benchmarks/bench_backends_ocr.py
+# Compara por imagen los backends de OCR de modules/ocr_backends.py: pytesseract (un proceso por imagen) frente a los
+# persistentes (tesserocr / libtesseract por ctypes) que cargan el idioma una sola vez. Informa el tiempo de
+# inicialización, ms por imagen y si el texto coincide con el de pytesseract. Las imágenes salen de dm-ai.zip y images/.
+# Uso: python benchmarks/bench_backends_ocr.py [--zip dm-ai.zip] [--lang spa] [--repeticiones 3]
+# Sale con código 1 si no hay ningún backend disponible.
+
+import io
+import os
+import sys
+import time
+import argparse
+import statistics
+import contextlib
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from modules.ocr_backends import BACKENDS_OCR, ErrorOCR, crear_backend_ocr
+from modules.image_preprocessor import preprocesar_imagen_ocr
+from benchmarks.bench_preprocesamiento_imagen import cargar_imagenes
+from benchmarks.reporte_escala_ocr import tesseract_disponible, diferencia_palabras
+
+
+def crear_backends(lang):
+    """{nombre: (backend, segundos de inicialización)} de los backends que se pueden usar aquí."""
+    backends = {}
+    for nombre in BACKENDS_OCR:
+        if nombre == "pytesseract" and not tesseract_disponible(): print("pytesseract: no disponible (no se encontró el ejecutable tesseract)"); continue
+        inicio = time.perf_counter()
+        try: backend = crear_backend_ocr(nombre, lang=lang); backend.verificar()
+        except (ImportError, ErrorOCR) as e: print(f"{nombre}: no disponible ({e})"); continue
+        backends[nombre] = (backend, time.perf_counter() - inicio)
+    return backends
+
+def medir(backend, imagen, repeticiones):
+    tiempos, texto = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        texto = backend.reconocer(imagen)
+        tiempos.append(time.perf_counter() - inicio)
+    return texto, statistics.median(tiempos)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backends de OCR: pytesseract frente a los persistentes, por imagen.")
+    parser.add_argument("--zip", default=os.path.join(PROJECT_ROOT_DIR, "dm-ai.zip"))
+    parser.add_argument("--lang", default="spa")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    imagenes = cargar_imagenes(args.zip)
+    if not imagenes: print(f"No hay imágenes en {args.zip} ni en images/."); sys.exit(1)
+    backends = crear_backends(args.lang)
+    if not backends: print("ERROR: Ningún backend de OCR disponible."); sys.exit(1)
+    referencia = "pytesseract" if "pytesseract" in backends else next(iter(backends))
+    for nombre, (_, t_inicio) in backends.items(): print(f"Inicialización {nombre}: {t_inicio * 1e3:.1f} ms")
+
+    totales = {nombre: 0.0 for nombre in backends}
+    print(f"{'Imagen':<30} " + " ".join(f"{f'ms {nombre}':>14}" for nombre in backends) + f"  Texto vs {referencia}")
+    for nombre_imagen, datos in imagenes.items():
+        imagen = preprocesar_imagen_ocr(io.BytesIO(datos))
+        textos, columnas = {}, []
+        for nombre, (backend, _) in backends.items():
+            with contextlib.redirect_stderr(io.StringIO()): textos[nombre], t = medir(backend, imagen, args.repeticiones)
+            totales[nombre] += t; columnas.append(f"{t * 1e3:>14.1f}")
+        comparaciones = []
+        for nombre, texto in textos.items():
+            if nombre == referencia: continue
+            if texto.strip() == textos[referencia].strip(): comparaciones.append(f"{nombre}: idéntico")
+            else:
+                similitud, distintas = diferencia_palabras(textos[referencia], texto)
+                comparaciones.append(f"{nombre}: {similitud:.3f} ({distintas} palabras distintas)")
+        print(f"{nombre_imagen[:30]:<30} " + " ".join(columnas) + "  " + ("; ".join(comparaciones) or "-"))
+
+    n = len(imagenes)
+    print("Promedio: " + " | ".join(f"{nombre} {totales[nombre] / n * 1e3:.1f} ms/imagen" for nombre in backends))
+    for _, (backend, _) in backends.items(): backend.cerrar()
+    sys.exit(0)
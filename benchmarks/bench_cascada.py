@@ -0,0 +1,54 @@
+# benchmarks/bench_cascada.py
+# Compara por documento la extracción normal (encoder siempre) con el modo cascada (reglas primero): latencia,
+# si se llamó al encoder, qué etapa decidió cada tasa/tiempo y si los parámetros coinciden con el modo normal.
+# Uso: python benchmarks/bench_cascada.py [archivo.txt ...]   (por defecto los .txt de data/)
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import contextlib
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src import nlp_pipeline
+
+
+def extraer_midiendo(texto, modo_cascada):
+    nlp_pipeline.CACHE_EMBEDDINGS_ORACIONES.limpiar() # sin cache para medir el costo real del encoder
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = nlp_pipeline.extraer_parametros_colas(texto, modo_cascada=modo_cascada)
+    return resultado, time.perf_counter() - inicio
+
+if __name__ == "__main__":
+    rutas = sys.argv[1:] or sorted(glob.glob(os.path.join(nlp_pipeline.DATA_DIR, "*.txt")))
+    textos = {}
+    for ruta in rutas:
+        with open(ruta, 'r', encoding='utf-8') as f: textos[os.path.basename(ruta)] = f.read()
+    if not textos: print("No hay textos para comparar."); sys.exit(1)
+
+    nlp_pipeline.cargar_modelos_y_precalcular_embeddings()
+    if not nlp_pipeline.modelos_cargados(): print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+
+    resumen = {"documentos": 0, "encoder_omitido": 0, "parametros_distintos": 0, "decisiones": {"reglas": 0, "embeddings": 0}}
+    t_normal_total = t_cascada_total = 0.0
+    print(f"{'Texto':<28} {'ms normal':>10} {'ms cascada':>11} {'Encoder':>8}  Niveles de decisión (cascada)")
+    for nombre, texto in textos.items():
+        resultado_normal, t_normal = extraer_midiendo(texto, False)
+        resultado_cascada, t_cascada = extraer_midiendo(texto, True)
+        t_normal_total += t_normal; t_cascada_total += t_cascada
+        distintos = [p for p in nlp_pipeline.PARAMETRO_POR_CATEGORIA_Y_TIPO.values()
+                     if resultado_normal["parametros_extraidos"][p] != resultado_cascada["parametros_extraidos"][p]]
+        resumen["documentos"] += 1; resumen["parametros_distintos"] += len(distintos)
+        resumen["encoder_omitido"] += not resultado_cascada["etapa_embeddings_ejecutada"]
+        for nivel in resultado_cascada["niveles_decision"].values(): resumen["decisiones"][nivel] += 1
+        print(f"{nombre[:28]:<28} {t_normal * 1e3:>10.1f} {t_cascada * 1e3:>11.1f} {'sí' if resultado_cascada['etapa_embeddings_ejecutada'] else 'no':>8}  {resultado_cascada['niveles_decision']}")
+        for p in distintos: print(f"    DIFERENCIA {p}: normal={resultado_normal['parametros_extraidos'][p]['valor']} cascada={resultado_cascada['parametros_extraidos'][p]['valor']}")
+
+    print(f"\nTiempo total: {t_normal_total * 1e3:.1f} ms normal, {t_cascada_total * 1e3:.1f} ms cascada")
+    print(json.dumps(resumen, ensure_ascii=False))
@@ -0,0 +1,217 @@
+# benchmarks/bench_extraccion_valores.py
+# Microbenchmark de extraer_valor_y_unidad_de_oracion: versión con patrones precompilados (src/nlp_pipeline.py)
+# contra la implementación de referencia que armaba listas, sets y regex en cada llamada. Antes de medir verifica
+# CASOS_REGRESION (números compuestos y cifras seguidas de "mil", que la referencia no reconoce).
+# Uso: python benchmarks/bench_extraccion_valores.py [repeticiones]
+# Sale con código 1 si hay discrepancias con la referencia o algún caso de regresión falla.
+
+import os
+import re
+import sys
+import glob
+import timeit
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src.nlp_pipeline import extraer_valor_y_unidad_de_oracion, indexar_palabras_clave, NUMEROS_EN_PALABRAS_MAP, PALABRAS_NUMERO_REGEX, DIGITAL_NUMERO_REGEX, DATA_DIR
+
+
+# --- Implementación de referencia (anterior a los patrones precompilados), solo para comparar ---
+def extraer_valor_y_unidad_referencia(texto_oracion_candidata):
+    unidades_tiempo_singular_list = ["segundo", "minuto", "hora", "día", "semana", "mes", "año"]
+    unidades_tiempo_plural_list = ["segundos", "minutos", "horas", "días", "semanas", "meses", "años"]
+    known_time_units_set = set(unidades_tiempo_singular_list + unidades_tiempo_plural_list)
+
+    UNIT_TIME_CAPTURE_REGEX = rf"({'|'.join(unidades_tiempo_singular_list + unidades_tiempo_plural_list)})"
+    entidades_comunes_list = ["cliente", "paciente", "unidad", "ítem", "item", "trabajo", "pedido", "vehículo", "tarea", "consulta", "llamada", "operacion", "evento"]
+    ENTITY_CAPTURE_REGEX = rf"({'|'.join([e + 's?' for e in entidades_comunes_list])})"
+
+    patron_tasa_completa = rf"\b{ENTITY_CAPTURE_REGEX}\b\s*(?:por|al|/)\s*\b{UNIT_TIME_CAPTURE_REGEX}\b"
+    patron_tiempo_por_entidad = rf"\b{UNIT_TIME_CAPTURE_REGEX}\b\s*(?:por|al|/)\s*\b{ENTITY_CAPTURE_REGEX}\b"
+    patron_por_unidad_tiempo = rf"(?:por|al)\s*\b{UNIT_TIME_CAPTURE_REGEX}\b"
+    patron_unidad_tiempo_sola = rf"\b{UNIT_TIME_CAPTURE_REGEX}\b"
+
+    posibles_numeros = []
+    for match_palabra in re.finditer(PALABRAS_NUMERO_REGEX, texto_oracion_candidata, re.IGNORECASE):
+        palabra = match_palabra.group(1).lower()
+        if palabra in NUMEROS_EN_PALABRAS_MAP:
+            posibles_numeros.append({
+                "valor": float(NUMEROS_EN_PALABRAS_MAP[palabra]), "texto": palabra,
+                "pos": match_palabra.span(), "es_palabra": True
+            })
+    for match_digital in re.finditer(DIGITAL_NUMERO_REGEX, texto_oracion_candidata):
+        texto_num = match_digital.group(0)
+        try:
+            posibles_numeros.append({
+                "valor": float(texto_num.replace(",", ".")), "texto": texto_num,
+                "pos": match_digital.span(), "es_palabra": False
+            })
+        except ValueError: continue
+
+    if not posibles_numeros: return None
+    posibles_numeros.sort(key=lambda x: x["pos"][0])
+
+    for num_info in posibles_numeros:
+        num_start_pos, num_end_pos = num_info["pos"]
+        texto_despues_num = texto_oracion_candidata[num_end_pos:].lstrip()
+
+        texto_antes_num_para_cada = texto_oracion_candidata[:num_start_pos].lower().rstrip()
+        if texto_antes_num_para_cada.endswith("cada"):
+            match_unidad_cada = re.match(patron_unidad_tiempo_sola, texto_despues_num, re.IGNORECASE)
+            if match_unidad_cada and match_unidad_cada.group(1): 
+                unidad_texto = match_unidad_cada.group(1).strip().lower()
+                if unidad_texto in known_time_units_set:
+                    pos_unidad_rel_start = texto_despues_num.find(match_unidad_cada.group(0))
+                    pos_unidad_abs_start = num_end_pos + pos_unidad_rel_start
+                    pos_unidad_abs_end = pos_unidad_abs_start + len(match_unidad_cada.group(0))
+                    return {
+                        "valor": num_info["valor"], "valor_texto": num_info["texto"],
+                        "unidad_texto": unidad_texto, "tipo_parametro": "tiempo",
+                        "posicion_valor": num_info["pos"],
+                        "posicion_unidad": (pos_unidad_abs_start, pos_unidad_abs_end)
+                    }
+        
+        match_tasa = re.match(patron_tasa_completa, texto_despues_num, re.IGNORECASE)
+        if match_tasa:
+            entidad_match = match_tasa.group(1).lower() if match_tasa.group(1) else None
+            unidad_tiempo_match = match_tasa.group(2).lower() if match_tasa.group(2) else None
+            if entidad_match and unidad_tiempo_match and \
+               unidad_tiempo_match in known_time_units_set and \
+               entidad_match not in known_time_units_set:
+                unidad_final = f"{entidad_match}/{unidad_tiempo_match}"
+                full_unit_match_str = match_tasa.group(0)
+                pos_unidad_inicio = num_end_pos + texto_despues_num.find(full_unit_match_str)
+                pos_unidad_fin = pos_unidad_inicio + len(full_unit_match_str)
+                return {"valor": num_info["valor"], "valor_texto": num_info["texto"], "unidad_texto": unidad_final,
+                        "tipo_parametro": "tasa", "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio, pos_unidad_fin)}
+        
+        match_tiempo_entidad = re.match(patron_tiempo_por_entidad, texto_despues_num, re.IGNORECASE)
+        if match_tiempo_entidad:
+            unidad_tiempo_match = match_tiempo_entidad.group(1).lower() if match_tiempo_entidad.group(1) else None
+            entidad_match = match_tiempo_entidad.group(2).lower() if match_tiempo_entidad.group(2) else None
+            if unidad_tiempo_match and entidad_match and \
+               unidad_tiempo_match in known_time_units_set and \
+               entidad_match not in known_time_units_set:
+                unidad_final = f"{unidad_tiempo_match}/{entidad_match}"
+                full_unit_match_str = match_tiempo_entidad.group(0)
+                pos_unidad_inicio = num_end_pos + texto_despues_num.find(full_unit_match_str)
+                pos_unidad_fin = pos_unidad_inicio + len(full_unit_match_str)
+                return {"valor": num_info["valor"], "valor_texto": num_info["texto"], "unidad_texto": unidad_final,
+                        "tipo_parametro": "tiempo", "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio, pos_unidad_fin)}
+
+        match_p_ut = re.match(patron_por_unidad_tiempo, texto_despues_num, re.IGNORECASE) 
+        match_ut_sola = re.match(patron_unidad_tiempo_sola, texto_despues_num, re.IGNORECASE)
+        
+        current_match_obj_p3 = None
+        ut_str_local_p3 = None 
+
+        if match_p_ut and match_p_ut.group(1): 
+            potential_time_unit = match_p_ut.group(1).lower()
+            if potential_time_unit in known_time_units_set:
+                current_match_obj_p3 = match_p_ut
+                ut_str_local_p3 = potential_time_unit
+        
+        if not current_match_obj_p3 and match_ut_sola and match_ut_sola.group(1): 
+            potential_time_unit = match_ut_sola.group(1).lower()
+            if potential_time_unit in known_time_units_set:
+                current_match_obj_p3 = match_ut_sola
+                ut_str_local_p3 = potential_time_unit
+        
+        if current_match_obj_p3 and ut_str_local_p3: 
+            tipo_param_final_p3 = "tiempo" 
+            unidad_texto_final_p3 = ut_str_local_p3
+            keywords_tasa_contexto_regex = r"\b(tasa|frecuencia|razón\s+de|ritmo\s+de|velocidad\s+de)\b"
+            is_contextual_rate = False
+            if re.search(keywords_tasa_contexto_regex, texto_oracion_candidata, re.IGNORECASE):
+                is_contextual_rate = True
+            if match_p_ut and current_match_obj_p3 == match_p_ut:
+                is_contextual_rate = True
+
+            if is_contextual_rate:
+                tipo_param_final_p3 = "tasa"
+                entidad_contextual_p3 = None
+                texto_antes_num_completo = texto_oracion_candidata[:num_start_pos].strip()
+                entidades_halladas_antes = list(re.finditer(rf"\b{ENTITY_CAPTURE_REGEX}\b", texto_antes_num_completo, re.IGNORECASE))
+                if entidades_halladas_antes and entidades_halladas_antes[-1].group(1):
+                    temp_ent = entidades_halladas_antes[-1].group(1).lower()
+                    if temp_ent not in known_time_units_set: 
+                        entidad_contextual_p3 = temp_ent
+                
+                if not entidad_contextual_p3 and (match_p_ut and current_match_obj_p3 == match_p_ut):
+                    text_between_num_and_por_al_unit = texto_despues_num[:current_match_obj_p3.start()].strip()
+                    if text_between_num_and_por_al_unit:
+                        match_entidad_intermedia = re.fullmatch(rf"\b{ENTITY_CAPTURE_REGEX}\b", text_between_num_and_por_al_unit, re.IGNORECASE)
+                        if match_entidad_intermedia and match_entidad_intermedia.group(1):
+                            temp_ent = match_entidad_intermedia.group(1).lower()
+                            if temp_ent not in known_time_units_set:
+                                entidad_contextual_p3 = temp_ent
+                
+                if entidad_contextual_p3:
+                    unidad_texto_final_p3 = f"{entidad_contextual_p3}/{ut_str_local_p3}"
+                else: 
+                    unidad_texto_final_p3 = f"entidad/{ut_str_local_p3}" 
+            
+            full_unit_match_str_p3 = current_match_obj_p3.group(0)
+            pos_unidad_inicio_p3 = num_end_pos + texto_despues_num.find(full_unit_match_str_p3)
+            pos_unidad_fin_p3 = pos_unidad_inicio_p3 + len(full_unit_match_str_p3)
+            return {"valor": num_info["valor"], "valor_texto": num_info["texto"],
+                    "unidad_texto": unidad_texto_final_p3, "tipo_parametro": tipo_param_final_p3,
+                    "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio_p3, pos_unidad_fin_p3)}
+    return None
+
+
+
+# (oración, (valor, unidad_texto, tipo_parametro) esperados o None)
+CASOS_REGRESION = [
+    ("Llegan 2 mil clientes por día", (2000.0, "clientes/día", "tasa")),
+    ("3 mil clientes por hora", (3000.0, "clientes/hora", "tasa")),
+    ("1.5 mil minutos", (1500.0, "minutos", "tiempo")),
+    ("Llegan 2 mil quinientos clientes por día", (2500.0, "clientes/día", "tasa")),
+    ("Llegan mil clientes por día", (1000.0, "clientes/día", "tasa")),
+    ("Llegan dos mil quinientos clientes por día", (2500.0, "clientes/día", "tasa")),
+    ("Se atienden treinta y cinco clientes por hora", (35.0, "clientes/hora", "tasa")),
+    ("Cada ciento veinte segundos llega un pedido", (120.0, "segundos", "tiempo")),
+]
+
+def verificar_casos_regresion():
+    """Oraciones de CASOS_REGRESION cuyo resultado no es el esperado: [(oración, esperado, obtenido)]."""
+    fallos = []
+    for oracion, esperado in CASOS_REGRESION:
+        resultado = extraer_valor_y_unidad_de_oracion(oracion)
+        obtenido = (resultado["valor"], resultado["unidad_texto"], resultado["tipo_parametro"]) if resultado else None
+        if obtenido != esperado: fallos.append((oracion, esperado, obtenido))
+    return fallos
+
+def cargar_oraciones_ejemplo():
+    oraciones = []
+    for ruta in sorted(glob.glob(os.path.join(DATA_DIR, "*.txt"))):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            oraciones.extend(o.strip() for o in re.split(r"(?<=[.?!])\s+|\n+", f.read()) if o.strip())
+    return oraciones
+
+def medir(funcion, oraciones, repeticiones):
+    return min(timeit.repeat(lambda: [funcion(o) for o in oraciones], number=repeticiones, repeat=5)) / (repeticiones * len(oraciones))
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    oraciones = cargar_oraciones_ejemplo()
+    if not oraciones: print(f"No hay oraciones en {DATA_DIR}."); sys.exit(1)
+
+    discrepancias = [o for o in oraciones if extraer_valor_y_unidad_referencia(o) != extraer_valor_y_unidad_de_oracion(o)]
+    print(f"Oraciones de data/: {len(oraciones)} | Discrepancias con la referencia: {len(discrepancias)}")
+    for o in discrepancias: print(f"  - \"{o}\"")
+    fallos_regresion = verificar_casos_regresion()
+    print(f"Casos de regresión: {len(CASOS_REGRESION) - len(fallos_regresion)}/{len(CASOS_REGRESION)} correctos")
+    for oracion, esperado, obtenido in fallos_regresion: print(f"  - \"{oracion}\": esperado {esperado}, obtenido {obtenido}")
+
+    t_ref = medir(extraer_valor_y_unidad_referencia, oraciones, repeticiones)
+    t_nuevo = medir(extraer_valor_y_unidad_de_oracion, oraciones, repeticiones)
+    # Sin el memo de indexar_palabras_clave: cada oración recorre el autómata de palabras clave
+    t_sin_memo = medir(lambda o: (indexar_palabras_clave.cache_clear(), extraer_valor_y_unidad_de_oracion(o))[1], oraciones, repeticiones)
+    print(f"Referencia:     {t_ref * 1e6:8.2f} µs/oración")
+    print(f"Precompilado:   {t_nuevo * 1e6:8.2f} µs/oración")
+    print(f"  sin memo:     {t_sin_memo * 1e6:8.2f} µs/oración")
+    print(f"Aceleración:    {t_ref / t_nuevo:8.2f}x")
+    sys.exit(1 if discrepancias or fallos_regresion else 0)
@@ -0,0 +1,74 @@
+# benchmarks/bench_memoria_resultados.py
+# Memoria de N resultados guardados (100k por defecto) como dicts anidados (la forma JSON de siempre) frente a los
+# registros con __slots__ de modules/registros_resultado.py, medida con tracemalloc. Los resultados se copian de
+# extracciones reales sobre data/*.txt: cada copia tiene sus propios contenedores (dicts/listas) y comparte los strings.
+# Uso: python benchmarks/bench_memoria_resultados.py [--resultados 100000]
+# Sale con código 1 si algún registro no reproduce exactamente el JSON del dict.
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+import tracemalloc
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src import nlp_pipeline
+from modules.registros_resultado import ResultadoExtraccion
+
+
+def copiar_contenedores(valor):
+    if isinstance(valor, dict): return {k: copiar_contenedores(v) for k, v in valor.items()}
+    if isinstance(valor, list): return [copiar_contenedores(v) for v in valor]
+    return valor
+
+def medir(construir, n):
+    """Bytes retenidos por la lista de `n` resultados que produce construir(i), y segundos que tomó armarla."""
+    tracemalloc.start(); base = tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+    resultados = [construir(i) for i in range(n)]
+    t = time.perf_counter() - inicio
+    bytes_retenidos = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return resultados, bytes_retenidos, t
+
+def comparar(referencias, n, etiqueta):
+    dicts, bytes_dicts, t_dicts = medir(lambda i: copiar_contenedores(referencias[i % len(referencias)]), n)
+    registros, bytes_registros, t_registros = medir(lambda i: ResultadoExtraccion.desde_dict(copiar_contenedores(referencias[i % len(referencias)])), n)
+    inicio = time.perf_counter()
+    for registro in registros: registro.to_dict()
+    t_to_dict = time.perf_counter() - inicio
+    iguales = all(json.dumps(d, ensure_ascii=False) == r.to_json() for d, r in zip(dicts[:len(referencias)], registros))
+    print(f"{etiqueta:<22} dicts: {bytes_dicts / 2**20:>8.1f} MB ({bytes_dicts / n:>6.0f} B/res, {t_dicts:.2f} s)  "
+          f"registros: {bytes_registros / 2**20:>8.1f} MB ({bytes_registros / n:>6.0f} B/res, {t_registros:.2f} s)  "
+          f"ahorro: {1 - bytes_registros / bytes_dicts:.0%}  to_dict(): {t_to_dict / n * 1e6:.2f} µs/res")
+    return iguales
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memoria de resultados como dicts anidados frente a registros con __slots__.")
+    parser.add_argument("--resultados", type=int, default=100_000)
+    args = parser.parse_args()
+
+    textos = []
+    for ruta in sorted(glob.glob(os.path.join(nlp_pipeline.DATA_DIR, "*.txt"))):
+        with open(ruta, 'r', encoding='utf-8') as f: textos.append(f.read())
+    if not textos: print("No hay textos en data/."); sys.exit(1)
+
+    nlp_pipeline.cargar_modelos_y_precalcular_embeddings()
+    if not nlp_pipeline.modelos_cargados(): print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        referencias = [nlp_pipeline.extraer_parametros_colas(texto) for texto in textos]
+    # Sin los candidatos de depuración queda solo lo que los registros compactan (parámetros, errores, banderas)
+    referencias_sin_debug = [dict(r, oraciones_candidatas_debug={"llegada": [], "servicio": []}) for r in referencias]
+
+    print(f"{args.resultados} resultados a partir de {len(textos)} extracciones reales")
+    iguales = comparar(referencias, args.resultados, "con candidatos debug")
+    iguales &= comparar(referencias_sin_debug, args.resultados, "sin candidatos debug")
+    if not iguales: print("ERROR: to_dict() no reproduce el JSON de la extracción."); sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,70 @@
+# benchmarks/bench_perfil_spacy.py
+# Compara los perfiles de carga de spaCy (PERFILES_CARGA_SPACY): tiempo de carga, tiempo de procesamiento por doc
+# y que la segmentación en oraciones y la salida de extraer_parametros_colas (con y sin modo cascada) sobre los textos
+# de data/ y sus variantes (los de stress_concurrencia.py) sean idénticas a las del perfil "completo".
+# Es la verificación de que "ligero" (el perfil por defecto, sin ner ni senter) no cambia la extracción; correrla al
+# tocar PERFILES_CARGA_SPACY, los patrones del Matcher o el modelo spaCy.
+# Uso: python benchmarks/bench_perfil_spacy.py [repeticiones]
+# Sale con código 1 si algún perfil sin diferencias esperadas ("completo", "ligero") cambia la salida.
+
+import io
+import os
+import sys
+import json
+import time
+import contextlib
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src import nlp_pipeline
+from benchmarks.stress_concurrencia import cargar_textos
+
+PERFILES_SIN_CAMBIO_ESPERADO = ["completo", "ligero"] # "minimo" cambia el parser por el senter: se informa pero no falla
+
+
+def activar_perfil(perfil):
+    inicio = time.perf_counter()
+    nlp_pipeline.NLP_SPACY = nlp_pipeline.cargar_modelo_spacy(perfil)
+    t_carga = time.perf_counter() - inicio
+    nlp_pipeline.construir_matchers_spacy()
+    return t_carga
+
+def medir_procesamiento(texto, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones): nlp_pipeline.NLP_SPACY(texto)
+    return (time.perf_counter() - inicio) / repeticiones
+
+def extraer_silencioso(texto, modo_cascada):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return json.dumps(nlp_pipeline.extraer_parametros_colas(texto, modo_cascada=modo_cascada), ensure_ascii=False, sort_keys=True, default=str)
+
+def salidas_perfil(textos):
+    """[(oraciones, salida sin cascada, salida con cascada)] por texto con el perfil activo."""
+    return [(nlp_pipeline.oraciones_de_doc(nlp_pipeline.NLP_SPACY(texto)), extraer_silencioso(texto, False), extraer_silencioso(texto, True)) for texto in textos]
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    ruta_ejemplo = os.path.join(nlp_pipeline.DATA_DIR, "ejemplo1.txt")
+    if not os.path.exists(ruta_ejemplo): print(f"No se encontró {ruta_ejemplo}."); sys.exit(1)
+    with open(ruta_ejemplo, 'r', encoding='utf-8') as f: texto = f.read()
+    textos = cargar_textos()
+
+    nlp_pipeline.cargar_modelos_y_precalcular_embeddings(perfil_spacy="completo")
+    if not nlp_pipeline.modelos_cargados(): print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+
+    salida_referencia, fallos = None, []
+    print(f"{'Perfil':<10} {'Componentes':<62} {'Carga (s)':>10} {'ms/doc':>9}  Salida ({len(textos)} textos x 2 modos)")
+    for perfil in nlp_pipeline.PERFILES_CARGA_SPACY:
+        t_carga = activar_perfil(perfil)
+        t_doc = medir_procesamiento(texto, repeticiones)
+        salida = salidas_perfil(textos)
+        if salida_referencia is None: salida_referencia = salida
+        distintos = sum(actual != referencia for actual, referencia in zip(salida, salida_referencia))
+        if distintos and perfil in PERFILES_SIN_CAMBIO_ESPERADO: fallos.append(perfil)
+        componentes = ",".join(nlp_pipeline.NLP_SPACY.pipe_names)
+        print(f"{perfil:<10} {componentes:<62} {t_carga:>10.2f} {t_doc * 1e3:>9.2f}  {'idéntica' if not distintos else f'DIFERENTE en {distintos} textos'}")
+
+    if fallos: print(f"ERROR: Los perfiles {fallos} cambiaron la salida de extracción."); sys.exit(1)
+    sys.exit(0)
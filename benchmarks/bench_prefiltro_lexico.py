@@ -0,0 +1,63 @@
+# benchmarks/bench_prefiltro_lexico.py
+# Compara la extracción con y sin el prefiltro léxico (PREFILTRO_LEXICO_ACTIVO) sobre los textos de data/ (o los
+# .txt indicados): oraciones que llegan al encoder, tiempo por texto y parámetros extraídos. También mide el recall
+# del prefiltro: de las oraciones en las que extraer_valor_y_unidad_de_oracion encuentra un valor, cuántas deja pasar.
+# Uso: python benchmarks/bench_prefiltro_lexico.py [archivo.txt ...]
+# Sale con código 1 si el prefiltro cambia algún parámetro extraído o descarta una oración con valor.
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import contextlib
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src import nlp_pipeline
+
+
+def extraer_con_prefiltro(texto, usar_prefiltro):
+    nlp_pipeline.PREFILTRO_LEXICO_ACTIVO = usar_prefiltro
+    nlp_pipeline.CACHE_EMBEDDINGS_ORACIONES.limpiar() # sin cache para medir el costo real del encoder
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = nlp_pipeline.extraer_parametros_colas(texto)
+    return resultado, time.perf_counter() - inicio
+
+if __name__ == "__main__":
+    rutas = sys.argv[1:] or sorted(glob.glob(os.path.join(nlp_pipeline.DATA_DIR, "*.txt")))
+    textos = {}
+    for ruta in rutas:
+        with open(ruta, 'r', encoding='utf-8') as f: textos[os.path.basename(ruta)] = f.read()
+    if not textos: print("No hay textos para comparar."); sys.exit(1)
+
+    nlp_pipeline.cargar_modelos_y_precalcular_embeddings()
+    if not nlp_pipeline.modelos_cargados(): print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+
+    total_oraciones = total_filtradas = con_valor = con_valor_filtradas = 0; diferencias = []; t_sin = t_con = 0.0
+    print(f"{'Texto':<28} {'Oraciones':>9} {'Al encoder':>10} {'ms sin':>8} {'ms con':>8}  Parámetros")
+    for nombre, texto in textos.items():
+        doc_spacy = nlp_pipeline.NLP_SPACY(texto)
+        oraciones = nlp_pipeline.oraciones_de_doc(doc_spacy)
+        filtradas = nlp_pipeline.oraciones_para_similitud(doc_spacy, usar_prefiltro_lexico=True)
+        con_valor_doc = [o for o in oraciones if nlp_pipeline.extraer_valor_y_unidad_de_oracion(o)]
+        total_oraciones += len(oraciones); total_filtradas += len(filtradas)
+        con_valor += len(con_valor_doc); con_valor_filtradas += sum(1 for o in con_valor_doc if o in filtradas)
+
+        resultado_sin, t_doc_sin = extraer_con_prefiltro(texto, False)
+        resultado_con, t_doc_con = extraer_con_prefiltro(texto, True)
+        t_sin += t_doc_sin; t_con += t_doc_con
+        iguales = resultado_sin["parametros_extraidos"] == resultado_con["parametros_extraidos"]
+        if not iguales: diferencias.append(nombre)
+        print(f"{nombre[:28]:<28} {len(oraciones):>9} {len(filtradas):>10} {t_doc_sin * 1e3:>8.1f} {t_doc_con * 1e3:>8.1f}  {'iguales' if iguales else 'DIFERENTES'}")
+
+    recall = con_valor_filtradas / con_valor if con_valor else 1.0
+    print(f"\nOraciones al encoder: {total_filtradas}/{total_oraciones} | Tiempo total: {t_sin * 1e3:.1f} ms sin prefiltro, {t_con * 1e3:.1f} ms con prefiltro")
+    print(f"Recall del prefiltro sobre oraciones con valor extraíble: {con_valor_filtradas}/{con_valor} ({recall:.2%})")
+    if diferencias: print(f"ERROR: El prefiltro cambió los parámetros extraídos en: {diferencias}")
+    print(json.dumps({"textos": len(textos), "documentos_con_diferencias": len(diferencias), "recall_prefiltro": round(recall, 4)}, ensure_ascii=False))
+    sys.exit(1 if diferencias or recall < 1.0 else 0)
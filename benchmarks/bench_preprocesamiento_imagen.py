@@ -0,0 +1,111 @@
+# benchmarks/bench_preprocesamiento_imagen.py
+# Compara por imagen el preprocesamiento para OCR anterior (Pillow paso a paso: resize, ImageEnhance.Contrast y
+# point con lambda) con el motor NumPy de modules/image_preprocessor.py: ms por imagen, pico de memoria y que la
+# imagen binaria resultante sea idéntica. Las imágenes salen de dm-ai.zip (sin descomprimir) y de images/.
+# El pico de memoria se mide en un proceso nuevo por imagen y motor: VmHWM de /proc tras reiniciarlo, con los buffers
+# grandes en mmap (MALLOC_MMAP_THRESHOLD_) para que se devuelvan al liberarse; solo en Linux.
+# Uso: python benchmarks/bench_preprocesamiento_imagen.py [--repeticiones 20] [--zip dm-ai.zip]
+# Sale con código 1 si algún motor produce una imagen distinta.
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import zipfile
+import argparse
+import statistics
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from modules.image_preprocessor import MOTORES_PREPROCESAMIENTO
+
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+
+def cargar_imagenes(ruta_zip):
+    """{nombre: bytes} de las imágenes del zip y de images/ (en memoria, para que el disco no entre en la medición)."""
+    imagenes = {}
+    if os.path.exists(ruta_zip):
+        with zipfile.ZipFile(ruta_zip) as archivo_zip:
+            for miembro in sorted(archivo_zip.namelist()):
+                if miembro.lower().endswith(EXTENSIONES_IMAGEN): imagenes[os.path.basename(miembro)] = archivo_zip.read(miembro)
+    for ruta in sorted(glob.glob(os.path.join(PROJECT_ROOT_DIR, "images", "*"))):
+        if ruta.lower().endswith(EXTENSIONES_IMAGEN):
+            with open(ruta, "rb") as f: imagenes.setdefault(os.path.basename(ruta), f.read())
+    return imagenes
+
+def como_array(imagen): return imagen if isinstance(imagen, np.ndarray) else np.array(imagen.convert('L'))
+
+def medir_tiempo(motor, datos, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        MOTORES_PREPROCESAMIENTO[motor](io.BytesIO(datos))
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+def leer_status_kb(campo):
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith(campo + ":"): return int(linea.split()[1])
+
+def medir_pico_en_proceso(motor, ruta_zip, nombre):
+    """Se ejecuta en el proceso hijo: calienta el motor con una imagen mínima, reinicia el pico de RSS y mide cuánto sube."""
+    datos = cargar_imagenes(ruta_zip)[nombre]
+    MOTORES_PREPROCESAMIENTO[motor](Image.new("RGBA", (8, 8)))
+    with open("/proc/self/clear_refs", "w") as f: f.write("5") # reinicia VmHWM al RSS actual
+    base_kb = leer_status_kb("VmRSS")
+    salida = MOTORES_PREPROCESAMIENTO[motor](io.BytesIO(datos))
+    print(json.dumps({"pico_bytes": (leer_status_kb("VmHWM") - base_kb) * 1024, "pixeles": salida.width * salida.height}))
+
+def medir_pico(motor, ruta_zip, nombre):
+    if not os.path.exists("/proc/self/clear_refs"): return None
+    entorno = dict(os.environ, MALLOC_MMAP_THRESHOLD_="65536")
+    proceso = subprocess.run([sys.executable, os.path.abspath(__file__), "--medir-pico", motor, "--zip", ruta_zip, "--imagen", nombre],
+                             capture_output=True, text=True, env=entorno)
+    if proceso.returncode != 0: return None
+    return json.loads(proceso.stdout.strip().splitlines()[-1])["pico_bytes"]
+
+def formatear_mb(bytes_): return f"{bytes_ / 2**20:.2f}" if bytes_ is not None else "n/d"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocesamiento para OCR: Pillow paso a paso frente al motor NumPy.")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--zip", default=os.path.join(PROJECT_ROOT_DIR, "dm-ai.zip"))
+    parser.add_argument("--sin-memoria", action="store_true", help="No lanza los procesos que miden el pico de memoria.")
+    parser.add_argument("--medir-pico", help=argparse.SUPPRESS)
+    parser.add_argument("--imagen", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.medir_pico: medir_pico_en_proceso(args.medir_pico, args.zip, args.imagen); sys.exit(0)
+
+    imagenes = cargar_imagenes(args.zip)
+    if not imagenes: print(f"No hay imágenes en {args.zip} ni en images/."); sys.exit(1)
+
+    distintas, totales = [], {motor: [0.0, 0] for motor in MOTORES_PREPROCESAMIENTO}
+    print(f"{'Imagen':<30} {'Tamaño':>10} {'ms pil':>8} {'ms numpy':>9} {'MB pil':>7} {'MB numpy':>9}  Salida")
+    for nombre, datos in imagenes.items():
+        tamano = Image.open(io.BytesIO(datos)).size
+        igual = np.array_equal(como_array(MOTORES_PREPROCESAMIENTO["pil"](io.BytesIO(datos))), como_array(MOTORES_PREPROCESAMIENTO["numpy"](io.BytesIO(datos))))
+        if not igual: distintas.append(nombre)
+        tiempos = {motor: medir_tiempo(motor, datos, args.repeticiones) for motor in MOTORES_PREPROCESAMIENTO}
+        picos = {motor: None if args.sin_memoria else medir_pico(motor, args.zip, nombre) for motor in MOTORES_PREPROCESAMIENTO}
+        for motor in MOTORES_PREPROCESAMIENTO:
+            totales[motor][0] += tiempos[motor]
+            if picos[motor] is not None: totales[motor][1] = max(totales[motor][1], picos[motor])
+        print(f"{nombre[:30]:<30} {f'{tamano[0]}x{tamano[1]}':>10} {tiempos['pil'] * 1e3:>8.2f} {tiempos['numpy'] * 1e3:>9.2f} "
+              f"{formatear_mb(picos['pil']):>7} {formatear_mb(picos['numpy']):>9}  {'idéntica' if igual else 'DIFERENTE'}")
+
+    n = len(imagenes)
+    print(f"Promedio: pil {totales['pil'][0] / n * 1e3:.2f} ms/imagen | numpy {totales['numpy'][0] / n * 1e3:.2f} ms/imagen "
+          f"({totales['pil'][0] / totales['numpy'][0]:.2f}x)")
+    if not args.sin_memoria: print(f"Pico máximo: pil {formatear_mb(totales['pil'][1])} MB | numpy {formatear_mb(totales['numpy'][1])} MB")
+    if distintas: print(f"ERROR: Salida distinta en {distintas}"); sys.exit(1)
+    sys.exit(0)
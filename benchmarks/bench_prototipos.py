@@ -0,0 +1,84 @@
+# benchmarks/bench_prototipos.py
+# Reporte de prototipos de frases clave (src/prototipos_frases_clave.py): para cada método y tamaño mide el tiempo de
+# puntuación (similitud + máximo por categoría) contra todas las frases y contra los prototipos, y compara las
+# oraciones candidatas y los parámetros extraídos sobre los textos de data/ (o los .txt indicados).
+# Uso: python benchmarks/bench_prototipos.py [--tamanos 4 8 16] [--umbral 0.6] [archivo.txt ...]
+
+import io
+import os
+import sys
+import glob
+import json
+import timeit
+import argparse
+import tempfile
+import contextlib
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src import nlp_pipeline
+from src.prototipos_frases_clave import construir_prototipos, guardar_prototipos, METODOS_PROTOTIPO
+
+
+def silencioso(funcion, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcion(*args, **kwargs)
+
+def medir_puntuacion(embeddings_oraciones, repeticiones=200):
+    apiladas = nlp_pipeline.FRASES_CLAVE_APILADAS
+    def puntuar():
+        similitudes = nlp_pipeline.util.cos_sim(embeddings_oraciones, apiladas.matriz)
+        for inicio, fin in apiladas.offsets.values(): similitudes[:, inicio:fin].max(dim=1)
+    return min(timeit.repeat(puntuar, number=repeticiones, repeat=5)) / repeticiones
+
+def candidatas_y_parametros(docs, textos, umbral):
+    candidatas = {nombre: silencioso(nlp_pipeline.identificar_oraciones_candidatas, doc, umbral) for nombre, doc in docs.items()}
+    parametros = {nombre: silencioso(nlp_pipeline.extraer_parametros_colas, texto, umbral)["parametros_extraidos"] for nombre, texto in textos.items()}
+    return ({nombre: {cat: {c["oracion_texto"] for c in lista} for cat, lista in cands.items()} for nombre, cands in candidatas.items()}, parametros)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--umbral", type=float, default=0.6)
+    parser.add_argument("textos", nargs="*")
+    args = parser.parse_args()
+
+    rutas = args.textos or sorted(glob.glob(os.path.join(nlp_pipeline.DATA_DIR, "*.txt")))
+    textos = {}
+    for ruta in rutas:
+        with open(ruta, 'r', encoding='utf-8') as f: textos[os.path.basename(ruta)] = f.read()
+    if not textos: print("No hay textos para comparar."); sys.exit(1)
+
+    silencioso(nlp_pipeline.cargar_modelos_y_precalcular_embeddings)
+    if not nlp_pipeline.modelos_cargados(): print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+    silencioso(nlp_pipeline.desactivar_prototipos_frases_clave)
+    docs = {nombre: nlp_pipeline.NLP_SPACY(texto) for nombre, texto in textos.items()}
+    oraciones = [o for doc in docs.values() for o in nlp_pipeline.oraciones_de_doc(doc)]
+    embeddings_oraciones = nlp_pipeline.codificar_oraciones(oraciones)
+
+    t_completo = medir_puntuacion(embeddings_oraciones)
+    candidatas_ref, parametros_ref = candidatas_y_parametros(docs, textos, args.umbral)
+    n_frases = {cat: len(nlp_pipeline.FRASES_CLAVE_PARAMETROS[cat]) for cat in nlp_pipeline.CATEGORIAS_SIMILITUD}
+    print(f"Oraciones: {len(oraciones)} | Frases clave: {n_frases} | Puntuación completa: {t_completo * 1e6:.1f} µs")
+    print(f"{'Método':<11} {'Tamaño':>6} {'µs':>8} {'Acel.':>6} {'Cand. +':>8} {'Cand. -':>8} {'Parám. distintos':>17}")
+
+    reporte = []
+    with tempfile.TemporaryDirectory() as directorio:
+        for metodo in METODOS_PROTOTIPO:
+            for tamano in args.tamanos:
+                ruta = os.path.join(directorio, f"prototipos_{metodo}_{tamano}.npz")
+                guardar_prototipos(silencioso(construir_prototipos, n_prototipos=tamano, metodo=metodo), ruta, metodo)
+                silencioso(nlp_pipeline.activar_prototipos_frases_clave, ruta)
+                t_prototipos = medir_puntuacion(embeddings_oraciones)
+                candidatas, parametros = candidatas_y_parametros(docs, textos, args.umbral)
+                silencioso(nlp_pipeline.desactivar_prototipos_frases_clave)
+
+                agregadas = sum(len(candidatas[n][c] - candidatas_ref[n][c]) for n in candidatas for c in candidatas[n])
+                quitadas = sum(len(candidatas_ref[n][c] - candidatas[n][c]) for n in candidatas for c in candidatas[n])
+                distintos = sum(parametros[n][p] != parametros_ref[n][p] for n in parametros for p in parametros[n])
+                print(f"{metodo:<11} {tamano:>6} {t_prototipos * 1e6:>8.1f} {t_completo / t_prototipos:>5.2f}x {agregadas:>8} {quitadas:>8} {distintos:>17}")
+                reporte.append({"metodo": metodo, "tamano": tamano, "aceleracion": round(t_completo / t_prototipos, 2),
+                                "candidatas_agregadas": agregadas, "candidatas_quitadas": quitadas, "parametros_distintos": distintos})
+    print(json.dumps(reporte, ensure_ascii=False))
@@ -0,0 +1,89 @@
+# benchmarks/reporte_escala_ocr.py
+# Reporte por imagen de la escala elegida según la resolución (modules/image_preprocessor.elegir_escala) frente al 2x
+# fijo anterior: altura x estimada, escala, píxeles que recibe Tesseract, tiempo de OCR con cada escala y diferencia
+# del texto reconocido. Las imágenes salen de dm-ai.zip y de images/ (como bench_preprocesamiento_imagen.py).
+# Uso: python benchmarks/reporte_escala_ocr.py [--zip dm-ai.zip] [--mostrar-diff] [--salida reporte.jsonl]
+# Sin Tesseract instalado solo se informan la altura x y la escala.
+
+import io
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import contextlib
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from PIL import Image
+from modules.image_preprocessor import ESCALA_FIJA_OCR, ALTURA_X_OBJETIVO_PX, elegir_escala, preprocesar_imagen_ocr
+from benchmarks.bench_preprocesamiento_imagen import cargar_imagenes
+
+
+def tesseract_disponible():
+    try:
+        import pytesseract # noqa: F401
+        from modules.tesseract_config import configure_tesseract
+    except ImportError: return False
+    with contextlib.redirect_stdout(io.StringIO()): return configure_tesseract()
+
+def ocr_midiendo(imagen, lang):
+    import pytesseract
+    inicio = time.perf_counter()
+    texto = pytesseract.image_to_string(imagen, lang=lang)
+    return texto, time.perf_counter() - inicio
+
+def diferencia_palabras(texto_a, texto_b):
+    """(similitud 0-1, palabras distintas) entre dos textos OCR, comparando palabra a palabra."""
+    palabras_a, palabras_b = texto_a.split(), texto_b.split()
+    comparador = difflib.SequenceMatcher(a=palabras_a, b=palabras_b, autojunk=False)
+    distintas = sum(max(i2 - i1, j2 - j1) for op, i1, i2, j1, j2 in comparador.get_opcodes() if op != "equal")
+    return comparador.ratio(), distintas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escala según resolución frente al 2x fijo, por imagen.")
+    parser.add_argument("--zip", default=os.path.join(PROJECT_ROOT_DIR, "dm-ai.zip"))
+    parser.add_argument("--lang", default="spa")
+    parser.add_argument("--mostrar-diff", action="store_true", help="Imprime el diff del texto OCR de cada imagen.")
+    parser.add_argument("--salida", help="Archivo JSONL con una línea por imagen.")
+    args = parser.parse_args()
+
+    imagenes = cargar_imagenes(args.zip)
+    if not imagenes: print(f"No hay imágenes en {args.zip} ni en images/."); sys.exit(1)
+    con_ocr = tesseract_disponible()
+    if not con_ocr: print("ADVERTENCIA: Tesseract no disponible; se informan solo la altura x y la escala elegida.")
+
+    print(f"Altura x objetivo: {ALTURA_X_OBJETIVO_PX:.0f} px | escala fija de referencia: {ESCALA_FIJA_OCR}x")
+    print(f"{'Imagen':<30} {'Tamaño':>9} {'DPI':>5} {'Altura x':>8} {'Escala':>6} {'Mpx auto':>8} {'Mpx 2x':>7} {'OCR ms auto':>11} {'OCR ms 2x':>9} {'Similitud':>9} {'Dif.':>5}")
+    filas, totales = [], {"auto": 0.0, "fija": 0.0}
+    for nombre, datos in imagenes.items():
+        original = Image.open(io.BytesIO(datos)); original.load()
+        escala, altura_x = elegir_escala(original.convert('L'))
+        fila = {"imagen": nombre, "tamano": list(original.size), "dpi": original.info.get("dpi"), "altura_x": altura_x, "escala": escala}
+        imagen_auto = preprocesar_imagen_ocr(original, escala=escala)
+        imagen_fija = preprocesar_imagen_ocr(original, escala=ESCALA_FIJA_OCR)
+        fila["megapixeles_auto"] = imagen_auto.width * imagen_auto.height / 1e6
+        fila["megapixeles_fija"] = imagen_fija.width * imagen_fija.height / 1e6
+        if con_ocr:
+            texto_auto, t_auto = ocr_midiendo(imagen_auto, args.lang)
+            texto_fija, t_fija = ocr_midiendo(imagen_fija, args.lang)
+            similitud, distintas = diferencia_palabras(texto_fija, texto_auto)
+            totales["auto"] += t_auto; totales["fija"] += t_fija
+            fila.update({"ocr_ms_auto": t_auto * 1e3, "ocr_ms_fija": t_fija * 1e3, "similitud": similitud, "palabras_distintas": distintas})
+        dpi = f"{fila['dpi'][0]:.0f}" if fila["dpi"] else "-"
+        ocr = (f"{fila['ocr_ms_auto']:>11.1f} {fila['ocr_ms_fija']:>9.1f} {fila['similitud']:>9.3f} {fila['palabras_distintas']:>5}" if con_ocr
+               else f"{'n/d':>11} {'n/d':>9} {'n/d':>9} {'n/d':>5}")
+        print(f"{nombre[:30]:<30} {f'{original.width}x{original.height}':>9} {dpi:>5} {altura_x if altura_x else '-':>8} {escala:>6.2f} "
+              f"{fila['megapixeles_auto']:>8.2f} {fila['megapixeles_fija']:>7.2f} {ocr}")
+        if con_ocr and args.mostrar_diff and fila["palabras_distintas"]:
+            for linea in difflib.unified_diff(texto_fija.splitlines(), texto_auto.splitlines(), "2x", "auto", lineterm="", n=0): print(f"    {linea}")
+        filas.append(fila)
+
+    if con_ocr: print(f"OCR total: auto {totales['auto']:.2f} s | 2x {totales['fija']:.2f} s")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            for fila in filas: f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        print(f"Reporte guardado en {args.salida}")
@@ -0,0 +1,100 @@
+# benchmarks/stress_concurrencia.py
+# Prueba de estrés de la extracción concurrente: muchos hilos piden los modelos a la vez (deben cargarse una sola
+# vez) y luego cientos de extracciones en paralelo se comparan con la salida secuencial de los mismos textos.
+# Uso: python benchmarks/stress_concurrencia.py [--hilos 16] [--extracciones 400] [--cascada]
+
+import os
+import sys
+import json
+import time
+import glob
+import random
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from src import nlp_pipeline
+from modules import trazas
+
+CONTEO_CARGAS = Counter()
+
+
+def contar_cargas(nombre, funcion):
+    def envoltura(*args, **kwargs):
+        CONTEO_CARGAS[nombre] += 1
+        return funcion(*args, **kwargs)
+    return envoltura
+
+def cargar_textos():
+    """Textos de data/ más variantes con otros valores, para que haya oraciones nuevas (fallos del cache) en cada corrida."""
+    base = []
+    for ruta in sorted(glob.glob(os.path.join(nlp_pipeline.DATA_DIR, "*.txt"))):
+        with open(ruta, 'r', encoding='utf-8') as f: base.append(f.read())
+    base.append("Un banco tiene 3 cajeros. Los clientes llegan cada 5 minutos. El tiempo de servicio es de 12 minutos por cliente. La disciplina es FIFO.")
+    variantes = [f"{texto}\nHay {n} servidores y llegan {n * 3} clientes por hora." for texto in base for n in (2, 4, 7)]
+    return base + variantes
+
+def serializar(resultado): return json.dumps(resultado, ensure_ascii=False, sort_keys=True, default=str)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extracciones concurrentes contra la salida secuencial.")
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--extracciones", type=int, default=400)
+    parser.add_argument("--cascada", action="store_true", help="Usa el modo cascada en todas las extracciones.")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--trazas", default=os.devnull, help="Archivo JSONL de trazas (por defecto se descartan, pero los spans se generan igual).")
+    args = parser.parse_args()
+    trazas.configurar_trazas(args.trazas, nivel="error") # las advertencias de cada extracción no ensucian la consola
+
+    textos = cargar_textos()
+    nlp_pipeline.cargar_modelo_spacy = contar_cargas("spacy", nlp_pipeline.cargar_modelo_spacy)
+    nlp_pipeline.cargar_encoder = contar_cargas("encoder", nlp_pipeline.cargar_encoder)
+    errores = []
+
+    def extraer(texto):
+        try: return serializar(nlp_pipeline.extraer_parametros_colas(texto, modo_cascada=args.cascada))
+        except Exception as e: errores.append(f"{type(e).__name__}: {e}"); return None
+
+    # 1) Primer uso concurrente: todos los hilos arrancan juntos sin modelos cargados
+    barrera = threading.Barrier(args.hilos)
+    def primer_uso(i):
+        barrera.wait()
+        return extraer(textos[i % len(textos)])
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.hilos) as ejecutor: salidas_primer_uso = list(ejecutor.map(primer_uso, range(args.hilos)))
+    t_primer_uso = time.perf_counter() - inicio
+    print(f"Primer uso con {args.hilos} hilos: {t_primer_uso:.2f} s | cargas spaCy: {CONTEO_CARGAS['spacy']} | cargas encoder: {CONTEO_CARGAS['encoder']}")
+    if not nlp_pipeline.modelos_cargados(): print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+
+    # 2) Referencia secuencial (cache de embeddings vacío, igual que en la fase concurrente)
+    nlp_pipeline.CACHE_EMBEDDINGS_ORACIONES.limpiar()
+    inicio = time.perf_counter()
+    referencia = {texto: extraer(texto) for texto in textos}
+    t_secuencial = (time.perf_counter() - inicio) / len(textos)
+
+    # 3) Extracciones concurrentes sobre un orden aleatorio de los textos
+    nlp_pipeline.CACHE_EMBEDDINGS_ORACIONES.limpiar()
+    rng = random.Random(args.semilla)
+    tareas = [rng.choice(textos) for _ in range(args.extracciones)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.hilos) as ejecutor: salidas = list(ejecutor.map(extraer, tareas))
+    t_concurrente = time.perf_counter() - inicio
+    # 4) Entrada concurrente de nlp_pipeline
+    salidas_en_hilos = [serializar(r) for r in nlp_pipeline.extraer_parametros_colas_en_hilos(textos, n_hilos=args.hilos, modo_cascada=args.cascada)]
+
+    distintas = sum(salida != referencia[texto] for texto, salida in zip(tareas, salidas))
+    distintas += sum(salida != referencia[texto] for texto, salida in zip(textos, salidas_primer_uso))
+    distintas += sum(salida != referencia[texto] for texto, salida in zip(textos, salidas_en_hilos))
+    print(f"Textos distintos: {len(textos)} | extracciones concurrentes: {len(tareas)} + {args.hilos} (primer uso) + {len(textos)} (extraer_parametros_colas_en_hilos)")
+    print(f"Secuencial: {t_secuencial * 1e3:.1f} ms/texto | concurrente ({args.hilos} hilos): {t_concurrente / len(tareas) * 1e3:.1f} ms/texto efectivo")
+    print(f"Salidas distintas de la secuencial: {distintas} | excepciones: {len(errores)}")
+    for error in sorted(set(errores))[:5]: print(f"  - {error}")
+    print(f"Cache de embeddings: {nlp_pipeline.obtener_estadisticas_cache_embeddings()}")
+    fallo = distintas or errores or CONTEO_CARGAS["spacy"] != 1 or CONTEO_CARGAS["encoder"] != 1
+    if fallo: print("ERROR: La extracción concurrente no es equivalente a la secuencial o los modelos se cargaron más de una vez.")
+    sys.exit(1 if fallo else 0)
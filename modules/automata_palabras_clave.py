@@ -0,0 +1,145 @@
+import re
+from collections import deque
+
+# Secuencias maximales de caracteres de palabra: el autómata avanza palabra a palabra, así que los hits siempre
+# respetan límites de palabra (equivalente a \b...\b) y la segmentación la hace el motor de `re` en C.
+RE_PALABRA_AUTOMATA = re.compile(r"\w+")
+# Separadores válidos dentro de un número compuesto: "ciento veinte", "treinta y cinco"
+RE_SEPARADOR_NUMERO = re.compile(r"\s+")
+RE_SEPARADOR_NUMERO_Y = re.compile(r"\s+y\s+", re.IGNORECASE)
+
+class AutomataPalabrasClave:
+    """
+    Autómata Aho-Corasick cuyo alfabeto son palabras normalizadas (minúsculas): todas las palabras y frases registradas
+    se encuentran en una sola pasada sobre el texto, con offsets de caracteres del texto original.
+    Opcionalmente también emite las secuencias de dígitos como hits de tipo `tipo_digitos`.
+
+    Uso:
+        automata = AutomataPalabrasClave()
+        automata.agregar("línea de ensamblaje", "servidor")
+        automata.construir()
+        automata.buscar("Hay 2 líneas de ensamblaje y una línea de ensamblaje extra")
+        # [(33, 52, "servidor", "línea de ensamblaje", None)]
+    """
+    def __init__(self):
+        self._transiciones = [{}]
+        self._fallo = [0]
+        self._salidas = [[]] # por estado: [(n_palabras, tipo, patron, valor)]
+        self._construido = False
+        self.n_patrones = 0
+
+    def __len__(self):
+        return self.n_patrones
+
+    def agregar(self, patron, tipo, valor=None):
+        """
+        Registra una palabra o frase. Un mismo patrón puede registrarse con varios tipos.
+
+        Args:
+            patron (str): Palabra o frase a buscar (la puntuación entre palabras se ignora).
+            tipo (str): Categoría del hit (p. ej. "numero", "unidad_tiempo").
+            valor (any, optional): Dato asociado que se devuelve con cada hit.
+        """
+        palabras = [p.lower() for p in RE_PALABRA_AUTOMATA.findall(patron)]
+        if not palabras: return
+        estado = 0
+        for palabra in palabras:
+            siguiente = self._transiciones[estado].get(palabra)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones.append({}); self._fallo.append(0); self._salidas.append([])
+                self._transiciones[estado][palabra] = siguiente
+            estado = siguiente
+        self._salidas[estado].append((len(palabras), tipo, " ".join(palabras), valor))
+        self.n_patrones += 1
+        self._construido = False
+
+    def agregar_varios(self, patrones, tipo, valores=None):
+        """agregar() para cada patrón de una lista (o de un dict {patrón: valor} si `valores` es None)."""
+        if valores is None and isinstance(patrones, dict): patrones, valores = list(patrones), list(patrones.values())
+        for i, patron in enumerate(patrones): self.agregar(patron, tipo, valores[i] if valores is not None else None)
+        return self
+
+    def construir(self):
+        """Calcula los enlaces de fallo (BFS) y hereda en cada estado las salidas de su sufijo más largo."""
+        cola = deque(self._transiciones[0].values())
+        while cola:
+            estado = cola.popleft()
+            for palabra, siguiente in self._transiciones[estado].items():
+                cola.append(siguiente)
+                fallo = self._fallo[estado]
+                while fallo and palabra not in self._transiciones[fallo]: fallo = self._fallo[fallo]
+                destino = self._transiciones[fallo].get(palabra, 0)
+                self._fallo[siguiente] = destino if destino != siguiente else 0
+                self._salidas[siguiente] = self._salidas[siguiente] + self._salidas[self._fallo[siguiente]]
+        self._construido = True
+        return self
+
+    def buscar(self, texto, tipo_digitos=None):
+        """
+        Recorre el texto una vez y devuelve los hits en orden de fin (y, con igual fin, del más largo al más corto).
+
+        Args:
+            texto (str): Texto a indexar.
+            tipo_digitos (str, optional): Si se indica, cada secuencia de palabra formada solo por dígitos se emite con
+                                          este tipo y su valor entero.
+
+        Returns:
+            list: [(inicio, fin, tipo, patron, valor)] con offsets de caracteres en `texto`.
+        """
+        if not self._construido: self.construir()
+        transiciones, fallo, salidas = self._transiciones, self._fallo, self._salidas
+        # Minúsculas de una vez si no cambian la longitud (offsets válidos); si no, palabra por palabra
+        texto_min = texto.lower()
+        por_palabra = len(texto_min) != len(texto)
+        hits = []; inicios = []; estado = 0
+        for m in RE_PALABRA_AUTOMATA.finditer(texto if por_palabra else texto_min):
+            palabra = m.group(); inicio = m.start()
+            inicios.append(inicio)
+            if por_palabra: palabra = palabra.lower()
+            while estado and palabra not in transiciones[estado]: estado = fallo[estado]
+            estado = transiciones[estado].get(palabra, 0)
+            if not estado:
+                if tipo_digitos is not None and palabra.isdecimal(): hits.append((inicio, m.end(), tipo_digitos, palabra, int(palabra)))
+                continue
+            for n_palabras, tipo, patron, valor in salidas[estado]:
+                hits.append((inicios[-n_palabras], m.end(), tipo, patron, valor))
+        return hits
+
+def combinar_numeros_compuestos(texto, numeros):
+    """
+    Une números en palabras consecutivos que forman un número compuesto y devuelve la lista resultante.
+
+    "y" solo une decena (30-90) con unidad (1-9): "treinta y cinco". Un espacio une una centena con lo que sigue
+    ("ciento veinte", "doscientos cinco") y "mil" multiplica lo anterior y suma lo siguiente ("dos mil quinientos").
+    Secuencias que no cumplen estas reglas ("dos tres", "veinte y cinco") quedan separadas. Un valor inicial mayor
+    que mil (cifras ya multiplicadas, como "2 mil") solo admite a continuación un número menor que mil.
+
+    Args:
+        texto (str): Texto donde están los números.
+        numeros (list): [(inicio, fin, valor)] de números en palabras, ordenados por inicio.
+
+    Returns:
+        list: [(inicio, fin, valor, n_partes)].
+    """
+    resultado = []
+    i = 0
+    while i < len(numeros):
+        inicio, fin, valor = numeros[i]
+        miles, actual, ultimo = (1000, 0, 1000) if valor == 1000 else (0, valor, valor)
+        j = i + 1
+        while j < len(numeros):
+            sig_inicio, sig_fin, sig_valor = numeros[j]
+            separador = texto[fin:sig_inicio]
+            if RE_SEPARADOR_NUMERO_Y.fullmatch(separador): valido = 30 <= ultimo <= 90 and ultimo % 10 == 0 and 1 <= sig_valor <= 9
+            elif not RE_SEPARADOR_NUMERO.fullmatch(separador): valido = False
+            elif sig_valor == 1000: valido = miles == 0 and 0 < actual < 1000
+            else: valido = ultimo >= 100 and 0 < sig_valor < min(ultimo, 100) if ultimo < 1000 else 0 < sig_valor < 1000
+            if not valido: break
+            if sig_valor == 1000: miles, actual = actual * 1000, 0
+            else: actual += sig_valor
+            ultimo, fin = sig_valor, sig_fin
+            j += 1
+        resultado.append((inicio, fin, miles + actual, j - i))
+        i = j
+    return resultado
@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# Espacios, tabs y saltos de línea que deja el OCR no cambian la tokenización del encoder
+def normalizar_texto_cache(texto):
+    """
+    Normaliza una oración para usarla como clave del cache: Unicode NFC y espacios colapsados.
+    No cambia mayúsculas ni puntuación, que sí afectan al embedding.
+
+    Args:
+        texto (str): Oración tal como sale de spaCy.
+
+    Returns:
+        str: Clave normalizada.
+    """
+    return " ".join(unicodedata.normalize("NFC", texto).split())
+
+class CacheLRUEmbeddings:
+    """
+    Cache LRU de embeddings (vectores float32) acotado por tamaño en bytes.
+    Al superar `max_bytes` se descartan las entradas usadas hace más tiempo. Se puede usar desde varios hilos.
+
+    Args:
+        max_bytes (int): Tamaño máximo aproximado (vectores + claves). 0 deshabilita el cache.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max(0, int(max_bytes))
+        self._entradas = OrderedDict()
+        self.bytes_usados = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave):
+        return clave in self._entradas
+
+    @staticmethod
+    def _tamano_entrada(clave, vector):
+        return vector.nbytes + sys.getsizeof(clave)
+
+    def obtener(self, clave):
+        """
+        Devuelve el vector guardado para `clave` (y lo marca como usado recientemente), o None si no está.
+        """
+        with self._lock:
+            vector = self._entradas.get(clave)
+            if vector is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return vector
+
+    def guardar(self, clave, vector):
+        """
+        Inserta o reemplaza un vector y descarta entradas antiguas hasta respetar `max_bytes`.
+        Un vector más grande que todo el cache no se guarda.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        tamano = self._tamano_entrada(clave, vector)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self.bytes_usados -= self._tamano_entrada(clave, self._entradas.pop(clave))
+            self._entradas[clave] = vector
+            self.bytes_usados += tamano
+            while self.bytes_usados > self.max_bytes:
+                clave_vieja, vector_viejo = self._entradas.popitem(last=False)
+                self.bytes_usados -= self._tamano_entrada(clave_vieja, vector_viejo)
+                self.descartes += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes_usados = 0
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Entradas, bytes usados/máximos, aciertos, fallos, descartes y tasa de aciertos.
+        """
+        consultas = self.aciertos + self.fallos
+        return {"entradas": len(self._entradas), "bytes_usados": self.bytes_usados, "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos, "fallos": self.fallos, "descartes": self.descartes,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0}
+
+    def guardar_en_disco(self, ruta):
+        """
+        Escribe las entradas (de la menos a la más reciente) en un .npz de forma atómica.
+
+        Args:
+            ruta (str): Archivo destino.
+
+        Returns:
+            bool: True si se escribió el archivo.
+        """
+        with self._lock:
+            claves, vectores = list(self._entradas.keys()), list(self._entradas.values())
+        if not claves:
+            return False
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        ruta_tmp = f"{ruta}.{os.getpid()}.tmp.npz"
+        np.savez(ruta_tmp, claves=np.array(claves, dtype=str), vectores=np.stack(vectores))
+        os.replace(ruta_tmp, ruta)
+        return True
+
+    def cargar_desde_disco(self, ruta):
+        """
+        Agrega las entradas de un .npz escrito por guardar_en_disco respetando el orden LRU y `max_bytes`.
+
+        Args:
+            ruta (str): Archivo origen.
+
+        Returns:
+            int: Cantidad de entradas leídas (0 si el archivo no existe).
+        """
+        if not os.path.exists(ruta):
+            return 0
+        with np.load(ruta) as datos:
+            claves, vectores = datos["claves"], datos["vectores"]
+            for clave, vector in zip(claves.tolist(), vectores):
+                self.guardar(clave, vector)
+        return len(claves)
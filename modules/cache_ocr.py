@@ -0,0 +1,216 @@
+import os
+import json
+import glob
+import time
+import hashlib
+import argparse
+import threading
+
+from modules import trazas
+from modules.image_preprocessor import configuracion_preprocesamiento
+from modules.ocr_backends import PSM_PREDETERMINADO
+
+# Cache en disco de textos OCR direccionado por contenido: la clave es el SHA-256 de los bytes de la imagen junto con
+# la configuración de preprocesamiento, el backend OCR y el idioma/psm de Tesseract, así que una imagen ya reconocida no vuelve a
+# preprocesarse ni a pasar por Tesseract (en Paso 1 ni en src/ocr_lote.py). Una entrada por archivo JSON; el mtime
+# marca el último uso y al superar OCR_CACHE_MB se borran las menos usadas. OCR_CACHE_MB=0 lo deshabilita.
+# Inspección y poda: python -m modules.cache_ocr [--listar N] [--podar MB] [--limpiar]
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIR_CACHE_OCR = os.environ.get("OCR_CACHE_DIR", os.path.join(PROJECT_ROOT_DIR, "data", "cache", "ocr"))
+MAX_MB_CACHE_OCR = float(os.environ.get("OCR_CACHE_MB", "64"))
+# Subir esta versión si cambia el formato de las entradas o el posprocesamiento del texto guardado
+VERSION_CACHE_OCR = 1
+
+def hash_imagen(datos_imagen):
+    return hashlib.sha256(datos_imagen).hexdigest()
+
+def clave_cache_ocr(datos_imagen, backend, lang="spa", psm=PSM_PREDETERMINADO, configuracion=None):
+    """
+    Clave de una imagen para un preprocesamiento, un backend y un idioma/psm dados.
+
+    Args:
+        datos_imagen (bytes): Contenido del archivo de imagen.
+        backend (str): Nombre del backend OCR (BackendOCR.nombre); pytesseract y la API pueden diferir en espacios y saltos.
+        lang (str): Idiomas de Tesseract.
+        psm (int): Modo de segmentación de página.
+        configuracion (dict, optional): La de configuracion_preprocesamiento (por defecto, la actual).
+
+    Returns:
+        str: Hash SHA-256 hexadecimal.
+    """
+    parametros = {"version": VERSION_CACHE_OCR, "preprocesamiento": configuracion or configuracion_preprocesamiento(), "backend": backend, "lang": lang, "psm": psm}
+    parametros = json.dumps(parametros, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(f"{hash_imagen(datos_imagen)}:{parametros}".encode("utf-8")).hexdigest()
+
+class CacheOCR:
+    """
+    Textos OCR en disco, uno por archivo (`<dir>/<2 primeros hex>/<clave>.json`), con desalojo LRU por tamaño.
+    Las escrituras son atómicas (os.replace), así que varios procesos pueden compartir el directorio; cada uno lleva
+    su propia estimación de bytes y, al superarla, poda releyendo el directorio.
+
+    Args:
+        directorio (str): Carpeta del cache.
+        max_bytes (int): Tamaño máximo de las entradas. 0 deshabilita el cache.
+    """
+    def __init__(self, directorio=DIR_CACHE_OCR, max_bytes=int(MAX_MB_CACHE_OCR * 1024 * 1024)):
+        self.directorio = directorio
+        self.max_bytes = max(0, int(max_bytes))
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+        self._bytes_estimados = None # se calcula con la primera escritura
+        self._lock = threading.Lock()
+
+    @property
+    def habilitado(self): return self.max_bytes > 0
+
+    def _ruta(self, clave): return os.path.join(self.directorio, clave[:2], f"{clave}.json")
+
+    def obtener(self, clave):
+        """
+        Devuelve el texto guardado para `clave` (y lo marca como usado recientemente), o None si no está.
+        """
+        if not self.habilitado: return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, encoding="utf-8") as f: texto = json.load(f)["texto"]
+            os.utime(ruta)
+        except FileNotFoundError: texto = None
+        except (OSError, ValueError, KeyError, TypeError): # entrada truncada o ajena: se descarta
+            texto = None
+            try: os.remove(ruta)
+            except OSError: pass
+        with self._lock:
+            if texto is None: self.fallos += 1
+            else: self.aciertos += 1
+        return texto
+
+    def guardar(self, clave, texto, **metadatos):
+        """
+        Escribe la entrada y poda si el cache supera `max_bytes`. Una entrada más grande que todo el cache no se guarda.
+
+        Args:
+            clave (str): La de clave_cache_ocr.
+            texto (str): Texto reconocido.
+            **metadatos: Datos informativos para --listar (origen, backend, lang, psm, hash de la imagen...).
+
+        Returns:
+            bool: True si se escribió la entrada.
+        """
+        if not self.habilitado: return False
+        contenido = json.dumps({"texto": texto, "creado": round(time.time(), 3), **metadatos}, ensure_ascii=False).encode("utf-8")
+        if len(contenido) > self.max_bytes: return False
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        ruta_tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(ruta_tmp, "wb") as f: f.write(contenido)
+        os.replace(ruta_tmp, ruta)
+        with self._lock:
+            if self._bytes_estimados is None: self._bytes_estimados = sum(entrada["bytes"] for entrada in self.entradas())
+            else: self._bytes_estimados += len(contenido)
+            excedido = self._bytes_estimados > self.max_bytes
+        if excedido: self.podar()
+        return True
+
+    def entradas(self):
+        """
+        Returns:
+            list: [{"clave", "ruta", "bytes", "usado"}] de la menos a la más recientemente usada.
+        """
+        entradas = []
+        for ruta in glob.glob(os.path.join(self.directorio, "*", "*.json")):
+            try: estado = os.stat(ruta)
+            except FileNotFoundError: continue # podada por otro proceso
+            entradas.append({"clave": os.path.basename(ruta)[:-len(".json")], "ruta": ruta, "bytes": estado.st_size, "usado": estado.st_mtime})
+        return sorted(entradas, key=lambda entrada: entrada["usado"])
+
+    def podar(self, max_bytes=None):
+        """
+        Borra las entradas usadas hace más tiempo hasta que el total no supere `max_bytes`.
+
+        Args:
+            max_bytes (int, optional): Límite para esta poda (por defecto el del cache).
+
+        Returns:
+            tuple: (entradas borradas, bytes liberados).
+        """
+        limite = self.max_bytes if max_bytes is None else max(0, int(max_bytes))
+        entradas = self.entradas()
+        total, borradas, liberados = sum(entrada["bytes"] for entrada in entradas), 0, 0
+        for entrada in entradas:
+            if total <= limite: break
+            try: os.remove(entrada["ruta"]); borradas += 1; liberados += entrada["bytes"]
+            except FileNotFoundError: pass
+            total -= entrada["bytes"]
+        with self._lock:
+            self._bytes_estimados = total
+            self.descartes += borradas
+        return borradas, liberados
+
+    def limpiar(self): return self.podar(0)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Entradas y bytes en disco, bytes máximos, aciertos, fallos, descartes y tasa de aciertos del proceso.
+        """
+        entradas = self.entradas()
+        consultas = self.aciertos + self.fallos
+        return {"directorio": self.directorio, "entradas": len(entradas), "bytes_usados": sum(entrada["bytes"] for entrada in entradas),
+                "max_bytes": self.max_bytes, "aciertos": self.aciertos, "fallos": self.fallos, "descartes": self.descartes,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0}
+
+# Cache compartido del proceso
+CACHE_OCR = CacheOCR()
+
+def ocr_con_cache(datos_imagen, reconocer, backend, lang="spa", psm=PSM_PREDETERMINADO, cache=None, **metadatos):
+    """
+    Texto OCR de una imagen desde el cache o, si no está, llamando a `reconocer()` y guardándolo.
+
+    Args:
+        datos_imagen (bytes): Contenido del archivo de imagen.
+        reconocer (callable): Sin argumentos; preprocesa y reconoce la imagen (solo se llama si no hay acierto).
+        backend (str): Nombre del backend OCR con el que reconoce `reconocer`.
+        lang (str): Idiomas de Tesseract con los que reconoce `reconocer`.
+        psm (int): Modo de segmentación con el que reconoce `reconocer`.
+        cache (CacheOCR, optional): Por defecto CACHE_OCR.
+        **metadatos: Se guardan junto al texto (p. ej. origen).
+
+    Returns:
+        tuple: (texto o None si `reconocer` devolvió None, True si salió del cache).
+    """
+    cache = cache if cache is not None else CACHE_OCR
+    if not cache.habilitado: return reconocer(), False
+    clave = clave_cache_ocr(datos_imagen, backend, lang, psm)
+    texto = cache.obtener(clave)
+    if texto is not None: return texto, True
+    texto = reconocer()
+    if texto is None: return None, False # `reconocer` falló sin excepción: no se guarda
+    try: cache.guardar(clave, texto, imagen_sha256=hash_imagen(datos_imagen), backend=backend, lang=lang, psm=psm, **metadatos)
+    except OSError as e: trazas.advertencia(f"No se pudo guardar el texto OCR en el cache '{cache.directorio}': {e}")
+    return texto, False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspecciona o poda el cache de textos OCR.")
+    parser.add_argument("--dir", default=DIR_CACHE_OCR, help="Carpeta del cache (por defecto OCR_CACHE_DIR o data/cache/ocr).")
+    parser.add_argument("--listar", type=int, nargs="?", const=20, metavar="N", help="Muestra las N entradas usadas más recientemente.")
+    parser.add_argument("--podar", type=float, metavar="MB", help="Borra las entradas menos usadas hasta dejar el cache en MB.")
+    parser.add_argument("--limpiar", action="store_true", help="Borra todas las entradas.")
+    args = parser.parse_args()
+
+    cache = CacheOCR(args.dir, max(MAX_MB_CACHE_OCR * 1024 * 1024, 1))
+    if args.limpiar or args.podar is not None:
+        borradas, liberados = cache.podar(0 if args.limpiar else args.podar * 1024 * 1024)
+        print(f"Borradas {borradas} entradas ({liberados / 1024:.1f} KB).")
+    estadisticas = cache.estadisticas()
+    print(f"Cache OCR '{estadisticas['directorio']}': {estadisticas['entradas']} entradas, "
+          f"{estadisticas['bytes_usados'] / 1024:.1f} KB de {MAX_MB_CACHE_OCR:g} MB (OCR_CACHE_MB).")
+    for entrada in reversed(cache.entradas()[-args.listar:] if args.listar else []):
+        try:
+            with open(entrada["ruta"], encoding="utf-8") as f: datos = json.load(f)
+        except (OSError, ValueError): continue
+        usado = time.strftime("%Y-%m-%d %H:%M", time.localtime(entrada["usado"]))
+        texto = " ".join(str(datos.get("texto", "")).split())
+        print(f"  {entrada['clave'][:12]}  {usado}  {entrada['bytes']:>7} B  {datos.get('backend', '-')} {datos.get('lang', '-')}/psm {datos.get('psm', '-')}  "
+              f"{datos.get('origen', '-')}: {texto[:60]!r}")
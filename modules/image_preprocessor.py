@@ -0,0 +1,185 @@
+import os
+import math
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from modules import trazas
+
+def numero_positivo_de_entorno(variable, predeterminado, admitidos=()):
+    """Valor de la variable de entorno como float positivo (o tal cual si está en `admitidos`); si no es válido avisa y usa `predeterminado`."""
+    valor = os.environ.get(variable, str(predeterminado)).strip()
+    if valor in admitidos: return valor
+    try: numero = float(valor)
+    except ValueError: numero = None
+    if numero is not None and numero > 0 and math.isfinite(numero): return numero
+    trazas.advertencia(f"{variable}='{valor}' no es válido; se usa {predeterminado}."); return predeterminado
+
+# Parámetros del preprocesamiento para OCR. Por defecto el 2x fijo que usaba preprocesar_imagen en src/main.py;
+# OCR_ESCALA=auto elige la escala según la altura x estimada del texto (ver elegir_escala). "auto" amplía hasta 4x
+# los recortes de pantalla, así que no pasa a ser el valor por defecto hasta que benchmarks/reporte_escala_ocr.py
+# muestre con Tesseract real que mejora el texto sin costar más tiempo que el 2x.
+ESCALA_FIJA_OCR = 2
+ESCALA_OCR = numero_positivo_de_entorno("OCR_ESCALA", float(ESCALA_FIJA_OCR), admitidos=("auto",))
+FACTOR_CONTRASTE_OCR = 2.0
+UMBRAL_BINARIZACION_OCR = 138
+
+# --- Escala según resolución ---
+# Tesseract rinde mejor con una altura x de unos 20 px: los recortes de pantalla (x ~ 5-11 px) se amplían más que 2x
+# y los escaneos grandes se dejan igual o se reducen, en lugar de cuadruplicar siempre los píxeles.
+ALTURA_X_OBJETIVO_PX = numero_positivo_de_entorno("OCR_ALTURA_X_OBJETIVO", 20.0)
+ESCALA_MINIMA_OCR, ESCALA_MAXIMA_OCR = 0.5, 4.0
+PASO_ESCALA_OCR = 0.25 # la escala se redondea hacia arriba a múltiplos del paso; 1.0 no escala
+ALTURA_MINIMA_LINEA_PX = 4 # bandas de tinta más bajas se toman como ruido o subrayados
+
+def configuracion_preprocesamiento(escala=ESCALA_OCR, factor_contraste=FACTOR_CONTRASTE_OCR, umbral=UMBRAL_BINARIZACION_OCR):
+    """
+    Parámetros que determinan la imagen que recibe Tesseract (para claves de cache). Con escala "auto" incluye
+    también los de elegir_escala. Los dos motores dan la misma salida, así que el motor no forma parte.
+
+    Returns:
+        dict: Configuración serializable a JSON.
+    """
+    configuracion = {"escala": escala if escala == "auto" else float(escala), "factor_contraste": float(factor_contraste), "umbral": int(umbral)}
+    if escala == "auto":
+        configuracion.update({"altura_x_objetivo": ALTURA_X_OBJETIVO_PX, "escala_minima": ESCALA_MINIMA_OCR, "escala_maxima": ESCALA_MAXIMA_OCR,
+                              "paso_escala": PASO_ESCALA_OCR, "altura_minima_linea": ALTURA_MINIMA_LINEA_PX})
+    return configuracion
+
+def abrir_imagen(imagen):
+    """
+    Acepta una ruta, un archivo abierto o una PIL.Image ya cargada.
+
+    Args:
+        imagen (str | file | PIL.Image.Image): Origen de la imagen.
+
+    Returns:
+        PIL.Image.Image: Imagen (sin copiar si ya era una PIL.Image).
+    """
+    return imagen if isinstance(imagen, Image.Image) else Image.open(imagen)
+
+def estimar_altura_x(gris):
+    """
+    Estima la altura x (px) del texto con el perfil horizontal de tinta: cada banda de filas con tinta es una línea y,
+    dentro de ella, las filas con al menos la mitad de la tinta máxima son la zona de las minúsculas sin trazos
+    ascendentes ni descendentes. Devuelve la mediana entre líneas.
+
+    Args:
+        gris (PIL.Image.Image | np.ndarray): Imagen en escala de grises.
+
+    Returns:
+        float | None: Altura x estimada, o None si no se detectan líneas de texto.
+    """
+    pixeles = np.asarray(gris)
+    if pixeles.size == 0: return None
+    media, minimo, maximo = pixeles.mean(), int(pixeles.min()), int(pixeles.max())
+    # Texto oscuro sobre fondo claro (lo habitual) o al revés
+    tinta = pixeles < media - 0.5 * (media - minimo) if media >= 128 else pixeles > media + 0.5 * (maximo - media)
+    perfil = tinta.sum(axis=1)
+    con_tinta = np.concatenate(([False], perfil > max(1, 0.005 * pixeles.shape[1]), [False]))
+    bordes = np.flatnonzero(con_tinta[1:] != con_tinta[:-1])
+    alturas_x = [int((perfil[inicio:fin] >= 0.5 * perfil[inicio:fin].max()).sum())
+                 for inicio, fin in zip(bordes[::2], bordes[1::2]) if fin - inicio >= ALTURA_MINIMA_LINEA_PX]
+    return float(np.median(alturas_x)) if alturas_x else None
+
+def elegir_escala(gris, altura_x_objetivo=None):
+    """
+    Escala para que la altura x del texto quede cerca de `altura_x_objetivo`.
+
+    Args:
+        gris (PIL.Image.Image | np.ndarray): Imagen en escala de grises sin escalar.
+        altura_x_objetivo (float, optional): Altura x buscada en px (por defecto ALTURA_X_OBJETIVO_PX).
+
+    Returns:
+        tuple: (escala, altura_x estimada o None). Sin líneas detectadas se usa ESCALA_FIJA_OCR.
+    """
+    altura_x = estimar_altura_x(gris)
+    if not altura_x: return float(ESCALA_FIJA_OCR), None
+    escala = (altura_x_objetivo or ALTURA_X_OBJETIVO_PX) / altura_x
+    escala = math.ceil(escala / PASO_ESCALA_OCR - 1e-9) * PASO_ESCALA_OCR # hacia arriba: la altura x no queda bajo el objetivo
+    return float(min(ESCALA_MAXIMA_OCR, max(ESCALA_MINIMA_OCR, escala))), altura_x
+
+def escalar_gris(gris, escala=ESCALA_OCR):
+    """Aplica la escala (número o "auto") a una imagen "L"; con escala 1 la devuelve tal cual."""
+    if escala == "auto": escala, _ = elegir_escala(gris)
+    if escala == 1: return gris
+    return gris.resize((max(1, round(gris.width * escala)), max(1, round(gris.height * escala))))
+
+def tabla_contraste_umbral(media, factor_contraste=FACTOR_CONTRASTE_OCR, umbral=UMBRAL_BINARIZACION_OCR):
+    """
+    Tabla de 256 entradas que combina el realce de contraste de ImageEnhance.Contrast (mezcla con una imagen gris de
+    valor `media`, recortada a 0-255) y la binarización `> umbral`. Aplicarla equivale a los dos pasos de Pillow
+    con una sola pasada sobre los píxeles.
+
+    Args:
+        media (int): Media de grises redondeada de la imagen (como la calcula ImageEnhance.Contrast).
+        factor_contraste (float): Factor de contraste.
+        umbral (int): Los píxeles realzados mayores que el umbral pasan a 255; el resto a 0.
+
+    Returns:
+        np.ndarray: Tabla uint8 indexada por el gris original.
+    """
+    grises = np.arange(256, dtype=np.float32)
+    # Misma aritmética float32 que ImageCore.blend (truncado y recorte a 0-255)
+    realzado = np.clip(np.float32(media) + np.float32(factor_contraste) * (grises - np.float32(media)), 0, 255).astype(np.uint8)
+    return np.where(realzado > umbral, 255, 0).astype(np.uint8)
+
+def preprocesar_imagen_ocr(imagen, escala=ESCALA_OCR, factor_contraste=FACTOR_CONTRASTE_OCR, umbral=UMBRAL_BINARIZACION_OCR, como_array=False):
+    """
+    Escala de grises, escalado, realce de contraste y binarización con un solo buffer NumPy.
+
+    La conversión a gris y el escalado (bicúbico) los hace Pillow en C sobre un único canal; el resultado se copia una
+    vez a un array y el contraste y el umbral se aplican juntos en el lugar con una tabla de 256 entradas
+    (tabla_contraste_umbral). Con factor >= 0 la tabla es un escalón y se aplica como comparación in situ, sin
+    buffers temporales (np.take/indexar con la tabla crearía índices intp de 8 bytes por píxel).
+    La salida es idéntica píxel a píxel a la de preprocesar_imagen_pil.
+
+    Args:
+        imagen (str | file | PIL.Image.Image): Imagen de origen.
+        escala (int | float | str): Factor de escalado (1 no escala) o "auto" (elegir_escala).
+        factor_contraste (float): Factor de ImageEnhance.Contrast equivalente.
+        umbral (int): Umbral de binarización sobre la imagen realzada.
+        como_array (bool): Si True devuelve el array uint8 en lugar de la imagen.
+
+    Returns:
+        PIL.Image.Image | np.ndarray: Imagen "L" binaria (0/255) que comparte memoria con el array, o el array.
+    """
+    gris = escalar_gris(abrir_imagen(imagen).convert('L'), escala)
+    pixeles = np.array(gris); del gris
+    media = int(pixeles.mean() + 0.5) if pixeles.size else 0
+    tabla = tabla_contraste_umbral(media, factor_contraste, umbral)
+    primer_blanco = int(np.argmax(tabla)) if tabla[-1] else 256
+    if np.all(tabla[primer_blanco:] == 255) and not tabla[:primer_blanco].any(): # escalón: gris >= primer_blanco -> 255
+        np.greater_equal(pixeles, primer_blanco, out=pixeles.view(np.bool_)); np.multiply(pixeles, 255, out=pixeles)
+    else: pixeles[...] = tabla[pixeles]
+    return pixeles if como_array else Image.fromarray(pixeles)
+
+def preprocesar_imagen_pil(imagen, escala=ESCALA_OCR, factor_contraste=FACTOR_CONTRASTE_OCR, umbral=UMBRAL_BINARIZACION_OCR):
+    """
+    Implementación anterior paso a paso con Pillow (una imagen nueva por paso); se conserva como referencia.
+
+    Returns:
+        PIL.Image.Image: Imagen binaria en modo "1".
+    """
+    gris = escalar_gris(abrir_imagen(imagen).convert('L'), escala)
+    realzada = ImageEnhance.Contrast(gris).enhance(factor_contraste)
+    return realzada.point(lambda x: 255 if x > umbral else 0, '1')
+
+# Motor usado por la interfaz: "numpy" (por defecto) o "pil" (implementación anterior)
+MOTOR_PREPROCESAMIENTO = os.environ.get("OCR_MOTOR_PREPROCESAMIENTO", "numpy")
+MOTORES_PREPROCESAMIENTO = {"numpy": preprocesar_imagen_ocr, "pil": preprocesar_imagen_pil}
+
+def preprocesar_para_ocr(imagen, motor=None, **kwargs):
+    """
+    Preprocesa con el motor elegido (argumento o variable de entorno OCR_MOTOR_PREPROCESAMIENTO).
+
+    Args:
+        imagen (str | file | PIL.Image.Image): Imagen de origen.
+        motor (str, optional): "numpy" o "pil".
+
+    Returns:
+        PIL.Image.Image: Imagen binaria lista para Tesseract.
+    """
+    motor = motor or MOTOR_PREPROCESAMIENTO
+    if motor not in MOTORES_PREPROCESAMIENTO: raise ValueError(f"Motor de preprocesamiento desconocido: '{motor}'. Opciones: {list(MOTORES_PREPROCESAMIENTO)}")
+    return MOTORES_PREPROCESAMIENTO[motor](imagen, **kwargs)
@@ -0,0 +1,213 @@
+import os
+import abc
+import glob
+import atexit
+import ctypes
+import ctypes.util
+import threading
+
+import numpy as np
+from PIL import Image
+
+from modules import trazas
+
+# Backends de OCR. pytesseract lanza un proceso `tesseract` por llamada (escribe la imagen a un temporal y recarga el
+# traineddata cada vez); los backends persistentes cargan el idioma una sola vez y reconocen imágenes en memoria.
+#   "tesserocr": binding de libtesseract (pip install tesserocr), si está instalado.
+#   "ctypes":    la API C de libtesseract cargada con ctypes, sin dependencias extra.
+#   "pytesseract": el camino de siempre, como respaldo.
+# OCR_BACKEND=auto|tesserocr|ctypes|pytesseract elige el backend ("auto" prueba en ese orden y solo se queda con un
+# backend persistente si reconoce una imagen de prueba; la comparación de texto con pytesseract sobre imágenes reales
+# está en benchmarks/bench_backends_ocr.py).
+BACKEND_OCR = os.environ.get("OCR_BACKEND", "auto")
+ORDEN_BACKENDS_AUTO = ("tesserocr", "ctypes", "pytesseract")
+PSM_PREDETERMINADO = 3 # el de la línea de comandos de tesseract (la API usa 6 si no se indica)
+
+class ErrorOCR(RuntimeError):
+    """Fallo de un backend persistente (inicialización o reconocimiento)."""
+
+def imagen_para_ocr(imagen):
+    """Imagen PIL en un modo que todos los backends aceptan ("L" o "RGB"); los binarios "1" pasan a "L"."""
+    if isinstance(imagen, np.ndarray): imagen = Image.fromarray(imagen)
+    return imagen if imagen.mode in ("L", "RGB") else imagen.convert("L" if imagen.mode in ("1", "P", "LA", "I;16") else "RGB")
+
+class BackendOCR(abc.ABC):
+    """
+    Interfaz común: reconocer(imagen) -> texto. Los backends persistentes no son reentrantes, así que cada instancia
+    serializa sus llamadas con un lock; para paralelizar se usa una instancia por proceso.
+
+    Args:
+        lang (str): Idiomas de Tesseract (p. ej. "spa").
+        psm (int): Modo de segmentación de página.
+    """
+    nombre = ""
+    persistente = False
+
+    def __init__(self, lang="spa", psm=PSM_PREDETERMINADO):
+        self.lang, self.psm = lang, psm
+        self._lock = threading.Lock()
+
+    def reconocer(self, imagen):
+        """
+        Args:
+            imagen (PIL.Image.Image | np.ndarray): Imagen ya preprocesada.
+
+        Returns:
+            str: Texto reconocido (sin el salto de página final que agrega la línea de comandos).
+        """
+        imagen = imagen_para_ocr(imagen)
+        with self._lock: return self._reconocer(imagen).rstrip("\f")
+
+    @abc.abstractmethod
+    def _reconocer(self, imagen):
+        """Texto de una imagen "L" o "RGB"; se llama con el lock de la instancia tomado."""
+
+    def verificar(self):
+        """Reconoce una imagen en blanco para comprobar que la biblioteca responde; lanza ErrorOCR si falla."""
+        try: texto = self.reconocer(Image.new("L", (64, 32), 255))
+        except Exception as e: raise ErrorOCR(f"El backend '{self.nombre}' no pudo reconocer la imagen de prueba: {e}") from e
+        if not isinstance(texto, str): raise ErrorOCR(f"El backend '{self.nombre}' devolvió {type(texto).__name__} en lugar de texto.")
+
+    def cerrar(self): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.cerrar(); return False
+
+class BackendPytesseract(BackendOCR):
+    """Un proceso `tesseract` por imagen (comportamiento anterior). Sus errores son los de pytesseract."""
+    nombre = "pytesseract"
+
+    def __init__(self, lang="spa", psm=PSM_PREDETERMINADO):
+        super().__init__(lang, psm)
+        import pytesseract
+        self._pytesseract = pytesseract
+        self._config = f"--psm {psm}" if psm != PSM_PREDETERMINADO else ""
+
+    def _reconocer(self, imagen): return self._pytesseract.image_to_string(imagen, lang=self.lang, config=self._config)
+
+class BackendTesserocr(BackendOCR):
+    """PyTessBaseAPI de tesserocr: el traineddata se carga al crear el backend y se reutiliza."""
+    nombre = "tesserocr"
+    persistente = True
+
+    def __init__(self, lang="spa", psm=PSM_PREDETERMINADO):
+        super().__init__(lang, psm)
+        import tesserocr
+        try: self._api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+        except RuntimeError as e: raise ErrorOCR(f"tesserocr no pudo inicializar '{lang}': {e}") from e
+
+    def _reconocer(self, imagen):
+        self._api.SetImage(imagen)
+        return self._api.GetUTF8Text()
+
+    def cerrar(self):
+        if getattr(self, "_api", None) is not None: self._api.End(); self._api = None
+
+def buscar_libtesseract():
+    """
+    Ruta o nombre de la biblioteca compartida de Tesseract: OCR_LIBTESSERACT, la del sistema o, en Windows, la DLL
+    junto al ejecutable configurado en pytesseract.
+
+    Returns:
+        str | None: Algo que ctypes.CDLL pueda abrir, o None.
+    """
+    if os.environ.get("OCR_LIBTESSERACT"): return os.environ["OCR_LIBTESSERACT"]
+    encontrada = ctypes.util.find_library("tesseract")
+    if encontrada: return encontrada
+    try:
+        import pytesseract
+        carpeta = os.path.dirname(pytesseract.pytesseract.tesseract_cmd)
+    except ImportError: return None
+    candidatas = sorted(glob.glob(os.path.join(carpeta, "libtesseract*.dll"))) if carpeta else []
+    return candidatas[-1] if candidatas else None
+
+class BackendCtypes(BackendOCR):
+    """API C de libtesseract (TessBaseAPI*) por ctypes: un handle inicializado una vez y SetImage desde el buffer."""
+    nombre = "ctypes"
+    persistente = True
+
+    def __init__(self, lang="spa", psm=PSM_PREDETERMINADO, ruta_biblioteca=None, tessdata=None):
+        super().__init__(lang, psm)
+        ruta_biblioteca = ruta_biblioteca or buscar_libtesseract()
+        if not ruta_biblioteca: raise ErrorOCR("No se encontró libtesseract (defina OCR_LIBTESSERACT con su ruta).")
+        try: lib = ctypes.CDLL(ruta_biblioteca)
+        except OSError as e: raise ErrorOCR(f"No se pudo cargar '{ruta_biblioteca}': {e}") from e
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit3.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.TessBaseAPIInit3.restype = ctypes.c_int
+        lib.TessBaseAPISetPageSegMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPIGetUTF8Text.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p # se libera con TessDeleteText
+        lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+        self._lib = lib
+        self._handle = lib.TessBaseAPICreate()
+        tessdata = tessdata or os.environ.get("TESSDATA_PREFIX")
+        if lib.TessBaseAPIInit3(self._handle, tessdata.encode() if tessdata else None, lang.encode()) != 0:
+            self.cerrar(); raise ErrorOCR(f"libtesseract no pudo cargar el idioma '{lang}' (revise TESSDATA_PREFIX).")
+        lib.TessBaseAPISetPageSegMode(self._handle, psm)
+
+    def _reconocer(self, imagen):
+        pixeles = np.ascontiguousarray(np.asarray(imagen, dtype=np.uint8))
+        alto, ancho = pixeles.shape[:2]
+        bytes_por_pixel = 1 if pixeles.ndim == 2 else pixeles.shape[2]
+        self._lib.TessBaseAPISetImage(self._handle, pixeles.ctypes.data, ancho, alto, bytes_por_pixel, pixeles.strides[0])
+        puntero = self._lib.TessBaseAPIGetUTF8Text(self._handle)
+        if not puntero: raise ErrorOCR("libtesseract no devolvió texto.")
+        try: return ctypes.string_at(puntero).decode("utf-8", errors="replace")
+        finally:
+            self._lib.TessDeleteText(puntero); self._lib.TessBaseAPIClear(self._handle)
+
+    def cerrar(self):
+        if getattr(self, "_handle", None):
+            self._lib.TessBaseAPIEnd(self._handle); self._lib.TessBaseAPIDelete(self._handle); self._handle = None
+
+BACKENDS_OCR = {"tesserocr": BackendTesserocr, "ctypes": BackendCtypes, "pytesseract": BackendPytesseract}
+
+def crear_backend_ocr(nombre=None, lang="spa", psm=PSM_PREDETERMINADO):
+    """
+    Crea un backend. Con "auto" usa el primer backend persistente que se pueda inicializar y pase verificar(); si
+    ninguno, pytesseract.
+
+    Args:
+        nombre (str, optional): "auto", "tesserocr", "ctypes" o "pytesseract" (por defecto OCR_BACKEND).
+        lang (str): Idiomas de Tesseract.
+        psm (int): Modo de segmentación de página.
+
+    Returns:
+        BackendOCR: Backend listo para usar.
+    """
+    nombre = nombre or BACKEND_OCR
+    if nombre != "auto":
+        if nombre not in BACKENDS_OCR: raise ValueError(f"Backend OCR desconocido: '{nombre}'. Opciones: {['auto', *BACKENDS_OCR]}")
+        return BACKENDS_OCR[nombre](lang, psm)
+    for candidato in ORDEN_BACKENDS_AUTO[:-1]:
+        try: backend = BACKENDS_OCR[candidato](lang, psm)
+        except (ImportError, ErrorOCR): continue
+        try: backend.verificar(); return backend
+        except ErrorOCR as e: backend.cerrar(); trazas.advertencia(f"{e} Se prueba el siguiente backend OCR.")
+    return BackendPytesseract(lang, psm)
+
+# Un backend por (idioma, psm) en el proceso, creado al primer uso
+BACKENDS_ACTIVOS = {}
+LOCK_BACKENDS = threading.Lock()
+
+def obtener_backend_ocr(lang="spa", psm=PSM_PREDETERMINADO):
+    """Backend compartido del proceso para `lang`/`psm` (el idioma se carga una sola vez)."""
+    clave = (lang, psm)
+    with LOCK_BACKENDS:
+        if clave not in BACKENDS_ACTIVOS: BACKENDS_ACTIVOS[clave] = crear_backend_ocr(lang=lang, psm=psm)
+        return BACKENDS_ACTIVOS[clave]
+
+def reconocer_texto(imagen, lang="spa", psm=PSM_PREDETERMINADO):
+    """OCR con el backend compartido del proceso."""
+    return obtener_backend_ocr(lang, psm).reconocer(imagen)
+
+def cerrar_backends_ocr():
+    with LOCK_BACKENDS:
+        for backend in BACKENDS_ACTIVOS.values(): backend.cerrar()
+        BACKENDS_ACTIVOS.clear()
+
+atexit.register(cerrar_backends_ocr)
@@ -0,0 +1,143 @@
+import json
+
+# Registros con __slots__ para los resultados de extracción: sin __dict__ por instancia, así que miles de resultados
+# guardados para reportes ocupan una fracción de los dicts anidados. Aceptan acceso por clave (registro["valor"])
+# para que el código que armaba los dicts siga funcionando, y to_dict() devuelve exactamente la forma JSON de antes.
+
+class _RegistroSlots:
+    """Base: acceso tipo dict sobre los campos de CAMPOS (el orden de CAMPOS es el orden de las claves en to_dict)."""
+    __slots__ = ()
+    CAMPOS = ()
+
+    def __getitem__(self, campo):
+        if campo not in self.CAMPOS: raise KeyError(campo)
+        return getattr(self, campo)
+
+    def __setitem__(self, campo, valor):
+        if campo not in self.CAMPOS: raise KeyError(campo)
+        setattr(self, campo, valor)
+
+    def __contains__(self, campo): return campo in self.CAMPOS
+    def __iter__(self): return iter(self.CAMPOS)
+    def __len__(self): return len(self.CAMPOS)
+    def keys(self): return self.CAMPOS
+    def get(self, campo, defecto=None): return getattr(self, campo) if campo in self.CAMPOS else defecto
+    def items(self): return [(campo, getattr(self, campo)) for campo in self.CAMPOS]
+    def values(self): return [getattr(self, campo) for campo in self.CAMPOS]
+
+    def __eq__(self, otro):
+        if isinstance(otro, (_RegistroSlots, dict)): return self.to_dict() == (otro.to_dict() if isinstance(otro, _RegistroSlots) else otro)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self): return repr(self.to_dict())
+
+class ParametroExtraido(_RegistroSlots):
+    """
+    Parámetro con valor y fragmento de origen (cantidad_servidores, capacidad_sistema, disciplina_cola).
+
+    Args:
+        valor (any, optional): Valor extraído.
+        fragmento_texto (str, optional): Oración o fragmento de donde salió.
+    """
+    __slots__ = ("valor", "fragmento_texto")
+    CAMPOS = ("valor", "fragmento_texto")
+
+    def __init__(self, valor=None, fragmento_texto=None):
+        self.valor, self.fragmento_texto = valor, fragmento_texto
+
+    def reiniciar(self):
+        """Vuelve al estado sin asignar (sin reconstruir el resultado entero)."""
+        for campo in self.CAMPOS: setattr(self, campo, None)
+
+    def to_dict(self): return {campo: getattr(self, campo) for campo in self.CAMPOS}
+
+class ParametroTasaTiempo(ParametroExtraido):
+    """
+    Tasa o tiempo (llegada/servicio): además del valor, sus unidades y la distribución mencionada.
+
+    Args:
+        valor (float, optional): Valor extraído.
+        unidades (str, optional): Unidad tal como aparece en el texto (p. ej. "pacientes por hora").
+        distribucion (str, optional): "Poisson", "Exponencial" o None.
+        fragmento_texto (str, optional): Oración de donde salió.
+    """
+    __slots__ = ("unidades", "distribucion")
+    CAMPOS = ("valor", "unidades", "distribucion", "fragmento_texto")
+
+    def __init__(self, valor=None, unidades=None, distribucion=None, fragmento_texto=None):
+        self.valor, self.unidades, self.distribucion, self.fragmento_texto = valor, unidades, distribucion, fragmento_texto
+
+# Parámetro -> tipo de registro, en el orden de la salida JSON
+TIPOS_PARAMETRO = {
+    "tasa_llegada": ParametroTasaTiempo, "tiempo_entre_llegadas": ParametroTasaTiempo,
+    "tasa_servicio_por_servidor": ParametroTasaTiempo, "tiempo_servicio_por_servidor": ParametroTasaTiempo,
+    "cantidad_servidores": ParametroExtraido, "capacidad_sistema": ParametroExtraido, "disciplina_cola": ParametroExtraido,
+}
+
+class ParametrosExtraidos(_RegistroSlots):
+    """Los siete parámetros de un resultado, cada uno en su registro (ver TIPOS_PARAMETRO)."""
+    __slots__ = tuple(TIPOS_PARAMETRO)
+    CAMPOS = tuple(TIPOS_PARAMETRO)
+
+    def __init__(self):
+        for campo, tipo in TIPOS_PARAMETRO.items(): setattr(self, campo, tipo())
+
+    def __setitem__(self, campo, valor):
+        # Asignar un dict (código anterior) lo convierte al registro del parámetro
+        if isinstance(valor, dict) and campo in TIPOS_PARAMETRO: valor = TIPOS_PARAMETRO[campo](**valor)
+        super().__setitem__(campo, valor)
+
+    def to_dict(self): return {campo: getattr(self, campo).to_dict() for campo in self.CAMPOS}
+
+class ResultadoExtraccion(_RegistroSlots):
+    """
+    Resultado de una extracción; reemplaza al dict anidado de inicializar_estructura_salida.
+
+    Los candidatos de oraciones_candidatas_debug y niveles_decision siguen siendo dicts/listas (son de depuración y
+    de tamaño variable); lo fijo (parámetros y banderas) vive en slots.
+    """
+    __slots__ = ("texto_original", "parametros_extraidos", "oraciones_candidatas_debug", "errores", "niveles_decision", "etapa_embeddings_ejecutada")
+    CAMPOS = ("texto_original", "parametros_extraidos", "oraciones_candidatas_debug", "errores", "niveles_decision", "etapa_embeddings_ejecutada")
+
+    def __init__(self, texto_original=None):
+        self.texto_original = texto_original
+        self.parametros_extraidos = ParametrosExtraidos()
+        self.oraciones_candidatas_debug = {"llegada": [], "servicio": []}
+        self.errores = []
+        self.niveles_decision = {}
+        self.etapa_embeddings_ejecutada = False
+
+    def to_dict(self):
+        """
+        Forma JSON de siempre (mismas claves y en el mismo orden que el dict anterior).
+
+        Returns:
+            dict: Resultado como dicts anidados; las listas y dicts de depuración se comparten, no se copian.
+        """
+        return {"texto_original": self.texto_original, "parametros_extraidos": self.parametros_extraidos.to_dict(),
+                "oraciones_candidatas_debug": self.oraciones_candidatas_debug, "errores": self.errores,
+                "niveles_decision": self.niveles_decision, "etapa_embeddings_ejecutada": self.etapa_embeddings_ejecutada}
+
+    def to_json(self, **kwargs): return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """
+        Reconstruye el registro a partir de la forma JSON (p. ej. resultados guardados en disco).
+
+        Args:
+            datos (dict): Resultado como lo devuelve to_dict().
+
+        Returns:
+            ResultadoExtraccion: Registro equivalente.
+        """
+        resultado = cls(datos.get("texto_original"))
+        for campo, valores in (datos.get("parametros_extraidos") or {}).items():
+            if campo in TIPOS_PARAMETRO: resultado.parametros_extraidos[campo] = TIPOS_PARAMETRO[campo](**valores)
+        resultado.oraciones_candidatas_debug = datos.get("oraciones_candidatas_debug", resultado.oraciones_candidatas_debug)
+        resultado.errores = datos.get("errores", resultado.errores)
+        resultado.niveles_decision = datos.get("niveles_decision", resultado.niveles_decision)
+        resultado.etapa_embeddings_ejecutada = datos.get("etapa_embeddings_ejecutada", False)
+        return resultado
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# Niveles de los eventos; los spans se emiten siempre que haya un sumidero configurado
+NIVELES_TRAZA = {"debug": 10, "info": 20, "advertencia": 30, "error": 40}
+PREFIJOS_NIVEL = {"debug": "DEBUG", "info": "INFO", "advertencia": "ADVERTENCIA", "error": "ERROR"}
+
+class SumideroJSONL:
+    """
+    Escribe cada registro (span o evento) como una línea JSON.
+
+    Args:
+        destino (str | file): Ruta del archivo (se abre en modo append) o stream ya abierto.
+    """
+    def __init__(self, destino):
+        self._propio = isinstance(destino, str)
+        if self._propio: os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+        self._stream = open(destino, "a", encoding="utf-8") if self._propio else destino
+        self._lock = threading.Lock()
+
+    def escribir(self, registro):
+        linea = json.dumps(registro, ensure_ascii=False, default=str)
+        with self._lock:
+            self._stream.write(linea + "\n"); self._stream.flush()
+
+    def cerrar(self):
+        if self._propio: self._stream.close()
+
+class SumideroLegible:
+    """
+    Formato para consola: los spans como "[traza] nombre  12.34 ms  clave=valor" sangrados según su profundidad
+    (se escriben al terminar, así que los hijos aparecen antes que el padre) y los eventos como "NIVEL: mensaje".
+
+    Args:
+        stream (file, optional): Destino; por defecto sys.stderr.
+    """
+    def __init__(self, stream=None):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def escribir(self, registro):
+        if registro["tipo"] == "span":
+            atributos = "  ".join(f"{k}={v}" for k, v in registro["atributos"].items())
+            linea = f"[traza] {'  ' * registro['profundidad']}{registro['nombre']}  {registro['duracion_ms']:.2f} ms" + (f"  {atributos}" if atributos else "")
+        else: linea = f"{PREFIJOS_NIVEL[registro['nivel']]}: {registro['mensaje']}"
+        with self._lock:
+            stream = self._stream or sys.stderr
+            stream.write(linea + "\n"); stream.flush()
+
+    def cerrar(self): pass
+
+class _SpanNulo:
+    """Span del trazador sin sumidero: no mide ni guarda nada."""
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def agregar(self, **atributos): return self
+    def terminar(self, **atributos): pass
+
+SPAN_NULO = _SpanNulo()
+
+class Span:
+    """Tramo medido con perf_counter. Se usa como context manager o con iniciar_span(...)/terminar()."""
+    __slots__ = ("trazador", "nombre", "atributos", "padre", "profundidad", "_inicio", "_inicio_epoch", "_terminado")
+
+    def __init__(self, trazador, nombre, atributos):
+        self.trazador, self.nombre, self.atributos = trazador, nombre, atributos
+        self._terminado = False
+
+    def __enter__(self):
+        pila = self.trazador._pila()
+        self.padre = pila[-1].nombre if pila else None
+        self.profundidad = len(pila)
+        pila.append(self)
+        self._inicio_epoch = time.time(); self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_exc, exc, tb):
+        if exc is not None: self.atributos["error"] = f"{tipo_exc.__name__}: {exc}"
+        self.terminar()
+        return False
+
+    def agregar(self, **atributos):
+        """Añade conteos/atributos al span (se emiten al terminar)."""
+        self.atributos.update(atributos)
+        return self
+
+    def terminar(self, **atributos):
+        if self._terminado: return
+        self._terminado = True
+        duracion_ms = (time.perf_counter() - self._inicio) * 1000
+        self.atributos.update(atributos)
+        pila = self.trazador._pila()
+        if self in pila: del pila[pila.index(self):]
+        self.trazador.sumidero.escribir({"tipo": "span", "nombre": self.nombre, "inicio": round(self._inicio_epoch, 6), "duracion_ms": round(duracion_ms, 3),
+                                         "padre": self.padre, "profundidad": self.profundidad, "hilo": threading.current_thread().name, "atributos": self.atributos})
+
+class Trazador:
+    """
+    Punto único de trazas: spans con tiempos y conteos por etapa y eventos con nivel.
+
+    Sin sumidero (el valor por defecto) es un no-op: los spans no miden nada y los eventos debug/info se descartan;
+    advertencias y errores se siguen imprimiendo en consola como antes. Con sumidero se emite todo lo que supere
+    `nivel`, y los spans se anidan por hilo.
+
+    Args:
+        sumidero (SumideroJSONL | SumideroLegible, optional): Destino de los registros.
+        nivel (str): Nivel mínimo de los eventos ("debug", "info", "advertencia", "error").
+    """
+    def __init__(self, sumidero=None, nivel="info"):
+        if nivel not in NIVELES_TRAZA: raise ValueError(f"Nivel de traza desconocido: '{nivel}'. Opciones: {list(NIVELES_TRAZA)}")
+        self.sumidero = sumidero
+        self.nivel = nivel
+        self._nivel_minimo = NIVELES_TRAZA[nivel] if sumidero is not None else NIVELES_TRAZA["advertencia"]
+        self._local = threading.local()
+
+    def _pila(self):
+        pila = getattr(self._local, "pila", None)
+        if pila is None: pila = self._local.pila = []
+        return pila
+
+    @property
+    def activo(self): return self.sumidero is not None
+
+    def habilitado(self, nivel):
+        """True si un evento de `nivel` se emitiría (para no armar mensajes de debug costosos en vano)."""
+        return NIVELES_TRAZA[nivel] >= self._nivel_minimo
+
+    def span(self, nombre, **atributos):
+        return Span(self, nombre, atributos) if self.sumidero is not None else SPAN_NULO
+
+    def iniciar_span(self, nombre, **atributos):
+        return self.span(nombre, **atributos).__enter__()
+
+    def evento(self, nivel, mensaje, **atributos):
+        if NIVELES_TRAZA[nivel] < self._nivel_minimo: return
+        if self.sumidero is None: sys.stdout.write(f"{PREFIJOS_NIVEL[nivel]}: {mensaje}\n"); return # una sola escritura: no se mezcla entre hilos
+        pila = self._pila()
+        self.sumidero.escribir({"tipo": "evento", "nivel": nivel, "mensaje": mensaje, "ts": round(time.time(), 6),
+                                "span": pila[-1].nombre if pila else None, "hilo": threading.current_thread().name, "atributos": atributos})
+
+    def cerrar(self):
+        if self.sumidero is not None: self.sumidero.cerrar()
+
+def crear_trazador(destino=None, nivel="info"):
+    """
+    Trazador a partir de una descripción de destino: None/"" (no-op), "texto" (legible en stderr),
+    "jsonl" (JSONL en stdout) o una ruta de archivo (JSONL en ese archivo).
+
+    Args:
+        destino (str, optional): Descripción del sumidero.
+        nivel (str): Nivel mínimo de los eventos.
+
+    Returns:
+        Trazador: Trazador configurado.
+    """
+    if not destino: return Trazador(None, nivel)
+    if destino == "texto": return Trazador(SumideroLegible(), nivel)
+    if destino == "jsonl": return Trazador(SumideroJSONL(sys.stdout), nivel)
+    return Trazador(SumideroJSONL(destino), nivel)
+
+# NLP_TRAZAS=texto|jsonl|<ruta.jsonl> activa las trazas al importar; NLP_TRAZAS_NIVEL fija el nivel mínimo
+TRAZADOR = crear_trazador(os.environ.get("NLP_TRAZAS", ""), os.environ.get("NLP_TRAZAS_NIVEL", "info"))
+
+def configurar_trazas(destino=None, nivel="info"):
+    """
+    Reemplaza el trazador global (cerrando el anterior).
+
+    Args:
+        destino (str | SumideroJSONL | SumideroLegible, optional): Descripción como en crear_trazador o un sumidero.
+        nivel (str): Nivel mínimo de los eventos.
+
+    Returns:
+        Trazador: El nuevo trazador global.
+    """
+    global TRAZADOR
+    anterior = TRAZADOR
+    TRAZADOR = Trazador(destino, nivel) if hasattr(destino, "escribir") else crear_trazador(destino, nivel)
+    anterior.cerrar()
+    return TRAZADOR
+
+# Atajos sobre el trazador global vigente
+def span(nombre, **atributos): return TRAZADOR.span(nombre, **atributos)
+def iniciar_span(nombre, **atributos): return TRAZADOR.iniciar_span(nombre, **atributos)
+def habilitado(nivel): return TRAZADOR.habilitado(nivel)
+def debug(mensaje, **atributos): TRAZADOR.evento("debug", mensaje, **atributos)
+def info(mensaje, **atributos): TRAZADOR.evento("info", mensaje, **atributos)
+def advertencia(mensaje, **atributos): TRAZADOR.evento("advertencia", mensaje, **atributos)
+def error(mensaje, **atributos): TRAZADOR.evento("error", mensaje, **atributos)
@@ -14,8 +14,13 @@ PROJECT_ROOT_DIR = project_root
 # --- FIN ---
 
 try:
-    from PIL import Image, ImageEnhance
+    from PIL import Image
 except ImportError: messagebox.showerror("Error Importación", "Pillow no instalado."); exit()
+try:
+    from modules.image_preprocessor import preprocesar_para_ocr
+    from modules.ocr_backends import obtener_backend_ocr, ErrorOCR
+    from modules.cache_ocr import ocr_con_cache
+except ImportError as e: messagebox.showerror("Error Importación", f"No se pudo cargar el preprocesamiento/OCR: {e}"); exit()
 try:
     import pytesseract
 except ImportError: messagebox.showerror("Error Importación", "pytesseract no instalado."); exit()
@@ -57,12 +62,9 @@ COLOR_HEADER_LOCKED_BG = "#e8e8e8"; COLOR_HEADER_LOCKED_FG = "#a0a0a0"
 COLOR_HEADER_ACTIVE_BG = "#e0e0e0"; COLOR_HEADER_ACTIVE_FG = "#333333"
 PLACEHOLDER_INGRESE_VALOR = "Ingrese valor"; PLACEHOLDER_EJ_20 = "Ej: 20"; PLACEHOLDER_UNIDAD = "Unidad"
 
-def preprocesar_imagen(ruta_imagen): # Sin cambios
+def preprocesar_imagen(ruta_imagen): # modules/image_preprocessor: 2x fijo (OCR_ESCALA=auto escala según la altura x del texto)
     try:
-        imagen = Image.open(ruta_imagen); imagen = imagen.convert('L')
-        imagen = imagen.resize((imagen.width * 2, imagen.height * 2))
-        enhancer = ImageEnhance.Contrast(imagen); imagen = enhancer.enhance(2)
-        imagen = imagen.point(lambda x: 255 if x > 138 else 0, '1'); return imagen
+        return preprocesar_para_ocr(ruta_imagen)
     except FileNotFoundError: print(f"Error: No se pudo encontrar: '{ruta_imagen}'"); return None
     except Image.UnidentifiedImageError: print(f"Error: Archivo en '{ruta_imagen}' no es imagen válida."); return None
     except Exception as e: print(f"Error al preprocesar '{ruta_imagen}': {e}"); return None
@@ -81,12 +83,20 @@ def guardar_en_word(texto, nombre_archivo_word): # Usa PROJECT_ROOT_DIR
 
 def ejecutar_flujo_completo_paso1(ruta_imagen_seleccionada, section_data_paso1): # Modificado para guardar texto OCR
     if not ruta_imagen_seleccionada: messagebox.showerror("Error P1", "No imagen seleccionada."); return False
-    print(f"P1: Preprocesando '{ruta_imagen_seleccionada}'..."); img_proc = preprocesar_imagen(ruta_imagen_seleccionada)
-    if img_proc is None: messagebox.showerror("Error P1", "Fallo preprocesamiento."); return False
-    print("P1: Imagen preprocesada."); print("P1: Realizando OCR...")
+    try:
+        with open(ruta_imagen_seleccionada, 'rb') as f: datos_imagen = f.read() # clave del cache OCR (modules/cache_ocr, OCR_CACHE_MB=0 lo deshabilita)
+    except OSError as e: print(f"Error: No se pudo leer '{ruta_imagen_seleccionada}': {e}"); messagebox.showerror("Error P1", "Fallo preprocesamiento."); return False
+    def preprocesar_y_reconocer():
+        print(f"P1: Preprocesando '{ruta_imagen_seleccionada}'..."); img_proc = preprocesar_imagen(ruta_imagen_seleccionada)
+        if img_proc is None: return None
+        print("P1: Imagen preprocesada."); print("P1: Realizando OCR...")
+        return backend.reconocer(img_proc)
     texto_transcrito = "" # Inicializar
     try:
-        texto_transcrito = pytesseract.image_to_string(img_proc, lang='spa')
+        backend = obtener_backend_ocr(lang='spa') # persistente si hay libtesseract (OCR_BACKEND); su nombre forma parte de la clave del cache
+        texto_transcrito, desde_cache = ocr_con_cache(datos_imagen, preprocesar_y_reconocer, backend.nombre, lang='spa', origen=os.path.basename(ruta_imagen_seleccionada))
+        if texto_transcrito is None: messagebox.showerror("Error P1", "Fallo preprocesamiento."); return False
+        if desde_cache: print("P1: Texto OCR tomado del cache (misma imagen y configuración).")
         texto_transcrito = re.sub(r'-\n', '', texto_transcrito)
         print(f"P1: OCR OK. Texto(100): '{texto_transcrito[:100]}...'")
         if not texto_transcrito.strip(): messagebox.showwarning("OCR", "OCR no extrajo texto. Doc en blanco.")
@@ -97,6 +107,7 @@ def ejecutar_flujo_completo_paso1(ruta_imagen_seleccionada, section_data_paso1):
         if "language 'spa' is not supported" in str(e).lower() or "error opening data file" in str(e).lower():
             msg = "Error: Paquete idioma 'spa' Tesseract no instalado."
         messagebox.showerror("Error Tesseract", msg); print(msg); return False
+    except ErrorOCR as e: msg = f"Error Tesseract OCR: {e}"; messagebox.showerror("Error Tesseract", msg); print(msg); return False
     except Exception as e: msg = f"Error OCR: {e}"; messagebox.showerror("Error OCR", msg); print(msg); return False
     nombre_doc = "WORD #1.docx"; print(f"P1: Guardando en '{nombre_doc}'...")
     if guardar_en_word(texto_transcrito, nombre_doc):
@@ -2,10 +2,32 @@
 
 import spacy
 from spacy.matcher import Matcher
+from spacy.tokens import DocBin
 from sentence_transformers import SentenceTransformer, util
+import torch
+import numpy as np
+import hashlib
+from collections import Counter
+from functools import lru_cache
+import glob
 import json
 import os
 import re
+import sys
+import atexit
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# --- INICIO: Añadir raíz del proyecto a sys.path (para importar modules/ al ejecutar este archivo directamente) ---
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+# --- FIN ---
+from modules.cache_embeddings import CacheLRUEmbeddings, normalizar_texto_cache
+from modules.automata_palabras_clave import AutomataPalabrasClave, combinar_numeros_compuestos, RE_SEPARADOR_NUMERO
+from modules import trazas
+from modules.registros_resultado import ResultadoExtraccion
 
 FRASES_CLAVE_PARAMETROS = {
     "llegada": [
@@ -85,8 +107,56 @@ FRASES_CLAVE_PARAMETROS = {
 NLP_SPACY = None
 MODEL_SENTENCE_TRANSFORMERS = None
 EMBEDDINGS_FRASES_CLAVE = {}
+# Carga concurrente: cargar_modelos_y_precalcular_embeddings corre una sola vez bajo LOCK_CARGA_MODELOS y
+# MODELOS_LISTOS se publica al final, así que ningún hilo usa un estado a medio cargar (ni uno que se está
+# reiniciando por un error). Después de la carga los modelos solo se leen.
+LOCK_CARGA_MODELOS = threading.RLock()
+MODELOS_LISTOS = False
+# spaCy, el Matcher y las reglas se ejecutan en paralelo entre hilos; el encoder se serializa con LOCK_ENCODER:
+# el tokenizer rápido de Hugging Face puede fallar con "Already borrowed" si dos hilos lo usan a la vez (según la
+# versión de `tokenizers`) y torch ya paraleliza cada llamada en sus hilos intra-op. NLP_SERIALIZAR_ENCODER=0 lo desactiva.
+SERIALIZAR_ENCODER = os.environ.get("NLP_SERIALIZAR_ENCODER", "1") == "1"
+LOCK_ENCODER = threading.Lock()
+# Matriz única [llegada; servicio] con el rango de filas, las etiquetas y los índices de top-k de cada categoría
+# (FrasesClaveApiladas, ver apilar_embeddings_frases_clave)
+FRASES_CLAVE_APILADAS = None
+# Prototipos (centroides o medoides) de las frases clave generados con src/prototipos_frases_clave.py. Si están
+# activos se apilan en lugar de todas las frases.
+USAR_PROTOTIPOS_FRASES_CLAVE = os.environ.get("NLP_PROTOTIPOS_FRASES", "0") == "1"
+EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE = {}
+ETIQUETAS_PROTOTIPOS_FRASES_CLAVE = {}
+CATEGORIAS_SIMILITUD = ["llegada", "servicio"]
+# Top-k de frases clave por oración y categoría (0 = solo el máximo, camino por defecto)
+TOP_K_FRASES_CLAVE = int(os.environ.get("NLP_TOP_K_FRASES", "0"))
+# Con top-k activo, diferencias de similitud menores a este margen se desempatan con el promedio del top-k
+MARGEN_EMPATE_TOPK = 0.02
+NOMBRE_MODELO_SENTENCE_TRANSFORMERS = 'paraphrase-multilingual-MiniLM-L12-v2'
+# Backend del encoder en CPU: "torch" (fp32), "int8" (torch.ao.quantization.quantize_dynamic sobre las capas Linear)
+# u "onnx" (ONNX Runtime vía SentenceTransformer(backend="onnx"), requiere `pip install sentence-transformers[onnx]`).
+BACKENDS_ENCODER = ("torch", "int8", "onnx")
+BACKEND_ENCODER = os.environ.get("NLP_BACKEND_ENCODER", "torch")
+BACKEND_ENCODER_ACTIVO = None # el que efectivamente se cargó (puede caer a "torch" si falta onnxruntime)
+NOMBRE_MODELO_SPACY = "es_core_news_sm"
+# Perfiles de carga de spaCy: "exclude" se pasa a spacy.load y "habilitar" activa componentes que el modelo trae
+# deshabilitados. El pipeline solo usa límites de oración, lemas, like_num y lower: "ligero" descarta NER (y el senter,
+# que viene deshabilitado) sin cambiar la salida; "minimo" además reemplaza el parser por el senter para los límites
+# de oración, lo que puede cortar algunas oraciones distinto.
+PERFILES_CARGA_SPACY = {
+    "completo": {},
+    "ligero": {"exclude": ["ner", "senter"]},
+    "minimo": {"exclude": ["ner", "parser"], "habilitar": ["senter"]},
+}
+PERFIL_CARGA_SPACY = os.environ.get("NLP_PERFIL_SPACY", "ligero")
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+# Subir esta versión si cambia el formato del archivo de embeddings en disco
+VERSION_CACHE_EMBEDDINGS = 1
+# Cache LRU de embeddings de oraciones (clave: oración normalizada). 0 MB lo deshabilita; con
+# NLP_CACHE_EMBEDDINGS_DISCO=1 se carga de data/cache al iniciar y se guarda al salir del proceso.
+MAX_MB_CACHE_EMBEDDINGS_ORACIONES = float(os.environ.get("NLP_CACHE_EMBEDDINGS_MB", "32"))
+CACHE_EMBEDDINGS_ORACIONES_EN_DISCO = os.environ.get("NLP_CACHE_EMBEDDINGS_DISCO", "0") == "1"
+CACHE_EMBEDDINGS_ORACIONES = CacheLRUEmbeddings(int(MAX_MB_CACHE_EMBEDDINGS_ORACIONES * 1024 * 1024))
 
 # --- Diccionario para números en palabras (MODIFICADO POR USUARIO) ---
 NUMEROS_EN_PALABRAS_MAP = {
@@ -98,104 +168,462 @@ NUMEROS_EN_PALABRAS_MAP = {
     "veintiséis": 26, "veintisiete": 27, "veintiocho": 28, "veintinueve": 29,
     "treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60,
     "setenta": 70, "ochenta": 80, "noventa": 90, "cien": 100, "ciento": 100,
+    "doscientos": 200, "doscientas": 200, "trescientos": 300, "trescientas": 300, "cuatrocientos": 400,
+    "cuatrocientas": 400, "quinientos": 500, "quinientas": 500, "seiscientos": 600, "seiscientas": 600,
+    "setecientos": 700, "setecientas": 700, "ochocientos": 800, "ochocientas": 800, "novecientos": 900,
+    "novecientas": 900, "mil": 1000,
 }
 PALABRAS_NUMERO_REGEX = r"(?<!\w)(" + "|".join(NUMEROS_EN_PALABRAS_MAP.keys()) + r")(?!\w)"
 DIGITAL_NUMERO_REGEX = r"\b\d+([.,]\d+)?\b"
 
 
-def cargar_modelos_y_precalcular_embeddings():
-    global NLP_SPACY, MODEL_SENTENCE_TRANSFORMERS, EMBEDDINGS_FRASES_CLAVE
-    if NLP_SPACY and MODEL_SENTENCE_TRANSFORMERS and \
-        EMBEDDINGS_FRASES_CLAVE.get("llegada") is not None and \
-        EMBEDDINGS_FRASES_CLAVE.get("servicio") is not None:
-        return
-    print("Cargando modelos NLP y precalculando embeddings de frases clave...")
+class FrasesClaveApiladas:
+    """
+    Estado de puntuación que se publica entero en FRASES_CLAVE_APILADAS: un hilo que extrae toma el objeto una vez
+    y nunca combina la matriz nueva con offsets o etiquetas de la anterior (p. ej. al activar prototipos).
+
+    Args:
+        matriz (torch.Tensor): Embeddings [llegada; servicio] (o sus prototipos) apilados.
+        offsets (dict): {cat: (inicio, fin)} filas de cada categoría en la matriz.
+        etiquetas (dict): {cat: [frase o prototipo por fila]}.
+        indices_topk (torch.Tensor): [categoría x máx. frases] columnas de cada categoría (relleno con la 0).
+        mascara_topk (torch.Tensor): Posiciones válidas de indices_topk.
+    """
+    __slots__ = ("matriz", "offsets", "etiquetas", "indices_topk", "mascara_topk")
+
+    def __init__(self, matriz, offsets, etiquetas, indices_topk, mascara_topk):
+        self.matriz, self.offsets, self.etiquetas, self.indices_topk, self.mascara_topk = matriz, offsets, etiquetas, indices_topk, mascara_topk
+
+def apilar_embeddings_frases_clave():
+    """Concatena los embeddings de llegada y servicio (o sus prototipos, si están activos) en una sola matriz y publica
+    junto con ella el rango de filas, las etiquetas y los índices de top-k de cada categoría (bajo LOCK_CARGA_MODELOS)."""
+    global FRASES_CLAVE_APILADAS
+    with LOCK_CARGA_MODELOS:
+        usar_prototipos = bool(EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE)
+        fuente = EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE if usar_prototipos else EMBEDDINGS_FRASES_CLAVE
+        bloques = []; offsets = {}; etiquetas = {}; inicio = 0
+        for cat in CATEGORIAS_SIMILITUD:
+            emb_cat = fuente.get(cat)
+            if emb_cat is None: FRASES_CLAVE_APILADAS = None; return None
+            bloques.append(emb_cat); offsets[cat] = (inicio, inicio + emb_cat.shape[0]); inicio += emb_cat.shape[0]
+            etiquetas[cat] = ETIQUETAS_PROTOTIPOS_FRASES_CLAVE[cat] if usar_prototipos else FRASES_CLAVE_PARAMETROS[cat]
+        matriz = torch.cat(bloques, dim=0)
+        FRASES_CLAVE_APILADAS = FrasesClaveApiladas(matriz, offsets, etiquetas, *indexar_top_k_frases_clave(offsets, matriz.device))
+        return FRASES_CLAVE_APILADAS
+
+def indexar_top_k_frases_clave(offsets, dispositivo):
+    """Tensor de índices [categoría x máx. frases] (relleno con la columna 0) y su máscara para top_k_frases_clave."""
+    max_frases = max((fin - inicio for inicio, fin in offsets.values()), default=0)
+    indices = torch.zeros((len(CATEGORIAS_SIMILITUD), max_frases), dtype=torch.long)
+    mascara = torch.zeros((len(CATEGORIAS_SIMILITUD), max_frases), dtype=torch.bool)
+    for c, cat in enumerate(CATEGORIAS_SIMILITUD):
+        inicio, fin = offsets[cat]
+        indices[c, :fin - inicio] = torch.arange(inicio, fin); mascara[c, :fin - inicio] = True
+    return indices.to(dispositivo), mascara.to(dispositivo)
+
+def top_k_frases_clave(similitudes, k, apiladas=None):
+    """Las k frases clave más similares por oración y categoría con un solo torch.topk.
+
+    `similitudes` es [oraciones x frases apiladas] contra `apiladas.matriz` (por defecto FRASES_CLAVE_APILADAS); devuelve
+    (valores, índices) de forma [oraciones x categorías x k], con índices relativos a apiladas.etiquetas[cat] y -inf en
+    los valores de relleno si una categoría tiene menos de k frases.
+    """
+    apiladas = apiladas or FRASES_CLAVE_APILADAS
+    por_categoria = similitudes[:, apiladas.indices_topk].masked_fill(~apiladas.mascara_topk, float("-inf"))
+    return torch.topk(por_categoria, min(k, por_categoria.shape[2]), dim=2)
+
+# --- Cache en disco de embeddings de frases clave ---
+def clave_cache_embeddings_frases_clave():
+    """Hash del contenido de las listas de frases clave (llegada/servicio) y del modelo; cambia si se edita cualquiera de ellos."""
+    contenido = {"version": VERSION_CACHE_EMBEDDINGS, "modelo": NOMBRE_MODELO_SENTENCE_TRANSFORMERS,
+                 "frases": {cat: FRASES_CLAVE_PARAMETROS.get(cat, []) for cat in CATEGORIAS_SIMILITUD}}
+    if BACKEND_ENCODER_ACTIVO not in (None, "torch"): contenido["backend"] = BACKEND_ENCODER_ACTIVO # los embeddings int8/onnx difieren levemente
+    contenido = json.dumps(contenido, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:16]
+
+def ruta_cache_embeddings_frases_clave():
+    return os.path.join(CACHE_DIR, f"embeddings_frases_clave_v{VERSION_CACHE_EMBEDDINGS}_{clave_cache_embeddings_frases_clave()}.npy")
+
+def cargar_embeddings_frases_clave_desde_cache():
+    """Mapea en memoria la matriz apilada [llegada; servicio] guardada en disco. Devuelve {cat: tensor} o None si no hay cache válido."""
+    ruta = ruta_cache_embeddings_frases_clave()
+    if not os.path.exists(ruta): return None
+    try:
+        matriz = np.load(ruta, mmap_mode="c") # copy-on-write: no se lee del disco hasta usarla y torch la acepta sin copiar
+        tamanos = [len(FRASES_CLAVE_PARAMETROS.get(cat, [])) for cat in CATEGORIAS_SIMILITUD]
+        if matriz.ndim != 2 or matriz.shape[0] != sum(tamanos):
+            trazas.advertencia(f"Cache de embeddings '{ruta}' con forma inesperada {matriz.shape}. Se recalcula."); return None
+        tensor = torch.from_numpy(matriz).to(MODEL_SENTENCE_TRANSFORMERS.device)
+        embeddings = {}; inicio = 0
+        for cat, tamano in zip(CATEGORIAS_SIMILITUD, tamanos):
+            embeddings[cat] = tensor[inicio:inicio + tamano] if tamano else None; inicio += tamano
+        return embeddings
+    except Exception as e:
+        trazas.advertencia(f"No se pudo leer el cache de embeddings '{ruta}': {e}"); return None
+
+def guardar_embeddings_frases_clave_en_cache():
+    """Escribe la matriz apilada en data/cache de forma atómica y elimina archivos de versiones/claves anteriores."""
+    if any(EMBEDDINGS_FRASES_CLAVE.get(cat) is None for cat in CATEGORIAS_SIMILITUD): return False
+    ruta = ruta_cache_embeddings_frases_clave()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        ruta_tmp = f"{ruta[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+        # Siempre todas las frases (no los prototipos), en el orden de CATEGORIAS_SIMILITUD
+        matriz = torch.cat([EMBEDDINGS_FRASES_CLAVE[cat] for cat in CATEGORIAS_SIMILITUD], dim=0)
+        np.save(ruta_tmp, matriz.detach().cpu().numpy().astype(np.float32))
+        os.replace(ruta_tmp, ruta)
+        for ruta_vieja in glob.glob(os.path.join(CACHE_DIR, "embeddings_frases_clave_v*.npy")):
+            if ruta_vieja != ruta:
+                try: os.remove(ruta_vieja)
+                except OSError: pass
+        return True
+    except Exception as e:
+        trazas.advertencia(f"No se pudo guardar el cache de embeddings en '{ruta}': {e}"); return False
+
+# --- Cache LRU de embeddings de oraciones ---
+def ruta_cache_embeddings_oraciones():
+    sufijo_backend = f":{BACKEND_ENCODER_ACTIVO}" if BACKEND_ENCODER_ACTIVO not in (None, "torch") else ""
+    clave_modelo = hashlib.sha256(f"{VERSION_CACHE_EMBEDDINGS}:{NOMBRE_MODELO_SENTENCE_TRANSFORMERS}{sufijo_backend}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"embeddings_oraciones_v{VERSION_CACHE_EMBEDDINGS}_{clave_modelo}.npz")
+
+def cargar_cache_embeddings_oraciones_desde_disco():
+    try: return CACHE_EMBEDDINGS_ORACIONES.cargar_desde_disco(ruta_cache_embeddings_oraciones())
+    except Exception as e:
+        trazas.advertencia(f"No se pudo leer el cache de embeddings de oraciones: {e}"); return 0
+
+def guardar_cache_embeddings_oraciones_en_disco():
+    try: return CACHE_EMBEDDINGS_ORACIONES.guardar_en_disco(ruta_cache_embeddings_oraciones())
+    except Exception as e:
+        trazas.advertencia(f"No se pudo guardar el cache de embeddings de oraciones: {e}"); return False
+
+def obtener_estadisticas_cache_embeddings(): return CACHE_EMBEDDINGS_ORACIONES.estadisticas()
+
+def codificar_con_encoder(textos, **kwargs):
+    """MODEL_SENTENCE_TRANSFORMERS.encode, serializado entre hilos con LOCK_ENCODER si SERIALIZAR_ENCODER."""
+    with LOCK_ENCODER if SERIALIZAR_ENCODER else contextlib.nullcontext():
+        return MODEL_SENTENCE_TRANSFORMERS.encode(textos, **kwargs)
+
+def codificar_oraciones(oraciones, batch_size=32):
+    """Embeddings [n x dim] de `oraciones`; solo las que no están en CACHE_EMBEDDINGS_ORACIONES pasan por el encoder."""
+    with trazas.span("embeddings", oraciones=len(oraciones)) as span_embeddings:
+        if CACHE_EMBEDDINGS_ORACIONES.max_bytes == 0:
+            span_embeddings.agregar(codificadas=len(oraciones))
+            return codificar_con_encoder(oraciones, convert_to_tensor=True, batch_size=batch_size)
+        return _codificar_oraciones_con_cache(oraciones, batch_size, span_embeddings)
+
+def _codificar_oraciones_con_cache(oraciones, batch_size, span_embeddings):
+    claves = [normalizar_texto_cache(oracion) for oracion in oraciones]
+    vectores = [CACHE_EMBEDDINGS_ORACIONES.obtener(clave) for clave in claves]
+    # Una sola llamada al encoder para las oraciones nuevas (sin repetir las que aparecen más de una vez)
+    pendientes = list(dict.fromkeys(oracion for oracion, vector in zip(oraciones, vectores) if vector is None))
+    span_embeddings.agregar(codificadas=len(pendientes))
+    if pendientes:
+        nuevos = codificar_con_encoder(pendientes, convert_to_numpy=True, batch_size=batch_size).astype(np.float32)
+        vector_por_oracion = dict(zip(pendientes, nuevos))
+        for oracion, vector in vector_por_oracion.items(): CACHE_EMBEDDINGS_ORACIONES.guardar(normalizar_texto_cache(oracion), vector)
+        vectores = [vector if vector is not None else vector_por_oracion[oracion] for oracion, vector in zip(oraciones, vectores)]
+    return torch.from_numpy(np.stack(vectores)).to(MODEL_SENTENCE_TRANSFORMERS.device)
+
+# --- Prototipos de frases clave ---
+RUTA_PROTOTIPOS_FRASES_CLAVE = os.path.join(DATA_DIR, "prototipos_frases_clave.npz")
+
+def cargar_prototipos_frases_clave(ruta=None):
+    """Lee un archivo de prototipos. Devuelve ({cat: tensor}, {cat: [etiquetas]}) o None si no existe o no corresponde a las frases clave actuales."""
+    ruta = ruta or RUTA_PROTOTIPOS_FRASES_CLAVE
+    if not os.path.exists(ruta): trazas.advertencia(f"No existe el archivo de prototipos '{ruta}'. Genérelo con src/prototipos_frases_clave.py."); return None
+    try:
+        with np.load(ruta) as datos:
+            if str(datos["clave_frases"]) != clave_cache_embeddings_frases_clave():
+                trazas.advertencia(f"Prototipos '{ruta}' generados para otras frases clave o modelo. Se usan todas las frases."); return None
+            embeddings = {cat: torch.from_numpy(datos[cat].astype(np.float32)).to(MODEL_SENTENCE_TRANSFORMERS.device) for cat in CATEGORIAS_SIMILITUD}
+            etiquetas = {cat: datos[f"{cat}_etiquetas"].tolist() for cat in CATEGORIAS_SIMILITUD}
+        return embeddings, etiquetas
+    except Exception as e:
+        trazas.advertencia(f"No se pudo leer el archivo de prototipos '{ruta}': {e}"); return None
+
+def activar_prototipos_frases_clave(ruta=None):
+    """Puntúa contra los prototipos en lugar de todas las frases clave. Requiere los modelos cargados; devuelve True si se activaron."""
+    global EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE, ETIQUETAS_PROTOTIPOS_FRASES_CLAVE
+    prototipos = cargar_prototipos_frases_clave(ruta)
+    if prototipos is None: return False
+    with LOCK_CARGA_MODELOS:
+        EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE, ETIQUETAS_PROTOTIPOS_FRASES_CLAVE = prototipos
+        apilar_embeddings_frases_clave()
+    trazas.info(f"Prototipos de frases clave activos: {({cat: len(e) for cat, e in ETIQUETAS_PROTOTIPOS_FRASES_CLAVE.items()})}.")
+    return True
+
+def desactivar_prototipos_frases_clave():
+    global EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE, ETIQUETAS_PROTOTIPOS_FRASES_CLAVE
+    with LOCK_CARGA_MODELOS:
+        EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE, ETIQUETAS_PROTOTIPOS_FRASES_CLAVE = {}, {}
+        apilar_embeddings_frases_clave()
+
+def cargar_encoder(backend=None):
+    """SentenceTransformer con el backend pedido; todos exponen el mismo `encode`. Devuelve (modelo, backend_cargado)."""
+    backend = backend or BACKEND_ENCODER
+    if backend not in BACKENDS_ENCODER:
+        raise ValueError(f"Backend de encoder desconocido: '{backend}'. Opciones: {list(BACKENDS_ENCODER)}")
+    with trazas.span("carga_encoder", modelo=NOMBRE_MODELO_SENTENCE_TRANSFORMERS, backend_pedido=backend) as span_carga:
+        modelo, backend = _cargar_encoder_backend(backend)
+        span_carga.agregar(backend=backend)
+    return modelo, backend
+
+def _cargar_encoder_backend(backend):
+    if backend == "onnx":
+        try: return SentenceTransformer(NOMBRE_MODELO_SENTENCE_TRANSFORMERS, backend="onnx", model_kwargs={"provider": "CPUExecutionProvider"}), "onnx"
+        except Exception as e: # sentence-transformers antiguo (sin `backend`) o falta optimum/onnxruntime
+            trazas.advertencia(f"No se pudo cargar el backend ONNX ({e}). Se usa torch fp32."); backend = "torch"
+    modelo = SentenceTransformer(NOMBRE_MODELO_SENTENCE_TRANSFORMERS, device="cpu" if backend == "int8" else None)
+    if backend == "int8":
+        # Cuantización dinámica: pesos de las capas Linear en int8, activaciones cuantizadas al vuelo (solo CPU)
+        modelo = torch.ao.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+    return modelo, backend
+
+def cargar_modelo_spacy(perfil=None):
+    perfil = perfil or PERFIL_CARGA_SPACY
+    if perfil not in PERFILES_CARGA_SPACY:
+        raise ValueError(f"Perfil de carga spaCy desconocido: '{perfil}'. Opciones: {list(PERFILES_CARGA_SPACY)}")
+    config_perfil = PERFILES_CARGA_SPACY[perfil]
+    with trazas.span("carga_spacy", modelo=NOMBRE_MODELO_SPACY, perfil=perfil) as span_carga:
+        nlp = spacy.load(NOMBRE_MODELO_SPACY, exclude=config_perfil.get("exclude", []))
+        for componente in config_perfil.get("habilitar", []): nlp.enable_pipe(componente)
+        span_carga.agregar(componentes=",".join(nlp.pipe_names))
+    return nlp
+
+def cargar_modelos_y_precalcular_embeddings(usar_cache_embeddings=True, perfil_spacy=None, backend_encoder=None):
+    if modelos_cargados(): return
+    with LOCK_CARGA_MODELOS:
+        if modelos_cargados(): return # otro hilo terminó la carga mientras este esperaba
+        _cargar_modelos_y_precalcular_embeddings(usar_cache_embeddings, perfil_spacy, backend_encoder)
+
+def _cargar_modelos_y_precalcular_embeddings(usar_cache_embeddings, perfil_spacy, backend_encoder):
+    global NLP_SPACY, MODEL_SENTENCE_TRANSFORMERS, BACKEND_ENCODER_ACTIVO, EMBEDDINGS_FRASES_CLAVE, FRASES_CLAVE_APILADAS, MATCHERS_SPACY, MODELOS_LISTOS
+    MODELOS_LISTOS = False
+    trazas.info("Cargando modelos NLP y precalculando embeddings de frases clave...")
+    span_carga = trazas.iniciar_span("carga_modelos")
     try:
-        if NLP_SPACY is None: NLP_SPACY = spacy.load("es_core_news_sm")
-        if MODEL_SENTENCE_TRANSFORMERS is None: MODEL_SENTENCE_TRANSFORMERS = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        if NLP_SPACY is None: NLP_SPACY = cargar_modelo_spacy(perfil_spacy)
+        if MODEL_SENTENCE_TRANSFORMERS is None:
+            MODEL_SENTENCE_TRANSFORMERS, BACKEND_ENCODER_ACTIVO = cargar_encoder(backend_encoder)
+            trazas.info(f"Encoder '{NOMBRE_MODELO_SENTENCE_TRANSFORMERS}' cargado con backend {BACKEND_ENCODER_ACTIVO}.")
         if not EMBEDDINGS_FRASES_CLAVE or EMBEDDINGS_FRASES_CLAVE.get("llegada") is None or EMBEDDINGS_FRASES_CLAVE.get("servicio") is None:
-            EMBEDDINGS_FRASES_CLAVE = {}
-            for cat, frases in FRASES_CLAVE_PARAMETROS.items():
-                if cat in ["llegada", "servicio"] and frases:
-                    EMBEDDINGS_FRASES_CLAVE[cat] = MODEL_SENTENCE_TRANSFORMERS.encode(frases, convert_to_tensor=True)
-                elif cat in ["llegada", "servicio"]: EMBEDDINGS_FRASES_CLAVE[cat] = None
-            if EMBEDDINGS_FRASES_CLAVE.get("llegada") is not None and EMBEDDINGS_FRASES_CLAVE.get("servicio") is not None: print("Embeddings precalculados.")
-            else: print("Advertencia: No se generaron embeddings para llegada/servicio.")
-        else: print("Embeddings ya precalculados.")
-        print("Modelos NLP listos.")
+            with trazas.span("embeddings_frases_clave") as span_frases:
+                embeddings_cache = cargar_embeddings_frases_clave_desde_cache() if usar_cache_embeddings else None
+                if embeddings_cache is not None:
+                    EMBEDDINGS_FRASES_CLAVE = embeddings_cache; span_frases.agregar(origen="cache"); trazas.info("Embeddings cargados desde cache en disco.")
+                else:
+                    EMBEDDINGS_FRASES_CLAVE = {}; span_frases.agregar(origen="encoder", frases=sum(len(f) for c, f in FRASES_CLAVE_PARAMETROS.items() if c in CATEGORIAS_SIMILITUD))
+                    for cat, frases in FRASES_CLAVE_PARAMETROS.items():
+                        if cat in ["llegada", "servicio"] and frases:
+                            EMBEDDINGS_FRASES_CLAVE[cat] = MODEL_SENTENCE_TRANSFORMERS.encode(frases, convert_to_tensor=True)
+                        elif cat in ["llegada", "servicio"]: EMBEDDINGS_FRASES_CLAVE[cat] = None
+                    if EMBEDDINGS_FRASES_CLAVE.get("llegada") is not None and EMBEDDINGS_FRASES_CLAVE.get("servicio") is not None:
+                        trazas.info("Embeddings precalculados.")
+                        apilar_embeddings_frases_clave()
+                        if usar_cache_embeddings and guardar_embeddings_frases_clave_en_cache(): trazas.info("Embeddings guardados en cache en disco.")
+                    else: trazas.advertencia("No se generaron embeddings para llegada/servicio.")
+        else: trazas.info("Embeddings ya precalculados.")
+        apilar_embeddings_frases_clave()
+        if USAR_PROTOTIPOS_FRASES_CLAVE and not EMBEDDINGS_PROTOTIPOS_FRASES_CLAVE: activar_prototipos_frases_clave()
+        construir_matchers_spacy()
+        if CACHE_EMBEDDINGS_ORACIONES_EN_DISCO and len(CACHE_EMBEDDINGS_ORACIONES) == 0:
+            n_oraciones = cargar_cache_embeddings_oraciones_desde_disco()
+            if n_oraciones: trazas.info(f"Cache de embeddings de oraciones: {n_oraciones} entradas leídas de disco.")
+            atexit.register(guardar_cache_embeddings_oraciones_en_disco)
+        MODELOS_LISTOS = modelos_cargados(requerir_listos=False)
+        trazas.info("Modelos NLP listos.")
     except Exception as e:
-        print(f"Error cargando modelos/embeddings: {e}")
-        NLP_SPACY, MODEL_SENTENCE_TRANSFORMERS, EMBEDDINGS_FRASES_CLAVE = None, None, {}
+        trazas.error(f"No se pudieron cargar los modelos/embeddings: {e}")
+        NLP_SPACY, MODEL_SENTENCE_TRANSFORMERS, EMBEDDINGS_FRASES_CLAVE, BACKEND_ENCODER_ACTIVO = None, None, {}, None
+        FRASES_CLAVE_APILADAS, MATCHERS_SPACY = None, {}
+    span_carga.terminar(ok=NLP_SPACY is not None)
 
 def inicializar_estructura_salida():
-    return {
-        "texto_original": None,
-        "parametros_extraidos": {
-            "tasa_llegada": {"valor": None, "unidades": None, "distribucion": None, "fragmento_texto": None},
-            "tiempo_entre_llegadas": {"valor": None, "unidades": None, "distribucion": None, "fragmento_texto": None},
-            "tasa_servicio_por_servidor": {"valor": None, "unidades": None, "distribucion": None, "fragmento_texto": None},
-            "tiempo_servicio_por_servidor": {"valor": None, "unidades": None, "distribucion": None, "fragmento_texto": None},
-            "cantidad_servidores": {"valor": None, "fragmento_texto": None},
-            "capacidad_sistema": {"valor": None, "fragmento_texto": None},
-            "disciplina_cola": {"valor": None, "fragmento_texto": None}
-        },
-        "oraciones_candidatas_debug": {"llegada": [], "servicio": []}, "errores": []
-    }
+    """Resultado vacío como registro con __slots__ (ResultadoExtraccion); .to_dict() da la forma JSON de siempre."""
+    return ResultadoExtraccion()
+
+def salida_resultado(resultado, como_registro=False):
+    """Lo que devuelven las funciones públicas: el registro tal cual o su forma JSON (dicts anidados, por defecto)."""
+    return resultado if como_registro else resultado.to_dict()
+
+# --- Cache en disco de Docs de spaCy (DocBin) ---
+# Un archivo .spacy por texto, nombrado por el hash del texto y del modelo/perfil; al superar el tamaño máximo se
+# borran los de acceso más antiguo (mtime). 0 MB lo deshabilita.
+CACHE_DOCS_DIR = os.path.join(CACHE_DIR, "docs")
+MAX_MB_CACHE_DOCS = float(os.environ.get("NLP_CACHE_DOCS_MB", "64"))
+CONTEO_CACHE_DOCS = Counter()
+# Total estimado de bytes en disco: se recorre el directorio con el primer guardado y después solo al superar el máximo
+BYTES_CACHE_DOCS = None
+FRACCION_DESALOJO_CACHE_DOCS = 0.9 # al desalojar se baja a esta fracción del máximo para no recorrer en cada guardado
+LOCK_CACHE_DOCS = threading.Lock() # protege BYTES_CACHE_DOCS y CONTEO_CACHE_DOCS
+
+def contar_cache_docs(evento, n=1):
+    with LOCK_CACHE_DOCS: CONTEO_CACHE_DOCS[evento] += n
+
+def clave_cache_doc(texto_entrada):
+    """Hash del texto junto con nombre y versión del modelo spaCy, versión de spaCy y componentes activos."""
+    meta = NLP_SPACY.meta
+    identificador_modelo = f"{meta.get('lang')}_{meta.get('name')}:{meta.get('version')}:{spacy.__version__}:{','.join(NLP_SPACY.pipe_names)}"
+    return hashlib.sha256(f"{identificador_modelo}\n{texto_entrada}".encode("utf-8")).hexdigest()
+
+def cargar_doc_desde_cache(texto_entrada):
+    if MAX_MB_CACHE_DOCS <= 0: return None
+    ruta = os.path.join(CACHE_DOCS_DIR, f"{clave_cache_doc(texto_entrada)}.spacy")
+    try:
+        with open(ruta, "rb") as f: doc_bin = DocBin().from_bytes(f.read())
+        doc_spacy = next(iter(doc_bin.get_docs(NLP_SPACY.vocab)))
+        os.utime(ruta) # marca de uso reciente para el desalojo
+    except FileNotFoundError: contar_cache_docs("fallos"); return None
+    except Exception as e:
+        trazas.advertencia(f"Entrada de cache de Docs '{ruta}' ilegible ({e}). Se vuelve a parsear."); contar_cache_docs("fallos"); return None
+    if doc_spacy.text != texto_entrada: contar_cache_docs("fallos"); return None
+    contar_cache_docs("aciertos")
+    return doc_spacy
+
+def guardar_doc_en_cache(texto_entrada, doc_spacy):
+    if MAX_MB_CACHE_DOCS <= 0: return False
+    ruta = os.path.join(CACHE_DOCS_DIR, f"{clave_cache_doc(texto_entrada)}.spacy")
+    try:
+        os.makedirs(CACHE_DOCS_DIR, exist_ok=True)
+        ruta_tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp" # dos hilos pueden guardar el mismo texto
+        datos = DocBin(docs=[doc_spacy]).to_bytes()
+        with open(ruta_tmp, "wb") as f: f.write(datos)
+        os.replace(ruta_tmp, ruta)
+        registrar_bytes_cache_docs(len(datos))
+        return True
+    except Exception as e:
+        trazas.advertencia(f"No se pudo guardar el Doc en cache '{ruta}': {e}"); return False
+
+def entradas_cache_docs():
+    """[(mtime, bytes, ruta)] de los Docs guardados."""
+    entradas = []
+    for ruta in glob.glob(os.path.join(CACHE_DOCS_DIR, "*.spacy")):
+        try: info = os.stat(ruta); entradas.append((info.st_mtime, info.st_size, ruta))
+        except OSError: pass
+    return entradas
+
+def registrar_bytes_cache_docs(bytes_nuevos):
+    """Suma un Doc recién guardado al total estimado y desaloja solo si supera MAX_MB_CACHE_DOCS (reemplazos cuentan doble hasta el próximo recorrido)."""
+    global BYTES_CACHE_DOCS
+    with LOCK_CACHE_DOCS:
+        if BYTES_CACHE_DOCS is None: BYTES_CACHE_DOCS = sum(e[1] for e in entradas_cache_docs())
+        else: BYTES_CACHE_DOCS += bytes_nuevos
+        excedido = BYTES_CACHE_DOCS > MAX_MB_CACHE_DOCS * 1024 * 1024
+    if excedido: desalojar_cache_docs(FRACCION_DESALOJO_CACHE_DOCS)
+
+def desalojar_cache_docs(fraccion=1.0):
+    """Borra los Docs de uso más antiguo hasta que el directorio quede bajo `fraccion` de MAX_MB_CACHE_DOCS y actualiza el total estimado."""
+    global BYTES_CACHE_DOCS
+    entradas = entradas_cache_docs()
+    total, maximo, desalojos = sum(e[1] for e in entradas), fraccion * MAX_MB_CACHE_DOCS * 1024 * 1024, 0
+    for _, tamano, ruta in sorted(entradas):
+        if total <= maximo: break
+        try: os.remove(ruta); total -= tamano; desalojos += 1
+        except FileNotFoundError: total -= tamano # ya la borró otro hilo o proceso
+        except OSError: pass
+    with LOCK_CACHE_DOCS: BYTES_CACHE_DOCS = total; CONTEO_CACHE_DOCS["desalojos"] += desalojos
+
+def obtener_estadisticas_cache_docs():
+    with LOCK_CACHE_DOCS: return dict(CONTEO_CACHE_DOCS)
+
+def parsear_texto(texto_entrada):
+    """Doc de spaCy del texto: desde el cache en disco si existe (sin tokenizar ni pasar por el pipeline), si no se parsea y se guarda."""
+    with trazas.span("parseo", caracteres=len(texto_entrada)) as span_parseo:
+        doc_spacy = cargar_doc_desde_cache(texto_entrada)
+        span_parseo.agregar(desde_cache=doc_spacy is not None)
+        if doc_spacy is None:
+            doc_spacy = NLP_SPACY(texto_entrada)
+            guardar_doc_en_cache(texto_entrada, doc_spacy)
+        span_parseo.agregar(tokens=len(doc_spacy))
+    return doc_spacy
 
 def procesar_texto_basico(texto_entrada):
     if NLP_SPACY is None:
         resultado = inicializar_estructura_salida(); resultado["errores"].append("spaCy no cargado."); return None, resultado
-    doc_spacy = NLP_SPACY(texto_entrada)
+    doc_spacy = parsear_texto(texto_entrada)
     resultado = inicializar_estructura_salida(); resultado["texto_original"] = texto_entrada
     return doc_spacy, resultado
 
 # --- Tarea 2.2: Extracción de Valor Numérico y Unidades ---
+# Patrones precompilados a nivel de módulo: se construyen una vez al importar en lugar de en cada llamada
+UNIDADES_TIEMPO_SINGULAR = ["segundo", "minuto", "hora", "día", "semana", "mes", "año"]
+UNIDADES_TIEMPO_PLURAL = ["segundos", "minutos", "horas", "días", "semanas", "meses", "años"]
+UNIDADES_TIEMPO_SET = frozenset(UNIDADES_TIEMPO_SINGULAR + UNIDADES_TIEMPO_PLURAL)
+ENTIDADES_COMUNES = ["cliente", "paciente", "unidad", "ítem", "item", "trabajo", "pedido", "vehículo", "tarea", "consulta", "llamada", "operacion", "evento"]
+UNIT_TIME_CAPTURE_REGEX = rf"({'|'.join(UNIDADES_TIEMPO_SINGULAR + UNIDADES_TIEMPO_PLURAL)})"
+ENTITY_CAPTURE_REGEX = rf"({'|'.join([e + 's?' for e in ENTIDADES_COMUNES])})"
+
+ENTIDADES_COMUNES_SET = frozenset(e + sufijo for e in ENTIDADES_COMUNES for sufijo in ("", "s"))
+
+# Escáner de una sola pasada sobre los hits de AUTOMATA_PALABRAS_CLAVE: cada palabra es número en palabra, número con
+# dígitos, entidad o unidad de tiempo. Equivale a PALABRAS_NUMERO_REGEX / DIGITAL_NUMERO_REGEX / \b(entidad)\b, que
+# exigen límites de palabra a ambos lados, sin probar la alternancia de ~60 palabras en cada posición del texto.
+# Los números en palabras consecutivos se unen en compuestos ("treinta y cinco", "ciento veinte").
+RE_SECUENCIA_PALABRA = re.compile(r"\w+")
+RE_TASA_COMPLETA = re.compile(rf"\b{ENTITY_CAPTURE_REGEX}\b\s*(?:por|al|/)\s*\b{UNIT_TIME_CAPTURE_REGEX}\b", re.IGNORECASE)
+RE_TIEMPO_POR_ENTIDAD = re.compile(rf"\b{UNIT_TIME_CAPTURE_REGEX}\b\s*(?:por|al|/)\s*\b{ENTITY_CAPTURE_REGEX}\b", re.IGNORECASE)
+RE_POR_UNIDAD_TIEMPO = re.compile(rf"(?:por|al)\s*\b{UNIT_TIME_CAPTURE_REGEX}\b", re.IGNORECASE)
+RE_UNIDAD_TIEMPO_SOLA = re.compile(rf"\b{UNIT_TIME_CAPTURE_REGEX}\b", re.IGNORECASE)
+RE_ENTIDAD_COMPLETA = re.compile(rf"\b{ENTITY_CAPTURE_REGEX}\b", re.IGNORECASE)
+RE_CADA_ANTES_NUMERO = re.compile(r"cada\s*$", re.IGNORECASE)
+RE_CONTEXTO_TASA = re.compile(r"\b(tasa|frecuencia|razón\s+de|ritmo\s+de|velocidad\s+de)\b", re.IGNORECASE)
+
+def escanear_numeros_y_entidades(texto_oracion):
+    """Recorre la oración una vez y devuelve (posibles_numeros, entidades, hay_unidad_tiempo).
+
+    posibles_numeros: [{"valor", "texto", "pos", "es_palabra"}] y entidades: [(inicio, fin, texto_en_minúsculas)],
+    ambos en orden de aparición; hay_unidad_tiempo indica si aparece alguna palabra de UNIDADES_TIEMPO_SET.
+    Cifras seguidas de "mil" ("2 mil", "1.5 mil") se toman como un solo número multiplicado por mil, que puede seguir
+    combinándose con números en palabras ("2 mil quinientos").
+    """
+    posibles_numeros = []; entidades = []; hay_unidad_tiempo = False; consumido_hasta = -1; n_numeros_palabra = 0
+    for inicio, fin, tipo, patron, valor in indexar_palabras_clave(texto_oracion):
+        if inicio < consumido_hasta: continue # parte decimal de un número ya registrado
+        if tipo == "numero":
+            anterior = posibles_numeros[-1] if posibles_numeros else None
+            if valor == 1000 and anterior and not anterior["es_palabra"] and RE_SEPARADOR_NUMERO.fullmatch(texto_oracion[anterior["pos"][1]:inicio]):
+                anterior.update({"valor": anterior["valor"] * 1000, "texto": texto_oracion[anterior["pos"][0]:fin].lower(), "pos": (anterior["pos"][0], fin), "es_palabra": True})
+                n_numeros_palabra += 1; continue
+            posibles_numeros.append({"valor": float(valor), "texto": patron, "pos": (inicio, fin), "es_palabra": True}); n_numeros_palabra += 1
+        elif tipo == "digitos":
+            if fin + 1 < len(texto_oracion) and texto_oracion[fin] in ".,":
+                m_decimal = RE_SECUENCIA_PALABRA.match(texto_oracion, fin + 1)
+                if m_decimal and m_decimal.group().isdecimal(): fin = consumido_hasta = m_decimal.end()
+            texto_num = texto_oracion[inicio:fin]
+            posibles_numeros.append({"valor": float(texto_num.replace(",", ".")), "texto": texto_num, "pos": (inicio, fin), "es_palabra": False})
+        elif tipo == "entidad":
+            entidades.append((inicio, fin, patron))
+        elif tipo == "unidad_tiempo":
+            hay_unidad_tiempo = True
+    if n_numeros_palabra > 1: posibles_numeros = unir_numeros_compuestos(texto_oracion, posibles_numeros)
+    return posibles_numeros, entidades, hay_unidad_tiempo
+
+def unir_numeros_compuestos(texto_oracion, posibles_numeros):
+    """Reemplaza las secuencias de números en palabra que forman un compuesto (combinar_numeros_compuestos) por un único número."""
+    palabras = [n for n in posibles_numeros if n["es_palabra"]]
+    compuestos = combinar_numeros_compuestos(texto_oracion, [(n["pos"][0], n["pos"][1], n["valor"]) for n in palabras])
+    if len(compuestos) == len(palabras): return posibles_numeros
+    numeros = [n for n in posibles_numeros if not n["es_palabra"]]
+    numeros += [{"valor": float(valor), "texto": texto_oracion[inicio:fin].lower(), "pos": (inicio, fin), "es_palabra": True} for inicio, fin, valor, _ in compuestos]
+    return sorted(numeros, key=lambda n: n["pos"][0])
+
 def extraer_valor_y_unidad_de_oracion(texto_oracion_candidata):
-    unidades_tiempo_singular_list = ["segundo", "minuto", "hora", "día", "semana", "mes", "año"]
-    unidades_tiempo_plural_list = ["segundos", "minutos", "horas", "días", "semanas", "meses", "años"]
-    known_time_units_set = set(unidades_tiempo_singular_list + unidades_tiempo_plural_list)
-
-    UNIT_TIME_CAPTURE_REGEX = rf"({'|'.join(unidades_tiempo_singular_list + unidades_tiempo_plural_list)})"
-    entidades_comunes_list = ["cliente", "paciente", "unidad", "ítem", "item", "trabajo", "pedido", "vehículo", "tarea", "consulta", "llamada", "operacion", "evento"]
-    ENTITY_CAPTURE_REGEX = rf"({'|'.join([e + 's?' for e in entidades_comunes_list])})"
-
-    patron_tasa_completa = rf"\b{ENTITY_CAPTURE_REGEX}\b\s*(?:por|al|/)\s*\b{UNIT_TIME_CAPTURE_REGEX}\b"
-    patron_tiempo_por_entidad = rf"\b{UNIT_TIME_CAPTURE_REGEX}\b\s*(?:por|al|/)\s*\b{ENTITY_CAPTURE_REGEX}\b"
-    patron_por_unidad_tiempo = rf"(?:por|al)\s*\b{UNIT_TIME_CAPTURE_REGEX}\b"
-    patron_unidad_tiempo_sola = rf"\b{UNIT_TIME_CAPTURE_REGEX}\b"
-
-    posibles_numeros = []
-    for match_palabra in re.finditer(PALABRAS_NUMERO_REGEX, texto_oracion_candidata, re.IGNORECASE):
-        palabra = match_palabra.group(1).lower()
-        if palabra in NUMEROS_EN_PALABRAS_MAP:
-            posibles_numeros.append({
-                "valor": float(NUMEROS_EN_PALABRAS_MAP[palabra]), "texto": palabra,
-                "pos": match_palabra.span(), "es_palabra": True
-            })
-    for match_digital in re.finditer(DIGITAL_NUMERO_REGEX, texto_oracion_candidata):
-        texto_num = match_digital.group(0)
-        try:
-            posibles_numeros.append({
-                "valor": float(texto_num.replace(",", ".")), "texto": texto_num,
-                "pos": match_digital.span(), "es_palabra": False
-            })
-        except ValueError: continue
-
-    if not posibles_numeros: return None
-    posibles_numeros.sort(key=lambda x: x["pos"][0])
+    posibles_numeros, entidades_oracion, hay_unidad_tiempo = escanear_numeros_y_entidades(texto_oracion_candidata)
+    # Todas las reglas exigen una unidad de tiempo tras el número: sin ninguna en la oración no hay nada que extraer
+    if not posibles_numeros or not hay_unidad_tiempo: return None
+    es_contexto_tasa = None # se evalúa solo si alguna regla lo necesita
 
+    # Prioridad por número: regla "cada", tasa completa, tiempo por entidad y por último unidad sola/contextual
     for num_info in posibles_numeros:
         num_start_pos, num_end_pos = num_info["pos"]
         texto_despues_num = texto_oracion_candidata[num_end_pos:].lstrip()
 
-        texto_antes_num_para_cada = texto_oracion_candidata[:num_start_pos].lower().rstrip()
-        if texto_antes_num_para_cada.endswith("cada"):
-            match_unidad_cada = re.match(patron_unidad_tiempo_sola, texto_despues_num, re.IGNORECASE)
-            if match_unidad_cada and match_unidad_cada.group(1): 
+        if RE_CADA_ANTES_NUMERO.search(texto_oracion_candidata, 0, num_start_pos):
+            match_unidad_cada = RE_UNIDAD_TIEMPO_SOLA.match(texto_despues_num)
+            if match_unidad_cada and match_unidad_cada.group(1):
                 unidad_texto = match_unidad_cada.group(1).strip().lower()
-                if unidad_texto in known_time_units_set:
-                    pos_unidad_rel_start = texto_despues_num.find(match_unidad_cada.group(0))
-                    pos_unidad_abs_start = num_end_pos + pos_unidad_rel_start
+                if unidad_texto in UNIDADES_TIEMPO_SET:
+                    pos_unidad_abs_start = num_end_pos + texto_despues_num.find(match_unidad_cada.group(0))
                     pos_unidad_abs_end = pos_unidad_abs_start + len(match_unidad_cada.group(0))
                     return {
                         "valor": num_info["valor"], "valor_texto": num_info["texto"],
@@ -203,148 +631,317 @@ def extraer_valor_y_unidad_de_oracion(texto_oracion_candidata):
                         "posicion_valor": num_info["pos"],
                         "posicion_unidad": (pos_unidad_abs_start, pos_unidad_abs_end)
                     }
-        
-        match_tasa = re.match(patron_tasa_completa, texto_despues_num, re.IGNORECASE)
+
+        match_tasa = RE_TASA_COMPLETA.match(texto_despues_num)
         if match_tasa:
             entidad_match = match_tasa.group(1).lower() if match_tasa.group(1) else None
             unidad_tiempo_match = match_tasa.group(2).lower() if match_tasa.group(2) else None
             if entidad_match and unidad_tiempo_match and \
-               unidad_tiempo_match in known_time_units_set and \
-               entidad_match not in known_time_units_set:
-                unidad_final = f"{entidad_match}/{unidad_tiempo_match}"
+               unidad_tiempo_match in UNIDADES_TIEMPO_SET and \
+               entidad_match not in UNIDADES_TIEMPO_SET:
                 full_unit_match_str = match_tasa.group(0)
                 pos_unidad_inicio = num_end_pos + texto_despues_num.find(full_unit_match_str)
-                pos_unidad_fin = pos_unidad_inicio + len(full_unit_match_str)
-                return {"valor": num_info["valor"], "valor_texto": num_info["texto"], "unidad_texto": unidad_final,
-                        "tipo_parametro": "tasa", "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio, pos_unidad_fin)}
-        
-        match_tiempo_entidad = re.match(patron_tiempo_por_entidad, texto_despues_num, re.IGNORECASE)
+                return {"valor": num_info["valor"], "valor_texto": num_info["texto"], "unidad_texto": f"{entidad_match}/{unidad_tiempo_match}",
+                        "tipo_parametro": "tasa", "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio, pos_unidad_inicio + len(full_unit_match_str))}
+
+        match_tiempo_entidad = RE_TIEMPO_POR_ENTIDAD.match(texto_despues_num)
         if match_tiempo_entidad:
             unidad_tiempo_match = match_tiempo_entidad.group(1).lower() if match_tiempo_entidad.group(1) else None
             entidad_match = match_tiempo_entidad.group(2).lower() if match_tiempo_entidad.group(2) else None
             if unidad_tiempo_match and entidad_match and \
-               unidad_tiempo_match in known_time_units_set and \
-               entidad_match not in known_time_units_set:
-                unidad_final = f"{unidad_tiempo_match}/{entidad_match}"
+               unidad_tiempo_match in UNIDADES_TIEMPO_SET and \
+               entidad_match not in UNIDADES_TIEMPO_SET:
                 full_unit_match_str = match_tiempo_entidad.group(0)
                 pos_unidad_inicio = num_end_pos + texto_despues_num.find(full_unit_match_str)
-                pos_unidad_fin = pos_unidad_inicio + len(full_unit_match_str)
-                return {"valor": num_info["valor"], "valor_texto": num_info["texto"], "unidad_texto": unidad_final,
-                        "tipo_parametro": "tiempo", "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio, pos_unidad_fin)}
+                return {"valor": num_info["valor"], "valor_texto": num_info["texto"], "unidad_texto": f"{unidad_tiempo_match}/{entidad_match}",
+                        "tipo_parametro": "tiempo", "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio, pos_unidad_inicio + len(full_unit_match_str))}
 
-        match_p_ut = re.match(patron_por_unidad_tiempo, texto_despues_num, re.IGNORECASE) 
-        match_ut_sola = re.match(patron_unidad_tiempo_sola, texto_despues_num, re.IGNORECASE)
-        
-        current_match_obj_p3 = None
-        ut_str_local_p3 = None 
-
-        if match_p_ut and match_p_ut.group(1): 
-            potential_time_unit = match_p_ut.group(1).lower()
-            if potential_time_unit in known_time_units_set:
-                current_match_obj_p3 = match_p_ut
-                ut_str_local_p3 = potential_time_unit
-        
-        if not current_match_obj_p3 and match_ut_sola and match_ut_sola.group(1): 
-            potential_time_unit = match_ut_sola.group(1).lower()
-            if potential_time_unit in known_time_units_set:
-                current_match_obj_p3 = match_ut_sola
-                ut_str_local_p3 = potential_time_unit
-        
-        if current_match_obj_p3 and ut_str_local_p3: 
-            tipo_param_final_p3 = "tiempo" 
+        match_p_ut = RE_POR_UNIDAD_TIEMPO.match(texto_despues_num)
+        current_match_obj_p3 = None; ut_str_local_p3 = None
+        if match_p_ut and match_p_ut.group(1) and match_p_ut.group(1).lower() in UNIDADES_TIEMPO_SET:
+            current_match_obj_p3 = match_p_ut; ut_str_local_p3 = match_p_ut.group(1).lower()
+        if not current_match_obj_p3:
+            match_ut_sola = RE_UNIDAD_TIEMPO_SOLA.match(texto_despues_num)
+            if match_ut_sola and match_ut_sola.group(1) and match_ut_sola.group(1).lower() in UNIDADES_TIEMPO_SET:
+                current_match_obj_p3 = match_ut_sola; ut_str_local_p3 = match_ut_sola.group(1).lower()
+
+        if current_match_obj_p3 and ut_str_local_p3:
+            tipo_param_final_p3 = "tiempo"
             unidad_texto_final_p3 = ut_str_local_p3
-            keywords_tasa_contexto_regex = r"\b(tasa|frecuencia|razón\s+de|ritmo\s+de|velocidad\s+de)\b"
-            is_contextual_rate = False
-            if re.search(keywords_tasa_contexto_regex, texto_oracion_candidata, re.IGNORECASE):
-                is_contextual_rate = True
-            if match_p_ut and current_match_obj_p3 == match_p_ut:
-                is_contextual_rate = True
-
-            if is_contextual_rate:
+            es_por_unidad = current_match_obj_p3 is match_p_ut
+            if es_contexto_tasa is None: es_contexto_tasa = RE_CONTEXTO_TASA.search(texto_oracion_candidata) is not None
+
+            if es_contexto_tasa or es_por_unidad:
                 tipo_param_final_p3 = "tasa"
                 entidad_contextual_p3 = None
-                texto_antes_num_completo = texto_oracion_candidata[:num_start_pos].strip()
-                entidades_halladas_antes = list(re.finditer(rf"\b{ENTITY_CAPTURE_REGEX}\b", texto_antes_num_completo, re.IGNORECASE))
-                if entidades_halladas_antes and entidades_halladas_antes[-1].group(1):
-                    temp_ent = entidades_halladas_antes[-1].group(1).lower()
-                    if temp_ent not in known_time_units_set: 
-                        entidad_contextual_p3 = temp_ent
-                
-                if not entidad_contextual_p3 and (match_p_ut and current_match_obj_p3 == match_p_ut):
+                # Última entidad antes del número (las entidades ya salieron del escaneo inicial)
+                for ent_inicio, ent_fin, ent_texto in reversed(entidades_oracion):
+                    if ent_fin <= num_start_pos:
+                        if ent_texto not in UNIDADES_TIEMPO_SET: entidad_contextual_p3 = ent_texto
+                        break
+
+                if not entidad_contextual_p3 and es_por_unidad:
                     text_between_num_and_por_al_unit = texto_despues_num[:current_match_obj_p3.start()].strip()
                     if text_between_num_and_por_al_unit:
-                        match_entidad_intermedia = re.fullmatch(rf"\b{ENTITY_CAPTURE_REGEX}\b", text_between_num_and_por_al_unit, re.IGNORECASE)
+                        match_entidad_intermedia = RE_ENTIDAD_COMPLETA.fullmatch(text_between_num_and_por_al_unit)
                         if match_entidad_intermedia and match_entidad_intermedia.group(1):
                             temp_ent = match_entidad_intermedia.group(1).lower()
-                            if temp_ent not in known_time_units_set:
+                            if temp_ent not in UNIDADES_TIEMPO_SET:
                                 entidad_contextual_p3 = temp_ent
-                
-                if entidad_contextual_p3:
-                    unidad_texto_final_p3 = f"{entidad_contextual_p3}/{ut_str_local_p3}"
-                else: 
-                    unidad_texto_final_p3 = f"entidad/{ut_str_local_p3}" 
-            
+
+                unidad_texto_final_p3 = f"{entidad_contextual_p3 or 'entidad'}/{ut_str_local_p3}"
+
             full_unit_match_str_p3 = current_match_obj_p3.group(0)
             pos_unidad_inicio_p3 = num_end_pos + texto_despues_num.find(full_unit_match_str_p3)
-            pos_unidad_fin_p3 = pos_unidad_inicio_p3 + len(full_unit_match_str_p3)
             return {"valor": num_info["valor"], "valor_texto": num_info["texto"],
                     "unidad_texto": unidad_texto_final_p3, "tipo_parametro": tipo_param_final_p3,
-                    "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio_p3, pos_unidad_fin_p3)}
+                    "posicion_valor": num_info["pos"], "posicion_unidad": (pos_unidad_inicio_p3, pos_unidad_inicio_p3 + len(full_unit_match_str_p3))}
     return None
 
 
-def identificar_oraciones_candidatas(doc_spacy, umbral_similitud=0.6, debug_specific_sentence_part=None):
-    # ... (código sin cambios)
+def extraer_valor_y_unidad_memo(texto_oracion, valores_por_oracion=None):
+    """extraer_valor_y_unidad_de_oracion con un memo opcional {oración: resultado} (p. ej. el de una sesión incremental)."""
+    with trazas.span("valor_unidad", memo=valores_por_oracion is not None and texto_oracion in valores_por_oracion):
+        if valores_por_oracion is None: return extraer_valor_y_unidad_de_oracion(texto_oracion)
+        if texto_oracion not in valores_por_oracion: valores_por_oracion[texto_oracion] = extraer_valor_y_unidad_de_oracion(texto_oracion)
+        return valores_por_oracion[texto_oracion]
+
+def oraciones_de_doc(doc_spacy):
+    return [sent.text for sent in doc_spacy.sents if sent.text.strip()]
+
+# --- Prefiltro léxico previo al encoder ---
+# extraer_valor_y_unidad_de_oracion no devuelve nada sin un número (dígitos o NUMEROS_EN_PALABRAS_MAP); tampoco sin
+# unidad de tiempo, pero se aceptan además las pistas de tasa para no depender de ese detalle de las reglas.
+# Las oraciones descartadas (p. ej. "(a) ¿Cuál es la probabilidad…?") no se codifican ni se puntúan.
+PISTAS_TASA_PREFILTRO = frozenset(["tasa", "frecuencia", "razón", "ritmo", "velocidad", "cada"])
+PREFILTRO_LEXICO_ACTIVO = os.environ.get("NLP_PREFILTRO_LEXICO", "1") == "1"
+
+def pasa_prefiltro_lexico(texto_oracion):
+    hay_numero = hay_pista = False
+    for _, _, tipo, _, _ in indexar_palabras_clave(texto_oracion):
+        if tipo == "numero" or tipo == "digitos": hay_numero = True
+        elif tipo == "unidad_tiempo" or tipo == "pista_tasa": hay_pista = True
+        if hay_numero and hay_pista: return True
+    return False
+
+def oraciones_para_similitud(doc_spacy, usar_prefiltro_lexico=None):
+    """Oraciones del Doc que pasan a la etapa de similitud; con el prefiltro activo solo las que pasan pasa_prefiltro_lexico."""
+    if usar_prefiltro_lexico is None: usar_prefiltro_lexico = PREFILTRO_LEXICO_ACTIVO
+    oraciones = oraciones_de_doc(doc_spacy)
+    return [oracion for oracion in oraciones if pasa_prefiltro_lexico(oracion)] if usar_prefiltro_lexico else oraciones
+
+def identificar_oraciones_candidatas(doc_spacy, umbral_similitud=0.6, debug_specific_sentence_part=None, embeddings_oraciones=None, usar_prefiltro_lexico=None, excluir_oraciones=None, top_k=None,
+                                     codificar=None):
+    """Oraciones del Doc cuya similitud con las frases clave de llegada/servicio supera el umbral.
+
+    `embeddings_oraciones` permite pasar ya calculados los embeddings de oraciones_para_similitud(doc_spacy), en el mismo orden
+    (p. ej. codificados por lotes en extraer_parametros_colas_batch); si es None se codifican aquí, pasando por el cache LRU.
+    `excluir_oraciones` deja fuera oraciones ya resueltas (modo cascada); no se combina con `embeddings_oraciones`.
+    `codificar` (por defecto codificar_oraciones) recibe solo las oraciones que quedan tras el prefiltro y la exclusión,
+    p. ej. el memo por oración de SesionExtraccionIncremental.
+    Con `top_k` > 0 (por defecto TOP_K_FRASES_CLAVE) cada candidata incluye "top_frases_clave": las k frases clave de su
+    categoría más similares, con su similitud.
+    """
+    if top_k is None: top_k = TOP_K_FRASES_CLAVE
     candidatas = {"llegada": [], "servicio": []}
     if not MODEL_SENTENCE_TRANSFORMERS or not EMBEDDINGS_FRASES_CLAVE or \
         EMBEDDINGS_FRASES_CLAVE.get("llegada") is None or \
         EMBEDDINGS_FRASES_CLAVE.get("servicio") is None:
-        print("ERROR: Modelo SentenceTransformer o embeddings de frases clave para llegada/servicio no cargados en identificar_oraciones_candidatas.")
+        trazas.error("Modelo SentenceTransformer o embeddings de frases clave para llegada/servicio no cargados en identificar_oraciones_candidatas.")
         return candidatas
-    
-    for sent in doc_spacy.sents:
-        sent_text = sent.text
-        if not sent_text.strip(): continue
-        embedding_oracion = MODEL_SENTENCE_TRANSFORMERS.encode(sent_text, convert_to_tensor=True)
-        
-        similitudes_llegada = util.cos_sim(embedding_oracion, EMBEDDINGS_FRASES_CLAVE["llegada"])
-        max_sim_llegada = 0.0; idx_max_llegada = -1
-        if similitudes_llegada.numel() > 0: max_sim_llegada = similitudes_llegada.max().item(); idx_max_llegada = similitudes_llegada.argmax().item()
-        if max_sim_llegada >= umbral_similitud:
-            candidatas["llegada"].append({"oracion_texto": sent_text, "similitud": round(max_sim_llegada, 4)})
-
-        similitudes_servicio = util.cos_sim(embedding_oracion, EMBEDDINGS_FRASES_CLAVE["servicio"])
-        max_sim_servicio = 0.0; idx_max_servicio = -1
-        if similitudes_servicio.numel() > 0: max_sim_servicio = similitudes_servicio.max().item(); idx_max_servicio = similitudes_servicio.argmax().item()
-        if max_sim_servicio >= umbral_similitud:
-            candidatas["servicio"].append({"oracion_texto": sent_text, "similitud": round(max_sim_servicio, 4)})
-        
+    apiladas = FRASES_CLAVE_APILADAS or apilar_embeddings_frases_clave() # una sola lectura: matriz, offsets y etiquetas del mismo estado
+    if apiladas is None: trazas.error("No se pudieron apilar los embeddings de frases clave."); return candidatas
+
+    with trazas.span("similitud") as span_similitud:
+        return _identificar_oraciones_candidatas(doc_spacy, umbral_similitud, debug_specific_sentence_part, embeddings_oraciones, usar_prefiltro_lexico, excluir_oraciones, top_k, span_similitud, apiladas,
+                                                 codificar or codificar_oraciones)
+
+def _identificar_oraciones_candidatas(doc_spacy, umbral_similitud, debug_specific_sentence_part, embeddings_oraciones, usar_prefiltro_lexico, excluir_oraciones, top_k, span_similitud, apiladas, codificar):
+    candidatas = {"llegada": [], "servicio": []}
+    oraciones = oraciones_para_similitud(doc_spacy, usar_prefiltro_lexico)
+    if excluir_oraciones: oraciones = [oracion for oracion in oraciones if oracion not in excluir_oraciones]
+    if debug_specific_sentence_part and not any(debug_specific_sentence_part in oracion for oracion in oraciones):
+        if any(debug_specific_sentence_part in oracion for oracion in oraciones_de_doc(doc_spacy)):
+            trazas.debug(f"La oración con \"{debug_specific_sentence_part}\" fue descartada por el prefiltro léxico.")
+    span_similitud.agregar(oraciones=len(oraciones))
+    if not oraciones: return candidatas
+
+    # Una sola llamada al encoder para las oraciones que no están en el cache y una sola matriz de similitud [oraciones x frases clave]
+    if embeddings_oraciones is None: embeddings_oraciones = codificar(oraciones)
+    similitudes = util.cos_sim(embeddings_oraciones, apiladas.matriz)
+    max_por_categoria = {}; idx_por_categoria = {}; etiquetas = apiladas.etiquetas
+    for cat, (inicio, fin) in apiladas.offsets.items():
+        if fin > inicio:
+            valores_max, indices_max = similitudes[:, inicio:fin].max(dim=1)
+            max_por_categoria[cat] = valores_max.tolist(); idx_por_categoria[cat] = indices_max.tolist()
+        else: max_por_categoria[cat] = [0.0] * len(oraciones); idx_por_categoria[cat] = [-1] * len(oraciones)
+    if top_k > 0:
+        valores_topk, indices_topk = top_k_frases_clave(similitudes, top_k, apiladas)
+        valores_topk, indices_topk = valores_topk.tolist(), indices_topk.tolist()
+
+    for i, sent_text in enumerate(oraciones):
+        for c, cat in enumerate(CATEGORIAS_SIMILITUD):
+            if max_por_categoria[cat][i] >= umbral_similitud:
+                candidata = {"oracion_texto": sent_text, "similitud": round(max_por_categoria[cat][i], 4)}
+                if top_k > 0:
+                    candidata["top_frases_clave"] = [{"frase": etiquetas[cat][idx], "similitud": round(valor, 4)}
+                                                     for valor, idx in zip(valores_topk[i][c], indices_topk[i][c]) if valor != float("-inf")]
+                candidatas[cat].append(candidata)
+
         if debug_specific_sentence_part and debug_specific_sentence_part in sent_text:
-            print(f"\nDEBUG para oración: \"{sent_text}\"")
-            if idx_max_llegada != -1 and idx_max_llegada < len(FRASES_CLAVE_PARAMETROS['llegada']): print(f"  Max Sim Llegada: {max_sim_llegada:.4f} (con frase clave: '{FRASES_CLAVE_PARAMETROS['llegada'][idx_max_llegada]}')")
-            else: print(f"  Max Sim Llegada: {max_sim_llegada:.4f} (sin match de frase clave o índice fuera de rango)")
-            if idx_max_servicio != -1 and idx_max_servicio < len(FRASES_CLAVE_PARAMETROS['servicio']): print(f"  Max Sim Servicio: {max_sim_servicio:.4f} (con frase clave: '{FRASES_CLAVE_PARAMETROS['servicio'][idx_max_servicio]}')")
-            else: print(f"  Max Sim Servicio: {max_sim_servicio:.4f} (sin match de frase clave o índice fuera de rango)")
+            trazas.debug(f"Similitudes para oración: \"{sent_text}\"")
+            for cat, etiqueta in (("llegada", "Llegada"), ("servicio", "Servicio")):
+                max_sim, idx_max = max_por_categoria[cat][i], idx_por_categoria[cat][i]
+                if idx_max != -1 and idx_max < len(etiquetas[cat]): trazas.debug(f"  Max Sim {etiqueta}: {max_sim:.4f} (con frase clave: '{etiquetas[cat][idx_max]}')")
+                else: trazas.debug(f"  Max Sim {etiqueta}: {max_sim:.4f} (sin match de frase clave o índice fuera de rango)")
+                if top_k > 0:
+                    c = CATEGORIAS_SIMILITUD.index(cat)
+                    trazas.debug(f"  Top-{top_k} {etiqueta}: " + ", ".join(f"'{etiquetas[cat][idx]}' ({valor:.4f})" for valor, idx in zip(valores_topk[i][c], indices_topk[i][c]) if valor != float("-inf")))
 
     for categoria in candidatas:
         unique_candidatas = []; seen_oraciones = set()
         for cand in sorted(candidatas[categoria], key=lambda x: x["similitud"], reverse=True):
             if cand["oracion_texto"] not in seen_oraciones: unique_candidatas.append(cand); seen_oraciones.add(cand["oracion_texto"])
         candidatas[categoria] = unique_candidatas
+    span_similitud.agregar(**{f"candidatas_{categoria}": len(candidatas[categoria]) for categoria in candidatas})
     return candidatas
 
-def extraer_numero_servidores(doc_spacy, resultado_parcial):
+# --- Patrones del Matcher de spaCy ---
+# Se compilan una sola vez por familia en MATCHERS_SPACY (construir_matchers_spacy) después de cargar el modelo.
+KEYWORDS_SERVIDOR = ["servidor", "cajero", "máquina", "operador", "ventanilla", "puesto", "estación", "médico", "doctor", "enfermero", "consultorio", "línea de ensamblaje", "caja", "peluquero"]
+KEYWORDS_CAP = ["capacidad", "límite", "tamaño", "espacio", "máximo", "buffer"]; KEYWORDS_ENTIDAD_CAP = ["cliente", "persona", "unidad", "auto", "puesto", "elemento", "paciente", "trabajo", "item"]; KEYWORDS_LUGAR_ESPERA = ["cola", "sala de espera", "almacén", "buffer", "linea de espera"]
+PATRONES_MATCHER = {
+    "servidores": {
+        "NUM_SERVIDORES_PATTERN1": [[{"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_SERVIDOR}}]],
+        "NUM_SERVIDORES_PATTERN2": [[{"LOWER": {"IN": ["un", "una"]}}, {"LEMMA": {"IN": KEYWORDS_SERVIDOR}}]],
+        "NUM_SERVIDORES_PATTERN3": [[{"LEMMA": {"IN": ["haber", "existir", "tener", "contar con", "disponer de", "operar con"]}}, {"LIKE_NUM": True, "OP": "?"}, {"LOWER": {"IN": ["un", "una"]}, "OP": "?"}, {"LEMMA": {"IN": KEYWORDS_SERVIDOR}}]],
+    },
+    "capacidad": {
+        "CAP_NUM1": [[{"LEMMA": {"IN": KEYWORDS_CAP}}, {"LOWER": {"IN": ["del", "de la"]}, "OP": "?"}, {"LOWER": {"IN": ["sistema", "total"] + KEYWORDS_LUGAR_ESPERA}, "OP": "?"}, {"LOWER": "es", "OP": "?"}, {"LOWER": "de", "OP": "?"}, {"LOWER": {"IN": ["para", "en"]}, "OP": "?"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_ENTIDAD_CAP}, "OP": "?"}]],
+        "CAP_NUM2": [[{"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_ENTIDAD_CAP}, "OP": "+"}, {"LOWER": {"IN": ["de", "en", "para"]}, "OP": "+"}, {"LEMMA": {"IN": ["capacidad"] + KEYWORDS_LUGAR_ESPERA + ["sistema"]}}]],
+        "CAP_CABEN": [[{"LEMMA": {"IN": ["caber", "acomodar"]}}, {"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_ENTIDAD_CAP}, "OP": "?"}, {"LOWER": "en", "OP": "?"}, {"LOWER": {"IN": ["la", "el"]}, "OP": "?"}, {"LEMMA": {"IN": KEYWORDS_LUGAR_ESPERA}}]],
+        "CAP_NO_MAS_DE": [[{"LOWER": "no", "OP": "?"}, {"LEMMA": {"IN": ["poder", "aceptar", "admitir", "acomodar"]}, "OP": "+"}, {"LOWER": "más"}, {"LOWER": "de"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_ENTIDAD_CAP}, "OP": "?"}]],
+        "CAP_K_IGUAL": [[{"TEXT": {"IN": ["K", "k"]}}, {"LOWER": {"IN": ["=", "es"]}, "OP": "?"}, {"LIKE_NUM": True}]],
+        "CAP_RECHAZO": [[{"LEMMA": {"IN": ["rechazar", "no admitir", "no aceptar", "dejar de aceptar"]}}, {"IS_PUNCT": False, "OP": "{0,5}"}, {"LOWER": "si"}, {"LOWER": "hay"}, {"LOWER": {"IN": ["más", "mas"]}}, {"LOWER": "de"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_ENTIDAD_CAP}, "OP": "?"}]],
+        "CAP_SOLO_PERMITEN": [[{"LOWER": {"IN": ["solo", "solamente", "únicamente"]}}, {"LOWER": {"IN": ["se", "puede", "pueden"]}, "OP": "?"}, {"LEMMA": {"IN": ["permitir", "caber", "almacenar", "haber", "tener", "aceptar"]}, "OP": "+"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": KEYWORDS_ENTIDAD_CAP}, "OP": "?"}]],
+        "CAP_INFINITA": [[{"LOWER": {"IN": ["capacidad", "límite"]}, "OP": "?"}, {"LOWER": {"IN": ["infinita", "ilimitada"]}}]],
+        "CAP_NO_LIMITE": [[{"LOWER": {"IN": ["no", "sin"]}}, {"LOWER": {"IN": ["hay", "tiene", "existe"]}, "OP": "?"}, {"LEMMA": {"IN": ["límite", "restricción"]}}]],
+    },
+    "disciplina": {
+        "DISC_FIFO_SIGLA": [[{"TEXT": "FIFO"}]],
+        "DISC_FIFO_FRASE_ES": [[{"LOWER": "primero"}, {"LOWER": "en"}, {"LOWER": "llegar"}, {"IS_PUNCT": True, "OP": "?"}, {"LOWER": "primero"}, {"LOWER": "en"}, {"LOWER": "ser"}, {"LOWER": "servido"}]],
+        "DISC_FIFO_FRASE_ES_ALT": [[{"LOWER": "primero"}, {"LOWER": "que"}, {"LOWER": "llega"}, {"LOWER": "es"}, {"LOWER": "el"}, {"LOWER": "primero"}, {"LOWER": "que"}, {"LOWER": "se"}, {"LOWER": "atiende"}]],
+        "DISC_FIFO_FCFS": [[{"TEXT": "FCFS"}]],
+        "DISC_ORDEN_LLEGADA": [[{"LOWER": "orden"}, {"LOWER": "de"}, {"LOWER": "llegada"}]],
+        "DISC_ORDEN_INGRESO": [[{"LOWER": "orden"}, {"LOWER": "en"}, {"LOWER": "que"}, {"LEMMA": {"IN": ["ir", "llegar", "ingresar"]}}]],
+        "DISC_LIFO_SIGLA": [[{"TEXT": "LIFO"}]],
+        "DISC_LIFO_FRASE_ES": [[{"LOWER": "último"}, {"LOWER": "en"}, {"LOWER": "llegar"}, {"IS_PUNCT": True, "OP": "?"}, {"LOWER": "primero"}, {"LOWER": "en"}, {"LOWER": "ser"}, {"LOWER": "servido"}]],
+        "DISC_LIFO_LCFS": [[{"TEXT": "LCFS"}]],
+        "DISC_SIRO_SIGLA": [[{"TEXT": "SIRO"}]],
+        "DISC_SIRO_FRASE_ES": [[{"LOWER": "servicio"}, {"LOWER": "en"}, {"LOWER": "orden"}, {"LOWER": "aleatorio"}]],
+        "DISC_SIRO_RANDOM": [[{"LOWER": "atención"}, {"LOWER": "aleatoria"}]],
+        "DISC_PRIORIDAD_SIGLA": [[{"TEXT": "PRI"}]],
+        "DISC_PRIORIDAD_FRASE": [[{"LEMMA": {"IN": ["prioridad", "prioritario"]}}]],
+        "DISC_PRIORIDAD_CLASES": [[{"LEMMA": {"IN": ["clase", "tipo", "nivel"]}}, {"LOWER": "de", "OP": "?"}, {"LEMMA": "prioridad"}]],
+    },
+    # Pistas de alta precisión para el modo cascada: a qué categoría (llegada/servicio) se refiere una oración
+    "cascada": {
+        "CASC_LLEGADA": [[{"LEMMA": {"IN": ["llegar", "arribar", "llegada", "arribo"]}}], [{"LOWER": {"IN": ["llegada", "llegadas", "llegan", "llega", "arriban", "arribos"]}}]],
+        "CASC_SERVICIO": [[{"LEMMA": {"IN": ["atender", "servir", "despachar", "servicio", "atención"]}}], [{"LOWER": {"IN": ["servicio", "atención", "atiende", "atienden", "atendido", "atendidos", "despacha", "consulta", "duración"]}}]],
+    },
+}
+# Prefijo de los nombres de patrón de cada familia; permite repartir los matches de la pasada unificada
+PREFIJOS_FAMILIA_MATCHER = {"servidores": "NUM_SERVIDORES_", "capacidad": "CAP_", "disciplina": "DISC_", "cascada": "CASC_"}
+FAMILIA_UNIFICADA_MATCHER = "todas"
+
+# --- Autómata de palabras clave (pre-índice léxico) ---
+# Un único autómata Aho-Corasick con todas las palabras/frases que usan las reglas, construido una vez al importar.
+# indexar_palabras_clave recorre la oración una sola vez y devuelve hits tipados con offsets; lo consumen
+# escanear_numeros_y_entidades y pasa_prefiltro_lexico.
+# Tipos: "numero" y "digitos" (valor numérico), "unidad_tiempo", "entidad" y "pista_tasa". Servidores y disciplina
+# siguen en el Matcher de spaCy (necesitan lemas y dependencias), así que no se indexan aquí.
+
+def construir_automata_palabras_clave():
+    automata = AutomataPalabrasClave()
+    automata.agregar_varios(NUMEROS_EN_PALABRAS_MAP, "numero")
+    automata.agregar_varios(sorted(UNIDADES_TIEMPO_SET), "unidad_tiempo")
+    automata.agregar_varios(sorted(ENTIDADES_COMUNES_SET), "entidad")
+    automata.agregar_varios(sorted(PISTAS_TASA_PREFILTRO), "pista_tasa")
+    return automata.construir()
+
+AUTOMATA_PALABRAS_CLAVE = construir_automata_palabras_clave()
+
+# El prefiltro y el escáner de valores indexan las mismas oraciones: se memoriza el índice de las más recientes
+# (si se reemplaza AUTOMATA_PALABRAS_CLAVE, llamar a indexar_palabras_clave.cache_clear())
+@lru_cache(maxsize=4096)
+def indexar_palabras_clave(texto):
+    """Hits de AUTOMATA_PALABRAS_CLAVE en `texto`: ((inicio, fin, tipo, patron, valor), ...) en orden de fin, incluyendo "digitos"."""
+    return tuple(AUTOMATA_PALABRAS_CLAVE.buscar(texto, tipo_digitos="digitos"))
+MATCHERS_SPACY = {}
+FAMILIA_POR_MATCH_ID = {}
+CONTEO_PATRONES_MATCHER = Counter()
+LOCK_CONTEO_PATRONES = threading.Lock() # los hilos acumulan en un Counter local y lo suman una vez por Doc
+
+def acumular_conteo_patrones(conteo):
+    with LOCK_CONTEO_PATRONES: CONTEO_PATRONES_MATCHER.update(conteo)
+
+def construir_matchers_spacy():
+    """Compila un Matcher por familia de PATRONES_MATCHER y uno unificado con todos los patrones, con el vocabulario del modelo cargado."""
+    global MATCHERS_SPACY, FAMILIA_POR_MATCH_ID
+    matchers = {}; matcher_unificado = Matcher(NLP_SPACY.vocab); familia_por_id = {}
+    for familia, patrones in PATRONES_MATCHER.items():
+        matcher = Matcher(NLP_SPACY.vocab)
+        for nombre_patron, lista_patrones in patrones.items():
+            if not nombre_patron.startswith(PREFIJOS_FAMILIA_MATCHER[familia]):
+                raise ValueError(f"Patrón '{nombre_patron}' no usa el prefijo '{PREFIJOS_FAMILIA_MATCHER[familia]}' de la familia '{familia}'.")
+            matcher.add(nombre_patron, lista_patrones); matcher_unificado.add(nombre_patron, lista_patrones)
+            familia_por_id[NLP_SPACY.vocab.strings.add(nombre_patron)] = familia
+        matchers[familia] = matcher
+    matchers[FAMILIA_UNIFICADA_MATCHER] = matcher_unificado
+    MATCHERS_SPACY, FAMILIA_POR_MATCH_ID = matchers, familia_por_id
+
+def obtener_matcher(familia):
+    if not MATCHERS_SPACY: construir_matchers_spacy()
+    return MATCHERS_SPACY[familia]
+
+def ejecutar_matcher(familia, doc_spacy):
+    """Aplica el Matcher precompilado de la familia y acumula cuántas veces dispara cada patrón."""
+    with trazas.span(f"matcher.{familia}") as span_matcher:
+        matches = obtener_matcher(familia)(doc_spacy)
+        span_matcher.agregar(matches=len(matches))
+    acumular_conteo_patrones(Counter(NLP_SPACY.vocab.strings[match_id] for match_id, _, _ in matches))
+    return matches
+
+def ejecutar_matcher_unificado(doc_spacy):
+    """Recorre el Doc una sola vez con todos los patrones y reparte los matches por familia según el prefijo del patrón.
+
+    Devuelve {familia: [(match_id, start, end), ...]} conservando el orden del Matcher dentro de cada familia,
+    listo para pasarse como `matches` a los extractores basados en reglas.
+    """
+    matches_por_familia = {familia: [] for familia in PATRONES_MATCHER}; conteo = Counter()
+    with trazas.span("matcher") as span_matcher:
+        for match in obtener_matcher(FAMILIA_UNIFICADA_MATCHER)(doc_spacy):
+            conteo[NLP_SPACY.vocab.strings[match[0]]] += 1
+            matches_por_familia[FAMILIA_POR_MATCH_ID[match[0]]].append(match)
+        span_matcher.agregar(**{familia: len(matches) for familia, matches in matches_por_familia.items()})
+    acumular_conteo_patrones(conteo)
+    return matches_por_familia
+
+def obtener_conteo_patrones():
+    """Disparos acumulados por patrón (incluye los que nunca dispararon, con 0), agrupados por familia."""
+    with LOCK_CONTEO_PATRONES: conteo = dict(CONTEO_PATRONES_MATCHER)
+    return {familia: {nombre: conteo.get(nombre, 0) for nombre in patrones} for familia, patrones in PATRONES_MATCHER.items()}
+
+def reiniciar_conteo_patrones():
+    with LOCK_CONTEO_PATRONES: CONTEO_PATRONES_MATCHER.clear()
+
+def extraer_numero_servidores(doc_spacy, resultado_parcial, matches=None):
     # ... (código sin cambios)
     if NLP_SPACY is None:
         resultado_parcial["errores"].append("Modelo spaCy no cargado en extraer_numero_servidores.")
         return resultado_parcial
-    matcher = Matcher(NLP_SPACY.vocab)
-    keywords_servidor = ["servidor", "cajero", "máquina", "operador", "ventanilla", "puesto", "estación", "médico", "doctor", "enfermero", "consultorio", "línea de ensamblaje", "caja", "peluquero"]
-    pattern1 = [{"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_servidor}}]
-    pattern2 = [{"LOWER": {"IN": ["un", "una"]}}, {"LEMMA": {"IN": keywords_servidor}}]
-    pattern3 = [{"LEMMA": {"IN": ["haber", "existir", "tener", "contar con", "disponer de", "operar con"]}}, {"LIKE_NUM": True, "OP": "?"}, {"LOWER": {"IN": ["un", "una"]}, "OP": "?"}, {"LEMMA": {"IN": keywords_servidor}}]
-    matcher.add("NUM_SERVIDORES_PATTERN1", [pattern1]); matcher.add("NUM_SERVIDORES_PATTERN2", [pattern2]); matcher.add("NUM_SERVIDORES_PATTERN3", [pattern3])
-    matches = matcher(doc_spacy); found_values = []
+    if matches is None: matches = ejecutar_matcher("servidores", doc_spacy)
+    found_values = []
     for match_id, start, end in matches:
         span = doc_spacy[start:end]; num_val = None; potential_num_token = None
         if NLP_SPACY.vocab.strings[match_id] == "NUM_SERVIDORES_PATTERN2": num_val = 1; potential_num_token = span[0]
@@ -360,39 +957,29 @@ def extraer_numero_servidores(doc_spacy, resultado_parcial):
                 elif token.lower_ in ["un", "una"] and NLP_SPACY.vocab.strings[match_id] == "NUM_SERVIDORES_PATTERN3":
                     is_quantifier = False
                     for next_token_in_span_idx in range(token_idx_in_span + 1, len(span)):
-                        if span[next_token_in_span_idx].lemma_ in keywords_servidor: is_quantifier = True; break
+                        if span[next_token_in_span_idx].lemma_ in KEYWORDS_SERVIDOR: is_quantifier = True; break
                     if is_quantifier: num_val = 1; potential_num_token = token; break
         if num_val is not None and num_val > 0:
             fragmento = potential_num_token.sent.text if potential_num_token else span.sent.text
             found_values.append({"valor": num_val, "fragmento": fragmento, "span_text": span.text})
-    if not found_values: print("INFO: No se encontró información explícita sobre el número de servidores.")
+    if not found_values: trazas.info("No se encontró información explícita sobre el número de servidores.")
     else:
         primary_value = found_values[0]["valor"]; primary_fragment = found_values[0]["fragmento"]
         resultado_parcial["parametros_extraidos"]["cantidad_servidores"]["valor"] = primary_value
         resultado_parcial["parametros_extraidos"]["cantidad_servidores"]["fragmento_texto"] = primary_fragment
-        print(f"INFO: Número de servidores extraído: {primary_value} (Fuente: '{primary_fragment}')")
+        trazas.info(f"Número de servidores extraído: {primary_value} (Fuente: '{primary_fragment}')")
         unique_numeric_values = set(item["valor"] for item in found_values)
         if len(unique_numeric_values) > 1:
             advertencia = (f"Advertencia: Se encontraron múltiples valores diferentes para el número de servidores. Se utilizó el primero ({primary_value} de '{primary_fragment}'). Otros valores encontrados: ")
             otros_valores_str_list = [f"{item['valor']} (en \"{item['span_text']}\" de la oración \"{item['fragmento']}\")" for item in found_values if item["valor"] != primary_value]
-            advertencia += "; ".join(otros_valores_str_list); resultado_parcial["errores"].append(advertencia); print(f"ADVERTENCIA DETALLADA: {advertencia}")
+            advertencia += "; ".join(otros_valores_str_list); resultado_parcial["errores"].append(advertencia); trazas.advertencia(advertencia.removeprefix("Advertencia: "))
     return resultado_parcial
 
-def extraer_capacidad_sistema(doc_spacy, resultado_parcial):
+def extraer_capacidad_sistema(doc_spacy, resultado_parcial, matches=None):
     # ... (código sin cambios)
     if NLP_SPACY is None: resultado_parcial["errores"].append("Modelo spaCy no cargado en extraer_capacidad_sistema."); return resultado_parcial
-    matcher = Matcher(NLP_SPACY.vocab)
-    keywords_cap = ["capacidad", "límite", "tamaño", "espacio", "máximo", "buffer"]; keywords_entidad = ["cliente", "persona", "unidad", "auto", "puesto", "elemento", "paciente", "trabajo", "item"]; keywords_lugar_espera = ["cola", "sala de espera", "almacén", "buffer", "linea de espera"]
-    pattern_cap_num1 = [{"LEMMA": {"IN": keywords_cap}}, {"LOWER": {"IN": ["del", "de la"]}, "OP": "?"}, {"LOWER": {"IN": ["sistema", "total"] + keywords_lugar_espera}, "OP": "?"}, {"LOWER": "es", "OP": "?"}, {"LOWER": "de", "OP": "?"}, {"LOWER": {"IN": ["para", "en"]}, "OP": "?"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_entidad}, "OP": "?"}]
-    pattern_cap_num2 = [{"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_entidad}, "OP": "+"}, {"LOWER": {"IN": ["de", "en", "para"]}, "OP": "+"}, {"LEMMA": {"IN": ["capacidad"] + keywords_lugar_espera + ["sistema"]}}]
-    pattern_caben = [{"LEMMA": {"IN": ["caber", "acomodar"]}}, {"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_entidad}, "OP": "?"}, {"LOWER": "en", "OP": "?"}, {"LOWER": {"IN": ["la", "el"]}, "OP": "?"}, {"LEMMA": {"IN": keywords_lugar_espera}}]
-    pattern_no_mas_de = [{"LOWER": "no", "OP": "?"}, {"LEMMA": {"IN": ["poder", "aceptar", "admitir", "acomodar"]}, "OP": "+"}, {"LOWER": "más"}, {"LOWER": "de"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_entidad}, "OP": "?"}]
-    pattern_k_igual = [{"TEXT": {"IN": ["K", "k"]}}, {"LOWER": {"IN": ["=", "es"]}, "OP": "?"}, {"LIKE_NUM": True}]
-    pattern_rechazo = [{"LEMMA": {"IN": ["rechazar", "no admitir", "no aceptar", "dejar de aceptar"]}}, {"IS_PUNCT": False, "OP": "{0,5}"}, {"LOWER": "si"}, {"LOWER": "hay"}, {"LOWER": {"IN": ["más", "mas"]}}, {"LOWER": "de"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_entidad}, "OP": "?"}]
-    pattern_solo_permiten = [{"LOWER": {"IN": ["solo", "solamente", "únicamente"]}}, {"LOWER": {"IN": ["se", "puede", "pueden"]}, "OP": "?"}, {"LEMMA": {"IN": ["permitir", "caber", "almacenar", "haber", "tener", "aceptar"]}, "OP": "+"}, {"LIKE_NUM": True}, {"LEMMA": {"IN": keywords_entidad}, "OP": "?"}]
-    pattern_infinita_directa = [{"LOWER": {"IN": ["capacidad", "límite"]}, "OP": "?"}, {"LOWER": {"IN": ["infinita", "ilimitada"]}}]; pattern_no_limite = [{"LOWER": {"IN": ["no", "sin"]}}, {"LOWER": {"IN": ["hay", "tiene", "existe"]}, "OP": "?"}, {"LEMMA": {"IN": ["límite", "restricción"]}}]
-    matcher.add("CAP_NUM1", [pattern_cap_num1]); matcher.add("CAP_NUM2", [pattern_cap_num2]); matcher.add("CAP_CABEN", [pattern_caben]); matcher.add("CAP_NO_MAS_DE", [pattern_no_mas_de]); matcher.add("CAP_K_IGUAL", [pattern_k_igual]); matcher.add("CAP_RECHAZO", [pattern_rechazo]); matcher.add("CAP_SOLO_PERMITEN", [pattern_solo_permiten]); matcher.add("CAP_INFINITA", [pattern_infinita_directa]); matcher.add("CAP_NO_LIMITE", [pattern_no_limite])
-    matches = matcher(doc_spacy); found_capacities = []
+    if matches is None: matches = ejecutar_matcher("capacidad", doc_spacy)
+    found_capacities = []
     for match_id, start, end in matches:
         span = doc_spacy[start:end]; match_name = NLP_SPACY.vocab.strings[match_id]; current_value = None; current_fragment = span.sent.text; match_type = "general_numeric"
         if match_name in ["CAP_INFINITA", "CAP_NO_LIMITE"]: current_value = "infinita"; match_type = "infinite"
@@ -408,15 +995,15 @@ def extraer_capacidad_sistema(doc_spacy, resultado_parcial):
             if current_value is not None:
                 sentence_text_lower = current_fragment.lower()
                 if match_name in ["CAP_RECHAZO", "CAP_SOLO_PERMITEN", "CAP_K_IGUAL", "CAP_NO_MAS_DE"]: match_type = "system_direct_k";
-                if any(kw_lugar in sentence_text_lower for kw_lugar in keywords_lugar_espera) and not any(kw_sys in sentence_text_lower for kw_sys in ["sistema", "total"]): match_type = "queue_explicit"
+                if any(kw_lugar in sentence_text_lower for kw_lugar in KEYWORDS_LUGAR_ESPERA) and not any(kw_sys in sentence_text_lower for kw_sys in ["sistema", "total"]): match_type = "queue_explicit"
                 elif match_name in ["CAP_NUM1", "CAP_NUM2", "CAP_CABEN"]:
                     if any(kw in sentence_text_lower for kw in ["sistema", "total"]): match_type = "system_explicit"
-                    elif any(kw_lugar in sentence_text_lower for kw_lugar in keywords_lugar_espera) or match_name == "CAP_CABEN": match_type = "queue_explicit"
+                    elif any(kw_lugar in sentence_text_lower for kw_lugar in KEYWORDS_LUGAR_ESPERA) or match_name == "CAP_CABEN": match_type = "queue_explicit"
         if current_value is not None:
             if isinstance(current_value, (int, float)) and current_value <= 0: continue
             found_capacities.append({"valor": current_value, "fragmento": current_fragment, "span_text": span.text, "match_name": match_name, "match_type": match_type})
     if not found_capacities:
-        print("INFO: No se encontró info de capacidad. Asumiendo infinita por defecto."); resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["valor"] = "infinita"; resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["fragmento_texto"] = "Asumida infinita (no encontrada explícitamente)."
+        trazas.info("No se encontró info de capacidad. Asumiendo infinita por defecto."); resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["valor"] = "infinita"; resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["fragmento_texto"] = "Asumida infinita (no encontrada explícitamente)."
     else:
         chosen_cap = None; priority_order = ["system_direct_k", "system_explicit", "general_numeric", "queue_explicit", "infinite"]
         for p_type in priority_order:
@@ -425,30 +1012,22 @@ def extraer_capacidad_sistema(doc_spacy, resultado_parcial):
         if chosen_cap:
             primary_value = chosen_cap["valor"]; primary_fragment = chosen_cap["fragmento"]
             resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["valor"] = primary_value; resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["fragmento_texto"] = primary_fragment
-            print(f"INFO: Capacidad del sistema extraída: {primary_value} (Fuente: '{primary_fragment}', Patrón: {chosen_cap['match_name']}, Tipo: {chosen_cap['match_type']})")
+            trazas.info(f"Capacidad del sistema extraída: {primary_value} (Fuente: '{primary_fragment}', Patrón: {chosen_cap['match_name']}, Tipo: {chosen_cap['match_type']})")
             numeric_caps_all = [fc for fc in found_capacities if isinstance(fc["valor"], (int, float))]; all_found_numeric_values = set(nc["valor"] for nc in numeric_caps_all)
             if len(all_found_numeric_values) > 1 and isinstance(primary_value, (int, float)):
                 adv = (f"Advertencia: Múltiples valores numéricos para capacidad. Usado: {primary_value} (Tipo: {chosen_cap['match_type']}). Otros detectados: {[f'{nc["valor"]} (Tipo: {nc["match_type"]})' for nc in found_capacities if isinstance(nc['valor'], (int,float)) and nc['valor'] != primary_value]}")
-                resultado_parcial["errores"].append(adv); print(f"ADVERTENCIA: {adv}")
+                resultado_parcial["errores"].append(adv); trazas.advertencia(adv.removeprefix("Advertencia: "))
             if numeric_caps_all and any(fc["match_type"] == "infinite" for fc in found_capacities) and isinstance(primary_value, (int, float)):
                 adv = (f"Advertencia: Se encontró capacidad numérica ({primary_value}) y mención de 'infinita'. Se priorizó el valor numérico basado en el tipo de patrón ({chosen_cap['match_type']}).")
-                resultado_parcial["errores"].append(adv); print(f"ADVERTENCIA: {adv}")
-        else: print("INFO: No se pudo determinar la capacidad explícita con prioridades. Asumiendo infinita por defecto."); resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["valor"] = "infinita"; resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["fragmento_texto"] = "Asumida infinita (lógica de selección)."
+                resultado_parcial["errores"].append(adv); trazas.advertencia(adv.removeprefix("Advertencia: "))
+        else: trazas.info("No se pudo determinar la capacidad explícita con prioridades. Asumiendo infinita por defecto."); resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["valor"] = "infinita"; resultado_parcial["parametros_extraidos"]["capacidad_sistema"]["fragmento_texto"] = "Asumida infinita (lógica de selección)."
     return resultado_parcial
 
-def extraer_disciplina_cola(doc_spacy, resultado_parcial):
+def extraer_disciplina_cola(doc_spacy, resultado_parcial, matches=None):
     # ... (código sin cambios)
     if NLP_SPACY is None: resultado_parcial["errores"].append("Modelo spaCy no cargado en extraer_disciplina_cola."); return resultado_parcial
-    matcher = Matcher(NLP_SPACY.vocab); disciplinas_encontradas = []
-    pattern_fifo_sigla = [{"TEXT": "FIFO"}]; pattern_fifo_frase_es = [{"LOWER": "primero"}, {"LOWER": "en"}, {"LOWER": "llegar"}, {"IS_PUNCT": True, "OP": "?"}, {"LOWER": "primero"}, {"LOWER": "en"}, {"LOWER": "ser"}, {"LOWER": "servido"}]; pattern_fifo_frase_es_alt = [{"LOWER": "primero"}, {"LOWER": "que"}, {"LOWER": "llega"}, {"LOWER": "es"}, {"LOWER": "el"}, {"LOWER": "primero"}, {"LOWER": "que"}, {"LOWER": "se"}, {"LOWER": "atiende"}]; pattern_fifo_fcfs = [{"TEXT": "FCFS"}]; pattern_orden_llegada = [{"LOWER": "orden"}, {"LOWER": "de"}, {"LOWER": "llegada"}]; pattern_orden_ingreso = [{"LOWER": "orden"}, {"LOWER": "en"}, {"LOWER": "que"}, {"LEMMA": {"IN": ["ir", "llegar", "ingresar"]}}]
-    pattern_lifo_sigla = [{"TEXT": "LIFO"}]; pattern_lifo_frase_es = [{"LOWER": "último"}, {"LOWER": "en"}, {"LOWER": "llegar"}, {"IS_PUNCT": True, "OP": "?"}, {"LOWER": "primero"}, {"LOWER": "en"}, {"LOWER": "ser"}, {"LOWER": "servido"}]; pattern_lifo_lcfs = [{"TEXT": "LCFS"}]
-    pattern_siro_sigla = [{"TEXT": "SIRO"}]; pattern_siro_frase_es = [{"LOWER": "servicio"}, {"LOWER": "en"}, {"LOWER": "orden"}, {"LOWER": "aleatorio"}]; pattern_siro_random = [{"LOWER": "atención"}, {"LOWER": "aleatoria"}]
-    pattern_prioridad_sigla = [{"TEXT": "PRI"}]; pattern_prioridad_frase = [{"LEMMA": {"IN": ["prioridad", "prioritario"]}}]; pattern_prioridad_clases = [{"LEMMA": {"IN": ["clase", "tipo", "nivel"]}}, {"LOWER": "de", "OP": "?"}, {"LEMMA": "prioridad"}]
-    matcher.add("DISC_FIFO_SIGLA", [pattern_fifo_sigla]); matcher.add("DISC_FIFO_FRASE_ES", [pattern_fifo_frase_es]); matcher.add("DISC_FIFO_FRASE_ES_ALT", [pattern_fifo_frase_es_alt]); matcher.add("DISC_FIFO_FCFS", [pattern_fifo_fcfs]); matcher.add("DISC_ORDEN_LLEGADA", [pattern_orden_llegada]); matcher.add("DISC_ORDEN_INGRESO", [pattern_orden_ingreso])
-    matcher.add("DISC_LIFO_SIGLA", [pattern_lifo_sigla]); matcher.add("DISC_LIFO_FRASE_ES", [pattern_lifo_frase_es]); matcher.add("DISC_LIFO_LCFS", [pattern_lifo_lcfs])
-    matcher.add("DISC_SIRO_SIGLA", [pattern_siro_sigla]); matcher.add("DISC_SIRO_FRASE_ES", [pattern_siro_frase_es]); matcher.add("DISC_SIRO_RANDOM", [pattern_siro_random])
-    matcher.add("DISC_PRIORIDAD_SIGLA", [pattern_prioridad_sigla]); matcher.add("DISC_PRIORIDAD_FRASE", [pattern_prioridad_frase]); matcher.add("DISC_PRIORIDAD_CLASES", [pattern_prioridad_clases])
-    matches = matcher(doc_spacy)
+    disciplinas_encontradas = []
+    if matches is None: matches = ejecutar_matcher("disciplina", doc_spacy)
     for match_id, start, end in matches:
         span = doc_spacy[start:end]; rule_id_str = NLP_SPACY.vocab.strings[match_id]; disciplina_detectada = None
         if "FIFO" in rule_id_str or "FCFS" in rule_id_str or "ORDEN_LLEGADA" in rule_id_str or "ORDEN_INGRESO" in rule_id_str: disciplina_detectada = "FIFO"
@@ -456,63 +1035,179 @@ def extraer_disciplina_cola(doc_spacy, resultado_parcial):
         elif "SIRO" in rule_id_str or "RANDOM" in rule_id_str: disciplina_detectada = "SIRO"
         elif "PRIORIDAD" in rule_id_str: disciplina_detectada = "Prioridad"
         if disciplina_detectada: disciplinas_encontradas.append({"valor": disciplina_detectada, "fragmento": span.sent.text, "span_text": span.text})
-    if not disciplinas_encontradas: print("INFO: No se encontró disciplina de cola explícita. Se establece como no especificado."); resultado_parcial["parametros_extraidos"]["disciplina_cola"]["valor"] = None; resultado_parcial["parametros_extraidos"]["disciplina_cola"]["fragmento_texto"] = None
+    if not disciplinas_encontradas: trazas.info("No se encontró disciplina de cola explícita. Se establece como no especificado."); resultado_parcial["parametros_extraidos"]["disciplina_cola"]["valor"] = None; resultado_parcial["parametros_extraidos"]["disciplina_cola"]["fragmento_texto"] = None
     else:
         chosen_discipline = disciplinas_encontradas[0]; primary_value = chosen_discipline["valor"]; primary_fragment = chosen_discipline["fragmento"]
         resultado_parcial["parametros_extraidos"]["disciplina_cola"]["valor"] = primary_value; resultado_parcial["parametros_extraidos"]["disciplina_cola"]["fragmento_texto"] = primary_fragment
-        print(f"INFO: Disciplina de cola extraída: {primary_value} (Fuente: '{primary_fragment}')")
+        trazas.info(f"Disciplina de cola extraída: {primary_value} (Fuente: '{primary_fragment}')")
         unique_disciplines = set(d["valor"] for d in disciplinas_encontradas)
         if len(unique_disciplines) > 1:
             advertencia = (f"Advertencia: Se encontraron múltiples menciones de disciplinas de cola diferentes. Se utilizó la primera detectada ('{primary_value}' de '{primary_fragment}'). Otras detectadas: {[f'{d["valor"]} (en \"{d["span_text"]}\")' for d in disciplinas_encontradas if d["valor"] != primary_value]}")
-            resultado_parcial["errores"].append(advertencia); print(f"ADVERTENCIA DETALLADA: {advertencia}")
+            resultado_parcial["errores"].append(advertencia); trazas.advertencia(advertencia.removeprefix("Advertencia: "))
     return resultado_parcial
 
+# --- Modo cascada: reglas primero, encoder solo para lo no resuelto ---
+MODO_CASCADA_ACTIVO = os.environ.get("NLP_MODO_CASCADA", "0") == "1"
+CATEGORIA_POR_PATRON_CASCADA = {"CASC_LLEGADA": "llegada", "CASC_SERVICIO": "servicio"}
+PARAMETRO_POR_CATEGORIA_Y_TIPO = {("llegada", "tasa"): "tasa_llegada", ("llegada", "tiempo"): "tiempo_entre_llegadas",
+                                  ("servicio", "tasa"): "tasa_servicio_por_servidor", ("servicio", "tiempo"): "tiempo_servicio_por_servidor"}
+CATEGORIA_POR_PARAMETRO = {parametro: cat for (cat, _), parametro in PARAMETRO_POR_CATEGORIA_Y_TIPO.items()}
+
+def asignar_parametros_por_reglas(doc_spacy, resultado_parcial, matches=None, valores_por_oracion=None):
+    """Asigna tasas/tiempos de llegada y servicio a partir de oraciones que mencionan una sola categoría.
+
+    Una oración se resuelve por reglas si las pistas CASC_* que contiene apuntan a una única categoría y
+    extraer_valor_y_unidad_de_oracion encuentra un valor; las que mencionan ambas (o ninguna) quedan para el encoder.
+    Devuelve ({parámetro: oración}, set de oraciones resueltas).
+    """
+    if matches is None: matches = ejecutar_matcher("cascada", doc_spacy)
+    categorias_por_oracion = {}
+    for match_id, start, _ in matches:
+        categorias_por_oracion.setdefault(doc_spacy[start].sent.text, set()).add(CATEGORIA_POR_PATRON_CASCADA[NLP_SPACY.vocab.strings[match_id]])
+    asignados = {}; oraciones_resueltas = set()
+    for oracion in oraciones_para_similitud(doc_spacy):
+        categorias = categorias_por_oracion.get(oracion, set())
+        if len(categorias) != 1: continue
+        datos_extraidos = extraer_valor_y_unidad_memo(oracion, valores_por_oracion)
+        if not datos_extraidos: continue
+        parametro = PARAMETRO_POR_CATEGORIA_Y_TIPO[(next(iter(categorias)), datos_extraidos["tipo_parametro"])]
+        if parametro in asignados: continue
+        destino = resultado_parcial["parametros_extraidos"][parametro]
+        destino["valor"] = datos_extraidos["valor"]; destino["unidades"] = datos_extraidos["unidad_texto"]; destino["fragmento_texto"] = oracion
+        oracion_min = oracion.lower()
+        if "poisson" in oracion_min: destino["distribucion"] = "Poisson"
+        elif "exponencial" in oracion_min: destino["distribucion"] = "Exponencial"
+        asignados[parametro] = oracion; oraciones_resueltas.add(oracion)
+        trazas.info(f"(Cascada) {parametro} = {datos_extraidos['valor']} {datos_extraidos['unidad_texto']} por reglas (Fuente: '{oracion}')")
+    return asignados, oraciones_resueltas
+
 # --- Función Principal de Extracción ---
-def extraer_parametros_colas(texto_entrada, umbral_similitud_candidatas=0.6, debug_specific_sentence_part=None):
-    if NLP_SPACY is None or MODEL_SENTENCE_TRANSFORMERS is None or \
-        not EMBEDDINGS_FRASES_CLAVE or \
-        EMBEDDINGS_FRASES_CLAVE.get("llegada") is None or \
-        EMBEDDINGS_FRASES_CLAVE.get("servicio") is None:
-        print("Intentando recargar modelos y/o embeddings...")
-        cargar_modelos_y_precalcular_embeddings()
-        if NLP_SPACY is None or MODEL_SENTENCE_TRANSFORMERS is None or \
-            not EMBEDDINGS_FRASES_CLAVE or \
-            EMBEDDINGS_FRASES_CLAVE.get("llegada") is None or \
-            EMBEDDINGS_FRASES_CLAVE.get("servicio") is None:
+def modelos_cargados(requerir_listos=True):
+    if requerir_listos and not MODELOS_LISTOS: return False
+    return NLP_SPACY is not None and MODEL_SENTENCE_TRANSFORMERS is not None and \
+        bool(EMBEDDINGS_FRASES_CLAVE) and \
+        EMBEDDINGS_FRASES_CLAVE.get("llegada") is not None and \
+        EMBEDDINGS_FRASES_CLAVE.get("servicio") is not None
+
+def asegurar_modelos_cargados():
+    """Intenta (re)cargar modelos y embeddings si faltan. Devuelve True si quedaron disponibles."""
+    if modelos_cargados(): return True
+    trazas.info("Intentando recargar modelos y/o embeddings...")
+    cargar_modelos_y_precalcular_embeddings()
+    return modelos_cargados()
+
+def extraer_parametros_colas(texto_entrada, umbral_similitud_candidatas=0.6, debug_specific_sentence_part=None, modo_cascada=None, como_registro=False):
+    """Extrae los parámetros de un texto. Devuelve dicts anidados, o el ResultadoExtraccion si `como_registro`
+    (bastante más liviano si se guardan muchos resultados en memoria)."""
+    if not asegurar_modelos_cargados():
+        res_error = inicializar_estructura_salida()
+        res_error["errores"].append("Fallo crítico al cargar modelos NLP o embeddings de frases clave.")
+        return salida_resultado(res_error, como_registro)
+
+    with trazas.span("extraccion", caracteres=len(texto_entrada)) as span_extraccion:
+        doc_spacy, resultado_parcial = procesar_texto_basico(texto_entrada)
+        if doc_spacy is None: return salida_resultado(resultado_parcial, como_registro)
+        resultado = extraer_parametros_de_doc(doc_spacy, resultado_parcial, umbral_similitud_candidatas, debug_specific_sentence_part, modo_cascada=modo_cascada)
+        span_extraccion.agregar(errores=len(resultado["errores"]), etapa_embeddings=resultado["etapa_embeddings_ejecutada"])
+        return salida_resultado(resultado, como_registro)
+
+def extraer_parametros_colas_en_hilos(textos, n_hilos=4, umbral_similitud_candidatas=0.6, modo_cascada=None, como_registro=False):
+    """extraer_parametros_colas sobre muchos textos con un pool de `n_hilos` hilos; devuelve los resultados en el orden de entrada.
+
+    Los modelos se cargan una sola vez aunque varios hilos los pidan a la vez. spaCy, el Matcher y las reglas corren en
+    paralelo; solo las llamadas al encoder se serializan (ver SERIALIZAR_ENCODER).
+    """
+    if not asegurar_modelos_cargados():
+        return [extraer_parametros_colas(texto, umbral_similitud_candidatas, modo_cascada=modo_cascada, como_registro=como_registro) for texto in textos]
+    with ThreadPoolExecutor(max_workers=max(1, n_hilos), thread_name_prefix="extraccion") as ejecutor:
+        return list(ejecutor.map(lambda texto: extraer_parametros_colas(texto, umbral_similitud_candidatas, modo_cascada=modo_cascada, como_registro=como_registro), textos))
+
+def extraer_parametros_colas_batch(textos, batch_size=32, n_process=1, umbral_similitud_candidatas=0.6, modo_cascada=None, como_registro=False):
+    """Extrae parámetros de muchos textos: generador que produce un resultado por texto, en el orden de entrada.
+
+    Los textos pasan por NLP_SPACY.pipe (n_process > 1 reparte el parseo entre procesos) y se agrupan en lotes de
+    `batch_size` documentos; las oraciones de todo un lote se codifican en una sola llamada al encoder. Solo se
+    mantiene un lote en memoria a la vez, así que `textos` puede ser un iterable arbitrariamente largo.
+    `modo_cascada` (por defecto MODO_CASCADA_ACTIVO) es el de extraer_parametros_de_doc; con cascada no se codifica
+    el lote entero, cada doc codifica solo lo que las reglas no resolvieron.
+    """
+    if modo_cascada is None: modo_cascada = MODO_CASCADA_ACTIVO
+    if not asegurar_modelos_cargados():
+        for _ in textos:
             res_error = inicializar_estructura_salida()
             res_error["errores"].append("Fallo crítico al cargar modelos NLP o embeddings de frases clave.")
-            return res_error
+            yield salida_resultado(res_error, como_registro)
+        return
+    lote_docs = []
+    for doc_spacy in NLP_SPACY.pipe(textos, batch_size=batch_size, n_process=n_process):
+        lote_docs.append(doc_spacy)
+        if len(lote_docs) >= batch_size:
+            for resultado in _extraer_parametros_lote_docs(lote_docs, umbral_similitud_candidatas, batch_size, modo_cascada): yield salida_resultado(resultado, como_registro)
+            lote_docs = []
+    if lote_docs:
+        for resultado in _extraer_parametros_lote_docs(lote_docs, umbral_similitud_candidatas, batch_size, modo_cascada): yield salida_resultado(resultado, como_registro)
 
-    doc_spacy, resultado_parcial = procesar_texto_basico(texto_entrada)
-    if doc_spacy is None: return resultado_parcial
+def _extraer_parametros_lote_docs(docs_spacy, umbral_similitud_candidatas, batch_size, modo_cascada):
+    oraciones_por_doc = [oraciones_para_similitud(doc_spacy) for doc_spacy in docs_spacy]
+    todas_oraciones = [oracion for oraciones in oraciones_por_doc for oracion in oraciones]
+    # En modo cascada cada doc codifica solo sus oraciones no resueltas por reglas (si quedan)
+    embeddings_lote = codificar_oraciones(todas_oraciones, batch_size=max(batch_size, 32)) if todas_oraciones and not modo_cascada else None
+    inicio = 0
+    for doc_spacy, oraciones in zip(docs_spacy, oraciones_por_doc):
+        resultado_parcial = inicializar_estructura_salida(); resultado_parcial["texto_original"] = doc_spacy.text
+        embeddings_doc = embeddings_lote[inicio:inicio + len(oraciones)] if oraciones and embeddings_lote is not None else None
+        inicio += len(oraciones)
+        yield extraer_parametros_de_doc(doc_spacy, resultado_parcial, umbral_similitud_candidatas, embeddings_oraciones=embeddings_doc, modo_cascada=modo_cascada)
 
-    resultado_parcial = extraer_numero_servidores(doc_spacy, resultado_parcial)
-    resultado_parcial = extraer_capacidad_sistema(doc_spacy, resultado_parcial)
-    resultado_parcial = extraer_disciplina_cola(doc_spacy, resultado_parcial)
+def extraer_parametros_de_doc(doc_spacy, resultado_parcial, umbral_similitud_candidatas=0.6, debug_specific_sentence_part=None, embeddings_oraciones=None, modo_cascada=None,
+                              matches_por_familia=None, valores_por_oracion=None, codificar=None):
+    """Reglas (servidores, capacidad, disciplina), oraciones candidatas y asignación de tasas/tiempos sobre un Doc ya parseado.
 
-    oraciones_candidatas = identificar_oraciones_candidatas(doc_spacy, umbral_similitud_candidatas, debug_specific_sentence_part=debug_specific_sentence_part)
+    Con `modo_cascada` (por defecto MODO_CASCADA_ACTIVO) las tasas/tiempos se asignan primero por reglas y el encoder
+    solo se usa si alguna categoría (llegada/servicio) queda sin resolver, sobre las oraciones que las reglas no usaron.
+    "niveles_decision" registra qué etapa ("reglas" o "embeddings") decidió cada tasa/tiempo.
+    `matches_por_familia` (salida de ejecutar_matcher_unificado) y `valores_por_oracion` (memo de
+    extraer_valor_y_unidad_memo) permiten reutilizar trabajo ya hecho, como en SesionExtraccionIncremental; `codificar`
+    reemplaza a codificar_oraciones para las oraciones que llegan a la etapa de embeddings (ver identificar_oraciones_candidatas).
+    """
+    if modo_cascada is None: modo_cascada = MODO_CASCADA_ACTIVO
+    if matches_por_familia is None: matches_por_familia = ejecutar_matcher_unificado(doc_spacy)
+    with trazas.span("reglas.servidores"): resultado_parcial = extraer_numero_servidores(doc_spacy, resultado_parcial, matches=matches_por_familia["servidores"])
+    with trazas.span("reglas.capacidad"): resultado_parcial = extraer_capacidad_sistema(doc_spacy, resultado_parcial, matches=matches_por_familia["capacidad"])
+    with trazas.span("reglas.disciplina"): resultado_parcial = extraer_disciplina_cola(doc_spacy, resultado_parcial, matches=matches_por_familia["disciplina"])
+
+    asignados_por_reglas, oraciones_resueltas = {}, set()
+    if modo_cascada:
+        with trazas.span("cascada") as span_cascada:
+            asignados_por_reglas, oraciones_resueltas = asignar_parametros_por_reglas(doc_spacy, resultado_parcial, matches=matches_por_familia["cascada"], valores_por_oracion=valores_por_oracion)
+            span_cascada.agregar(resueltos=len(asignados_por_reglas))
+    ejecutar_embeddings = not modo_cascada or {CATEGORIA_POR_PARAMETRO[p] for p in asignados_por_reglas} != set(CATEGORIAS_SIMILITUD)
+    if ejecutar_embeddings:
+        oraciones_candidatas = identificar_oraciones_candidatas(doc_spacy, umbral_similitud_candidatas, debug_specific_sentence_part=debug_specific_sentence_part,
+                                                                embeddings_oraciones=None if modo_cascada else embeddings_oraciones, excluir_oraciones=oraciones_resueltas,
+                                                                codificar=codificar)
+    else:
+        oraciones_candidatas = {"llegada": [], "servicio": []}; trazas.info("(Cascada) Llegada y servicio resueltos por reglas; se omite el encoder.")
     resultado_parcial["oraciones_candidatas_debug"] = oraciones_candidatas
+    resultado_parcial["etapa_embeddings_ejecutada"] = ejecutar_embeddings
 
-    print("\n--- Oraciones Candidatas Detectadas (Debug) ---")
-    if oraciones_candidatas.get("llegada"):
-        print("Llegada:")
-        for cand in oraciones_candidatas["llegada"]:
-            print(f"  - Sim: {cand['similitud']:.4f}, Oración: \"{cand['oracion_texto']}\"")
-    if oraciones_candidatas.get("servicio"):
-        print("Servicio:")
-        for cand in oraciones_candidatas["servicio"]:
-            print(f"  - Sim: {cand['similitud']:.4f}, Oración: \"{cand['oracion_texto']}\"")
-    print("--------------------------------------------")
+    if trazas.habilitado("debug"):
+        lineas = ["--- Oraciones Candidatas Detectadas ---"]
+        for cat, etiqueta in (("llegada", "Llegada"), ("servicio", "Servicio")):
+            if oraciones_candidatas.get(cat): lineas += [f"{etiqueta}:"] + [f"  - Sim: {cand['similitud']:.4f}, Oración: \"{cand['oracion_texto']}\"" for cand in oraciones_candidatas[cat]]
+        trazas.debug("\n".join(lineas))
 
     # --- Lógica de Asignación de Tasas/Tiempos (Revertida y Ajustada) ---
-    tasa_llegada_asignada = False
-    tiempo_llegada_asignado = False
-    tasa_servicio_asignada = False
-    tiempo_servicio_asignado = False
+    span_asignacion = trazas.iniciar_span("asignacion", candidatas_llegada=len(oraciones_candidatas["llegada"]), candidatas_servicio=len(oraciones_candidatas["servicio"]))
+    # Parten de lo ya asignado por reglas en modo cascada (todo False fuera de ese modo)
+    tasa_llegada_asignada = "tasa_llegada" in asignados_por_reglas
+    tiempo_llegada_asignado = "tiempo_entre_llegadas" in asignados_por_reglas
+    tasa_servicio_asignada = "tasa_servicio_por_servidor" in asignados_por_reglas
+    tiempo_servicio_asignado = "tiempo_servicio_por_servidor" in asignados_por_reglas
     
     # Usaremos estos para saber qué oración llenó qué, para la lógica de servicio
-    fuente_tasa_llegada = None
-    fuente_tiempo_llegada = None
+    fuente_tasa_llegada = asignados_por_reglas.get("tasa_llegada")
+    fuente_tiempo_llegada = asignados_por_reglas.get("tiempo_entre_llegadas")
 
     # Procesar LLEGADA
     if resultado_parcial["oraciones_candidatas_debug"]["llegada"]:
@@ -523,7 +1218,7 @@ def extraer_parametros_colas(texto_entrada, umbral_similitud_candidatas=0.6, deb
             if tasa_llegada_asignada and tiempo_llegada_asignado:
                 break 
 
-            datos_extraidos_llegada = extraer_valor_y_unidad_de_oracion(oracion_txt_llegada)
+            datos_extraidos_llegada = extraer_valor_y_unidad_memo(oracion_txt_llegada, valores_por_oracion)
             if datos_extraidos_llegada:
                 if datos_extraidos_llegada["tipo_parametro"] == "tasa" and not tasa_llegada_asignada:
                     resultado_parcial["parametros_extraidos"]["tasa_llegada"]["valor"] = datos_extraidos_llegada["valor"]
@@ -570,33 +1265,43 @@ def extraer_parametros_colas(texto_entrada, umbral_similitud_candidatas=0.6, deb
             sim_servicio_actual = cand_info_servicio["similitud"]
             sim_llegada_para_esta_oracion = 0.0
             es_fuente_de_llegada = False
+            cand_llegada_esta_oracion = None
 
             if fuente_tasa_llegada == oracion_txt_servicio or fuente_tiempo_llegada == oracion_txt_servicio:
                 es_fuente_de_llegada = True
                 for cand_llegada in resultado_parcial["oraciones_candidatas_debug"].get("llegada", []):
                     if cand_llegada["oracion_texto"] == oracion_txt_servicio:
                         sim_llegada_para_esta_oracion = cand_llegada["similitud"]
+                        cand_llegada_esta_oracion = cand_llegada
                         break
+            servicio_es_mejor = sim_servicio_actual > sim_llegada_para_esta_oracion
+            # Con top-k disponible, un casi empate se decide por el promedio de las k frases clave más similares
+            if es_fuente_de_llegada and cand_llegada_esta_oracion and abs(sim_servicio_actual - sim_llegada_para_esta_oracion) < MARGEN_EMPATE_TOPK and \
+               cand_info_servicio.get("top_frases_clave") and cand_llegada_esta_oracion.get("top_frases_clave"):
+                promedio_servicio = sum(f["similitud"] for f in cand_info_servicio["top_frases_clave"]) / len(cand_info_servicio["top_frases_clave"])
+                promedio_llegada = sum(f["similitud"] for f in cand_llegada_esta_oracion["top_frases_clave"]) / len(cand_llegada_esta_oracion["top_frases_clave"])
+                servicio_es_mejor = promedio_servicio > promedio_llegada
+                trazas.info(f"Desempate top-k para '{oracion_txt_servicio}': servicio {promedio_servicio:.4f} vs llegada {promedio_llegada:.4f}.")
             
             # Si la oración fue fuente de llegada, solo se considera para servicio si es *claramente* mejor para servicio
-            # (Similitud de servicio > Similitud de llegada). Si no, se omite.
-            if es_fuente_de_llegada and not (sim_servicio_actual > sim_llegada_para_esta_oracion):
+            # (Similitud de servicio > Similitud de llegada, o desempate top-k). Si no, se omite.
+            if es_fuente_de_llegada and not servicio_es_mejor:
                 # print(f"INFO (Servicio Loop): Oración '{oracion_txt_servicio}' (SimS:{sim_servicio_actual:.4f}) usada por llegada (SimL:{sim_llegada_para_esta_oracion:.4f}) y no es mejor para servicio. Omitiendo.")
                 continue
 
-            datos_extraidos_servicio = extraer_valor_y_unidad_de_oracion(oracion_txt_servicio)
+            datos_extraidos_servicio = extraer_valor_y_unidad_memo(oracion_txt_servicio, valores_por_oracion)
             if datos_extraidos_servicio:
                 # Si llegamos aquí, la oración es apta para servicio (o no fue usada por llegada, o es mejor para servicio)
                 
                 # Si la oración ERA fuente de llegada pero ahora se usará para servicio, ANULAR la asignación de llegada
-                if es_fuente_de_llegada and (sim_servicio_actual > sim_llegada_para_esta_oracion):
+                if es_fuente_de_llegada and servicio_es_mejor:
                     if fuente_tasa_llegada == oracion_txt_servicio:
-                        print(f"INFO: Oración '{oracion_txt_servicio}' reasignada de tasa_llegada a servicio.")
-                        resultado_parcial["parametros_extraidos"]["tasa_llegada"] = inicializar_estructura_salida()["parametros_extraidos"]["tasa_llegada"]
+                        trazas.info(f"Oración '{oracion_txt_servicio}' reasignada de tasa_llegada a servicio.")
+                        resultado_parcial["parametros_extraidos"]["tasa_llegada"].reiniciar()
                         tasa_llegada_asignada = False; fuente_tasa_llegada = None
                     if fuente_tiempo_llegada == oracion_txt_servicio:
-                        print(f"INFO: Oración '{oracion_txt_servicio}' reasignada de tiempo_llegada a servicio.")
-                        resultado_parcial["parametros_extraidos"]["tiempo_entre_llegadas"] = inicializar_estructura_salida()["parametros_extraidos"]["tiempo_entre_llegadas"]
+                        trazas.info(f"Oración '{oracion_txt_servicio}' reasignada de tiempo_llegada a servicio.")
+                        resultado_parcial["parametros_extraidos"]["tiempo_entre_llegadas"].reiniciar()
                         tiempo_llegada_asignado = False; fuente_tiempo_llegada = None
 
 
@@ -632,16 +1337,20 @@ def extraer_parametros_colas(texto_entrada, umbral_similitud_candidatas=0.6, deb
         resultado_parcial["parametros_extraidos"]["tasa_servicio_por_servidor"]["distribucion"] = "Poisson"
 
     
-    print("\n--- DEBUG Final Asignación ---") 
-    print(f"Tasa Llegada: {resultado_parcial['parametros_extraidos']['tasa_llegada']}")
-    print(f"Tiempo Llegadas: {resultado_parcial['parametros_extraidos']['tiempo_entre_llegadas']}")
-    print(f"Tasa Servicio: {resultado_parcial['parametros_extraidos']['tasa_servicio_por_servidor']}")
-    print(f"Tiempo Servicio: {resultado_parcial['parametros_extraidos']['tiempo_servicio_por_servidor']}")
-    print("-----------------------------")
+    for parametro in PARAMETRO_POR_CATEGORIA_Y_TIPO.values():
+        if resultado_parcial["parametros_extraidos"][parametro]["valor"] is not None:
+            resultado_parcial["niveles_decision"][parametro] = "reglas" if parametro in asignados_por_reglas else "embeddings"
+
+    span_asignacion.terminar(asignados=len(resultado_parcial["niveles_decision"]))
+    if trazas.habilitado("debug"):
+        trazas.debug("--- Asignación final ---\n" + "\n".join(f"{etiqueta}: {resultado_parcial['parametros_extraidos'][parametro]}" for etiqueta, parametro in
+                     (("Tasa Llegada", "tasa_llegada"), ("Tiempo Llegadas", "tiempo_entre_llegadas"), ("Tasa Servicio", "tasa_servicio_por_servidor"), ("Tiempo Servicio", "tiempo_servicio_por_servidor"))))
 
     return resultado_parcial
 
 if __name__ == "__main__":
+    # La prueba manual muestra las trazas legibles (con el debug) salvo que NLP_TRAZAS indique otro destino
+    if not os.environ.get("NLP_TRAZAS"): trazas.configurar_trazas("texto", nivel="debug")
     cargar_modelos_y_precalcular_embeddings()
 
     textos_prueba_tasas_tiempos = []
@@ -680,6 +1389,12 @@ if __name__ == "__main__":
                 print("\n--- Resultado (JSON) - Archivo Regresión ---")
                 print(json.dumps(info_extraida_regresion, indent=4, ensure_ascii=False))
                 print("--------------------------\n")
+                print("--- Disparos por patrón del Matcher ---")
+                print(json.dumps(obtener_conteo_patrones(), indent=4, ensure_ascii=False))
+                print("--- Cache de embeddings de oraciones ---")
+                print(json.dumps(obtener_estadisticas_cache_embeddings(), indent=4, ensure_ascii=False))
+                print("--- Cache de Docs de spaCy ---")
+                print(json.dumps(obtener_estadisticas_cache_docs(), indent=4, ensure_ascii=False))
         else:
             print(f"Archivo de regresión {ruta_ejemplo} no encontrado o no se pudo crear.")
 
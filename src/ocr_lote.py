@@ -0,0 +1,143 @@
+# src/ocr_lote.py
+# OCR por lotes sin interfaz: preprocesa y reconoce todas las imágenes de un directorio, glob o .zip con un pool de
+# procesos (uno por núcleo). Cada proceso crea su backend de OCR una sola vez (modules/ocr_backends) con
+# OMP_THREAD_LIMIT fijado para que los hilos OpenMP de Tesseract no compitan entre procesos, y se escribe una línea
+# JSONL por imagen (en el orden de entrada) a medida que terminan. Las imágenes ya reconocidas con la misma
+# configuración salen del cache OCR en disco (modules/cache_ocr) sin preprocesar ni llamar a Tesseract.
+#
+# Uso: python src/ocr_lote.py images/ "docs/*.png" dm-ai.zip [--salida ocr.jsonl] [--procesos N] [--backend auto] [--sin-cache]
+# Registro: {"indice", "imagen", "texto", "escala", "ms_preprocesamiento", "ms_ocr", "backend", "cache", "error"}
+
+import io
+import os
+import re
+import sys
+import glob
+import json
+import time
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# --- INICIO: Añadir raíz del proyecto a sys.path ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+# --- FIN ---
+
+from modules.image_preprocessor import ESCALA_OCR, abrir_imagen, elegir_escala, preprocesar_imagen_ocr
+from modules.ocr_backends import PSM_PREDETERMINADO, crear_backend_ocr
+from modules.cache_ocr import CACHE_OCR, ocr_con_cache
+
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+HILOS_OMP_POR_PROCESO = os.environ.get("OCR_HILOS_OMP", "1")
+
+BACKEND_PROCESO = None # backend del proceso trabajador (se crea en el inicializador del pool)
+ERROR_BACKEND_PROCESO = None # si no se pudo crear, cada imagen lo informa en su registro en vez de romper el pool
+USAR_CACHE_PROCESO = True
+
+
+def listar_imagenes(entradas):
+    """
+    Expande directorios, globs y archivos .zip en una lista de imágenes.
+
+    Args:
+        entradas (list): Rutas de directorio, patrones glob, imágenes o .zip.
+
+    Returns:
+        list: [(ruta, miembro_zip o None)] sin duplicados, en orden.
+    """
+    imagenes = []
+    for entrada in entradas:
+        if entrada.lower().endswith(".zip") and os.path.isfile(entrada):
+            with zipfile.ZipFile(entrada) as archivo_zip:
+                imagenes.extend((entrada, miembro) for miembro in sorted(archivo_zip.namelist()) if miembro.lower().endswith(EXTENSIONES_IMAGEN))
+            continue
+        rutas = sorted(glob.glob(os.path.join(entrada, "*"))) if os.path.isdir(entrada) else sorted(glob.glob(entrada))
+        imagenes.extend((ruta, None) for ruta in rutas if ruta.lower().endswith(EXTENSIONES_IMAGEN))
+    return list(dict.fromkeys(imagenes))
+
+def inicializar_trabajador(nombre_backend, lang, psm, hilos_omp, usar_cache=True):
+    global BACKEND_PROCESO, ERROR_BACKEND_PROCESO, USAR_CACHE_PROCESO
+    USAR_CACHE_PROCESO = usar_cache and CACHE_OCR.habilitado
+    os.environ["OMP_THREAD_LIMIT"] = hilos_omp # antes de cargar libtesseract (o de lanzar `tesseract` con pytesseract)
+    try: BACKEND_PROCESO = crear_backend_ocr(nombre_backend, lang=lang, psm=psm)
+    except Exception as e: ERROR_BACKEND_PROCESO = f"{type(e).__name__}: {e}"
+
+def procesar_imagen(tarea):
+    """Preprocesa y reconoce una imagen en el proceso trabajador; los errores quedan en el registro."""
+    indice, (ruta, miembro) = tarea
+    registro = {"indice": indice, "imagen": f"{ruta}::{miembro}" if miembro else ruta, "texto": None, "escala": None,
+                "ms_preprocesamiento": None, "ms_ocr": None, "backend": BACKEND_PROCESO.nombre if BACKEND_PROCESO else None, "cache": False,
+                "error": ERROR_BACKEND_PROCESO}
+    if BACKEND_PROCESO is None: return registro
+    def preprocesar_y_reconocer():
+        inicio = time.perf_counter()
+        gris = abrir_imagen(io.BytesIO(datos)).convert('L')
+        escala = elegir_escala(gris)[0] if ESCALA_OCR == "auto" else ESCALA_OCR
+        imagen_proc = preprocesar_imagen_ocr(gris, escala=escala)
+        registro["escala"] = escala
+        registro["ms_preprocesamiento"] = round((time.perf_counter() - inicio) * 1e3, 2)
+        inicio = time.perf_counter()
+        texto = BACKEND_PROCESO.reconocer(imagen_proc)
+        registro["ms_ocr"] = round((time.perf_counter() - inicio) * 1e3, 2)
+        return texto
+    try:
+        if miembro:
+            with zipfile.ZipFile(ruta) as archivo_zip: datos = archivo_zip.read(miembro)
+        else:
+            with open(ruta, "rb") as f: datos = f.read()
+        if USAR_CACHE_PROCESO:
+            texto, registro["cache"] = ocr_con_cache(datos, preprocesar_y_reconocer, BACKEND_PROCESO.nombre, BACKEND_PROCESO.lang, BACKEND_PROCESO.psm, origen=registro["imagen"])
+        else: texto = preprocesar_y_reconocer()
+        registro["texto"] = re.sub(r'-\n', '', texto) # igual que Paso 1: une palabras cortadas al final de línea
+    except Exception as e: registro["error"] = f"{type(e).__name__}: {e}"
+    return registro
+
+def ocr_en_lote(imagenes, salida, procesos=None, nombre_backend=None, lang="spa", psm=PSM_PREDETERMINADO, hilos_omp=HILOS_OMP_POR_PROCESO, usar_cache=True):
+    """
+    Reconoce `imagenes` con un pool de procesos y escribe un registro JSONL por imagen en `salida`.
+
+    Args:
+        imagenes (list): [(ruta, miembro_zip o None)] como los devuelve listar_imagenes.
+        salida (file): Stream de texto donde se escriben los registros.
+        procesos (int, optional): Tamaño del pool (por defecto, la cantidad de núcleos).
+        nombre_backend (str, optional): Backend de modules/ocr_backends (por defecto OCR_BACKEND).
+        lang (str): Idiomas de Tesseract.
+        psm (int): Modo de segmentación de página.
+        hilos_omp (str): OMP_THREAD_LIMIT de cada proceso.
+        usar_cache (bool): Consultar y llenar el cache OCR en disco (si OCR_CACHE_MB no lo deshabilita).
+
+    Returns:
+        dict: Resumen {"imagenes", "errores", "desde_cache", "segundos", "procesos"}.
+    """
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(imagenes) or 1))
+    inicio, errores, desde_cache = time.perf_counter(), 0, 0
+    with ProcessPoolExecutor(max_workers=procesos, initializer=inicializar_trabajador, initargs=(nombre_backend, lang, psm, str(hilos_omp), usar_cache)) as ejecutor:
+        for registro in ejecutor.map(procesar_imagen, enumerate(imagenes)):
+            errores += registro["error"] is not None; desde_cache += registro["cache"]
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n"); salida.flush()
+    return {"imagenes": len(imagenes), "errores": errores, "desde_cache": desde_cache, "segundos": round(time.perf_counter() - inicio, 3), "procesos": procesos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR por lotes de un directorio, glob o .zip de imágenes (salida JSONL).")
+    parser.add_argument("entradas", nargs="+", help="Directorios, patrones glob (entre comillas), imágenes o archivos .zip.")
+    parser.add_argument("--salida", help="Archivo JSONL de salida (por defecto stdout).")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (por defecto, uno por núcleo).")
+    parser.add_argument("--backend", default=None, help="auto, tesserocr, ctypes o pytesseract (por defecto OCR_BACKEND).")
+    parser.add_argument("--lang", default="spa")
+    parser.add_argument("--psm", type=int, default=PSM_PREDETERMINADO)
+    parser.add_argument("--sin-cache", action="store_true", help="No consulta ni llena el cache OCR en disco.")
+    args = parser.parse_args()
+
+    imagenes = listar_imagenes(args.entradas)
+    if not imagenes: print("ERROR: No se encontraron imágenes en las entradas indicadas.", file=sys.stderr); sys.exit(1)
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else sys.stdout
+    try: resumen = ocr_en_lote(imagenes, salida, args.procesos, args.backend, args.lang, args.psm, usar_cache=not args.sin_cache)
+    finally:
+        if args.salida: salida.close()
+    print(f"INFO: {resumen['imagenes']} imágenes con {resumen['procesos']} procesos en {resumen['segundos']:.2f} s "
+          f"({resumen['imagenes'] / max(resumen['segundos'], 1e-9):.1f} imágenes/s), {resumen['desde_cache']} desde el cache, {resumen['errores']} con error.", file=sys.stderr)
+    sys.exit(1 if resumen["errores"] else 0)
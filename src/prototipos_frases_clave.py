@@ -0,0 +1,117 @@
+# src/prototipos_frases_clave.py
+# Herramienta offline: agrupa los embeddings de las frases clave de llegada/servicio (k-means esférico, similitud
+# coseno) y guarda un conjunto compacto de prototipos por categoría en data/prototipos_frases_clave.npz.
+# En tiempo de ejecución se usan con NLP_PROTOTIPOS_FRASES=1 o nlp_pipeline.activar_prototipos_frases_clave().
+#
+# Uso: python src/prototipos_frases_clave.py [--metodo medoides|centroides] [--n 12 | --fraccion 0.2] [--salida ruta.npz]
+
+import os
+import sys
+import argparse
+import numpy as np
+
+# --- INICIO: Añadir raíz del proyecto a sys.path ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+# --- FIN ---
+
+from src import nlp_pipeline
+
+METODOS_PROTOTIPO = ("medoides", "centroides")
+
+
+def _normalizar_filas(matriz):
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.maximum(normas, 1e-12)
+
+def agrupar_embeddings(embeddings, n_grupos, semilla=0, max_iteraciones=100):
+    """K-means esférico con inicialización k-means++. Devuelve (centroides normalizados [k x dim], asignación por fila)."""
+    x = _normalizar_filas(np.asarray(embeddings, dtype=np.float32))
+    n_grupos = max(1, min(n_grupos, len(x)))
+    rng = np.random.default_rng(semilla)
+    centroides = [x[rng.integers(len(x))]]
+    for _ in range(1, n_grupos):
+        distancia = 1.0 - np.max(x @ np.stack(centroides).T, axis=1)
+        distancia = np.clip(distancia, 0.0, None)
+        probabilidades = distancia / distancia.sum() if distancia.sum() > 0 else None
+        centroides.append(x[rng.choice(len(x), p=probabilidades)])
+    centroides = np.stack(centroides)
+    asignacion = None
+    for _ in range(max_iteraciones):
+        nueva_asignacion = np.argmax(x @ centroides.T, axis=1)
+        if asignacion is not None and np.array_equal(nueva_asignacion, asignacion): break
+        asignacion = nueva_asignacion
+        for g in range(n_grupos):
+            miembros = x[asignacion == g]
+            if len(miembros): centroides[g] = miembros.mean(axis=0)
+        centroides = _normalizar_filas(centroides)
+    return centroides, asignacion
+
+def construir_prototipos_categoria(embeddings, frases, n_prototipos, metodo="medoides", semilla=0):
+    """Prototipos de una categoría: (matriz [k x dim], etiquetas, miembros por prototipo).
+
+    Con "medoides" cada prototipo es la frase real más cercana al centroide de su grupo (su embedding original);
+    con "centroides" es el centroide normalizado, etiquetado con la frase medoide del grupo.
+    """
+    if metodo not in METODOS_PROTOTIPO: raise ValueError(f"Método de prototipo desconocido: '{metodo}'. Opciones: {METODOS_PROTOTIPO}")
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    centroides, asignacion = agrupar_embeddings(embeddings, n_prototipos, semilla=semilla)
+    x = _normalizar_filas(embeddings)
+    prototipos, etiquetas, miembros = [], [], []
+    for g in range(len(centroides)):
+        indices = np.flatnonzero(asignacion == g)
+        if not len(indices): continue
+        medoide = indices[np.argmax(x[indices] @ centroides[g])]
+        prototipos.append(embeddings[medoide] if metodo == "medoides" else centroides[g])
+        etiquetas.append(frases[medoide] if metodo == "medoides" else f"centroide: {frases[medoide]}")
+        miembros.append([frases[i] for i in indices])
+    return np.stack(prototipos).astype(np.float32), etiquetas, miembros
+
+def construir_prototipos(n_prototipos=None, fraccion=None, metodo="medoides", semilla=0):
+    """Prototipos de llegada y servicio a partir de los embeddings de nlp_pipeline (carga los modelos si hace falta).
+
+    El tamaño por categoría es `n_prototipos`, o `fraccion` del número de frases clave de la categoría.
+    Devuelve {cat: (matriz, etiquetas, miembros)} o None si los modelos no se pudieron cargar.
+    """
+    if not nlp_pipeline.asegurar_modelos_cargados(): return None
+    prototipos = {}
+    for cat in nlp_pipeline.CATEGORIAS_SIMILITUD:
+        frases = nlp_pipeline.FRASES_CLAVE_PARAMETROS[cat]
+        tamano = n_prototipos if n_prototipos else max(1, round(len(frases) * (fraccion or 0.2)))
+        embeddings = nlp_pipeline.EMBEDDINGS_FRASES_CLAVE[cat].detach().cpu().numpy()
+        prototipos[cat] = construir_prototipos_categoria(embeddings, frases, tamano, metodo=metodo, semilla=semilla)
+    return prototipos
+
+def guardar_prototipos(prototipos, ruta=None, metodo="medoides"):
+    """Escribe los prototipos en un .npz junto con la clave de las frases clave/modelo con que se generaron."""
+    ruta = ruta or nlp_pipeline.RUTA_PROTOTIPOS_FRASES_CLAVE
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    arreglos = {"clave_frases": np.array(nlp_pipeline.clave_cache_embeddings_frases_clave()), "metodo": np.array(metodo)}
+    for cat, (matriz, etiquetas, _) in prototipos.items():
+        arreglos[cat] = matriz; arreglos[f"{cat}_etiquetas"] = np.array(etiquetas, dtype=str)
+    ruta_tmp = f"{ruta}.{os.getpid()}.tmp.npz"
+    np.savez(ruta_tmp, **arreglos)
+    os.replace(ruta_tmp, ruta)
+    return ruta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera prototipos (centroides o medoides) de las frases clave de llegada/servicio.")
+    parser.add_argument("--metodo", choices=METODOS_PROTOTIPO, default="medoides")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--n", type=int, help="Prototipos por categoría.")
+    grupo.add_argument("--fraccion", type=float, default=0.2, help="Prototipos como fracción de las frases de cada categoría (por defecto 0.2).")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default=None, help=f"Archivo .npz de salida (por defecto {os.path.relpath(nlp_pipeline.RUTA_PROTOTIPOS_FRASES_CLAVE, project_root)}).")
+    parser.add_argument("--detalle", action="store_true", help="Muestra las frases de cada grupo.")
+    args = parser.parse_args()
+
+    prototipos = construir_prototipos(n_prototipos=args.n, fraccion=args.fraccion, metodo=args.metodo, semilla=args.semilla)
+    if prototipos is None: print("ERROR: No se pudieron cargar los modelos NLP."); sys.exit(1)
+    for cat, (matriz, etiquetas, miembros) in prototipos.items():
+        print(f"{cat}: {len(nlp_pipeline.FRASES_CLAVE_PARAMETROS[cat])} frases -> {len(etiquetas)} prototipos ({args.metodo})")
+        if args.detalle:
+            for etiqueta, grupo_frases in zip(etiquetas, miembros): print(f"  - {etiqueta} [{len(grupo_frases)}]: {grupo_frases}")
+    print(f"Prototipos guardados en: {guardar_prototipos(prototipos, args.salida, args.metodo)}")
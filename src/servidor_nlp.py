@@ -0,0 +1,155 @@
+# src/servidor_nlp.py
+# Servidor local de extracción: mantiene cargados spaCy, el SentenceTransformer y los embeddings de frases clave
+# y responde peticiones JSON por HTTP en localhost. Incluye un cliente liviano con la misma firma que
+# extraer_parametros_colas para que la GUI o los scripts por lotes no paguen la carga de modelos en cada ejecución.
+# Cada petición se atiende en su propio hilo (ThreadingHTTPServer); nlp_pipeline serializa solo las llamadas al encoder.
+#
+# Iniciar:   python src/servidor_nlp.py [--host 127.0.0.1] [--puerto 8765]
+# Endpoints: GET /salud | POST /extraer {"texto_entrada", "umbral_similitud_candidatas", "debug_specific_sentence_part", "modo_cascada"}
+#            POST /extraer_lote {"textos", "umbral_similitud_candidatas", "batch_size", "modo_cascada"}
+# "modo_cascada" ausente o null usa el valor por defecto del servidor (NLP_MODO_CASCADA).
+
+import os
+import sys
+import json
+import argparse
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- INICIO: Añadir raíz del proyecto a sys.path ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+# --- FIN ---
+
+from modules import trazas
+from modules.registros_resultado import ResultadoExtraccion
+
+HOST_SERVIDOR_NLP = os.environ.get("NLP_SERVIDOR_HOST", "127.0.0.1")
+PUERTO_SERVIDOR_NLP = int(os.environ.get("NLP_SERVIDOR_PUERTO", "8765"))
+TIMEOUT_CLIENTE_SEGUNDOS = 60
+
+nlp_pipeline = None # Se importa al iniciar el servidor; el cliente no necesita torch ni spaCy
+
+
+class _ManejadorExtraccion(BaseHTTPRequestHandler):
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/salud": self._responder(200, {"estado": "ok", "modelos_cargados": nlp_pipeline.modelos_cargados()})
+        else: self._responder(404, {"error": f"Ruta no encontrada: {self.path}"})
+
+    def do_POST(self):
+        try:
+            longitud = int(self.headers.get("Content-Length", 0))
+            peticion = json.loads(self.rfile.read(longitud).decode("utf-8") or "{}")
+        except (ValueError, UnicodeDecodeError) as e:
+            self._responder(400, {"error": f"JSON inválido: {e}"}); return
+        try:
+            if self.path == "/extraer":
+                resultado = nlp_pipeline.extraer_parametros_colas(
+                    peticion.get("texto_entrada", ""),
+                    umbral_similitud_candidatas=peticion.get("umbral_similitud_candidatas", 0.6),
+                    debug_specific_sentence_part=peticion.get("debug_specific_sentence_part"), modo_cascada=peticion.get("modo_cascada"))
+                self._responder(200, resultado)
+            elif self.path == "/extraer_lote":
+                resultados = list(nlp_pipeline.extraer_parametros_colas_batch(
+                    peticion.get("textos", []), batch_size=peticion.get("batch_size", 32),
+                    umbral_similitud_candidatas=peticion.get("umbral_similitud_candidatas", 0.6), modo_cascada=peticion.get("modo_cascada")))
+                self._responder(200, resultados)
+            else: self._responder(404, {"error": f"Ruta no encontrada: {self.path}"})
+        except Exception as e:
+            trazas.error(f"Error procesando petición {self.path}: {e}")
+            self._responder(500, {"error": str(e)})
+
+    def log_message(self, formato, *args): pass # Evita una línea de log por petición
+
+
+def iniciar_servidor(host=HOST_SERVIDOR_NLP, puerto=PUERTO_SERVIDOR_NLP):
+    global nlp_pipeline
+    from src import nlp_pipeline as modulo_pipeline
+    nlp_pipeline = modulo_pipeline
+    nlp_pipeline.cargar_modelos_y_precalcular_embeddings()
+    if not nlp_pipeline.modelos_cargados():
+        print("ERROR: No se pudieron cargar los modelos NLP. Servidor no iniciado."); return False
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorExtraccion)
+    print(f"INFO: Servidor NLP escuchando en http://{host}:{puerto} (Ctrl+C para detener)")
+    try: servidor.serve_forever()
+    except KeyboardInterrupt: print("\nINFO: Servidor NLP detenido.")
+    finally: servidor.server_close()
+    return True
+
+
+# --- Cliente ---
+def _post_json(ruta, cuerpo, host, puerto, timeout):
+    peticion = urllib.request.Request(f"http://{host}:{puerto}{ruta}", data=json.dumps(cuerpo, ensure_ascii=False).encode("utf-8"),
+                                      headers={"Content-Type": "application/json; charset=utf-8"}, method="POST")
+    with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+        return json.loads(respuesta.read().decode("utf-8"))
+
+def servidor_disponible(host=HOST_SERVIDOR_NLP, puerto=PUERTO_SERVIDOR_NLP, timeout=1):
+    try:
+        with urllib.request.urlopen(f"http://{host}:{puerto}/salud", timeout=timeout) as respuesta:
+            return json.loads(respuesta.read().decode("utf-8")).get("modelos_cargados", False)
+    except (urllib.error.URLError, OSError, ValueError): return False
+
+def _resultado_con_error(mensaje):
+    """Igual que nlp_pipeline.inicializar_estructura_salida() con el error agregado, en forma JSON (sin importar torch ni spaCy)."""
+    resultado = ResultadoExtraccion()
+    resultado["errores"].append(mensaje)
+    return resultado.to_dict()
+
+def _mensaje_error_remoto(e, host, puerto):
+    """Texto del error de una petición: los HTTPError (p. ej. 500 del servidor) traen el error en el cuerpo JSON."""
+    if isinstance(e, urllib.error.HTTPError):
+        try: detalle = json.loads(e.read().decode("utf-8")).get("error", e.reason)
+        except (ValueError, OSError, AttributeError): detalle = e.reason
+        return f"El servidor NLP en {host}:{puerto} respondió {e.code}: {detalle}"
+    return f"Servidor NLP no disponible en {host}:{puerto} ({e})."
+
+def extraer_parametros_colas_remoto(texto_entrada, umbral_similitud_candidatas=0.6, debug_specific_sentence_part=None, modo_cascada=None,
+                                    host=HOST_SERVIDOR_NLP, puerto=PUERTO_SERVIDOR_NLP, respaldo_local=False):
+    """Misma firma y salida que nlp_pipeline.extraer_parametros_colas, resuelta por el servidor residente.
+
+    Si la petición falla devuelve el resultado vacío con el error en "errores" (como extraer_parametros_colas cuando
+    no hay modelos), o ejecuta la extracción en este proceso si `respaldo_local` es True y el servidor no responde.
+    """
+    cuerpo = {"texto_entrada": texto_entrada, "umbral_similitud_candidatas": umbral_similitud_candidatas,
+              "debug_specific_sentence_part": debug_specific_sentence_part, "modo_cascada": modo_cascada}
+    try:
+        return _post_json("/extraer", cuerpo, host, puerto, TIMEOUT_CLIENTE_SEGUNDOS)
+    except urllib.error.HTTPError as e: # el servidor respondió: no tiene sentido repetir la extracción localmente
+        mensaje = _mensaje_error_remoto(e, host, puerto); trazas.advertencia(mensaje)
+        return _resultado_con_error(mensaje)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        mensaje = _mensaje_error_remoto(e, host, puerto); trazas.advertencia(mensaje)
+        if not respaldo_local: return _resultado_con_error(mensaje)
+        trazas.info("Ejecutando extracción local.")
+        from src.nlp_pipeline import extraer_parametros_colas
+        return extraer_parametros_colas(texto_entrada, umbral_similitud_candidatas, debug_specific_sentence_part, modo_cascada=modo_cascada)
+
+def extraer_parametros_colas_lote_remoto(textos, umbral_similitud_candidatas=0.6, batch_size=32, modo_cascada=None, host=HOST_SERVIDOR_NLP, puerto=PUERTO_SERVIDOR_NLP):
+    """Como extraer_parametros_colas_batch pero en el servidor; si la petición falla, un resultado con el error por texto."""
+    textos = list(textos)
+    cuerpo = {"textos": textos, "umbral_similitud_candidatas": umbral_similitud_candidatas, "batch_size": batch_size, "modo_cascada": modo_cascada}
+    try:
+        return _post_json("/extraer_lote", cuerpo, host, puerto, TIMEOUT_CLIENTE_SEGUNDOS * max(1, len(textos) // max(1, batch_size)))
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        mensaje = _mensaje_error_remoto(e, host, puerto); trazas.advertencia(mensaje)
+        return [_resultado_con_error(mensaje) for _ in textos]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de extracción de parámetros de colas.")
+    parser.add_argument("--host", default=HOST_SERVIDOR_NLP)
+    parser.add_argument("--puerto", type=int, default=PUERTO_SERVIDOR_NLP)
+    args = parser.parse_args()
+    sys.exit(0 if iniciar_servidor(args.host, args.puerto) else 1)
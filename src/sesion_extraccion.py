@@ -0,0 +1,131 @@
+# src/sesion_extraccion.py
+# Sesión de extracción incremental: conserva por oración el Doc de spaCy, los matches del Matcher, el embedding y la
+# salida de extraer_valor_y_unidad_de_oracion. Tras una edición (p. ej. la corrección del texto OCR en Paso 2) compara
+# el texto nuevo con las oraciones anteriores, vuelve a parsear solo la zona modificada y repite la asignación final.
+#
+# Uso:
+#   sesion = SesionExtraccionIncremental()
+#   resultado = sesion.actualizar(texto_ocr)
+#   resultado = sesion.actualizar(texto_corregido)   # solo reprocesa las oraciones que cambiaron
+
+import os
+import sys
+import numpy as np
+import torch
+from spacy.tokens import Doc
+
+# --- INICIO: Añadir raíz del proyecto a sys.path ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+# --- FIN ---
+
+from src import nlp_pipeline
+from modules import trazas
+
+
+class SesionExtraccionIncremental:
+    """
+    Mantiene el texto de un ejercicio dividido en fragmentos (una oración de spaCy cada uno) con su trabajo ya hecho.
+
+    Al actualizar, los fragmentos iniciales y finales que siguen apareciendo tal cual se reutilizan; la zona intermedia
+    (más `oraciones_contexto` oraciones a cada lado, por si la edición une o separa oraciones) se vuelve a parsear.
+    El Doc completo se arma con Doc.from_docs y los matches se desplazan según la posición de cada fragmento.
+    En textos muy irregulares la zona reparseada aislada puede segmentarse distinto que el texto completo;
+    un `oraciones_contexto` mayor lo reduce a costa de reparsear más.
+
+    Args:
+        umbral_similitud_candidatas (float): Umbral pasado a extraer_parametros_de_doc.
+        modo_cascada (bool, optional): Igual que en extraer_parametros_colas (None = MODO_CASCADA_ACTIVO).
+        oraciones_contexto (int): Oraciones sin cambios que se vuelven a parsear a cada lado de la zona editada.
+    """
+    def __init__(self, umbral_similitud_candidatas=0.6, modo_cascada=None, oraciones_contexto=1):
+        self.umbral_similitud_candidatas = umbral_similitud_candidatas
+        self.modo_cascada = modo_cascada
+        self.oraciones_contexto = oraciones_contexto
+        self.texto = None
+        self.resultado = None # ResultadoExtraccion de la última actualización
+        self._fragmentos = [] # [{"texto": str con espacios finales, "doc": Doc, "matches": {familia: [(id, start, end)]}}]
+        self._embeddings = {} # {oración: vector float32}
+        self._valores = {} # memo de extraer_valor_y_unidad_memo
+        self.estadisticas = {"actualizaciones": 0, "fragmentos_reutilizados": 0, "fragmentos_reprocesados": 0, "oraciones_codificadas": 0}
+
+    def _crear_fragmentos(self, texto):
+        if not texto: return []
+        doc_zona = nlp_pipeline.NLP_SPACY(texto)
+        fragmentos = []
+        for sent in doc_zona.sents:
+            doc_oracion = sent.as_doc()
+            fragmentos.append({"texto": doc_oracion.text, "doc": doc_oracion, "matches": nlp_pipeline.ejecutar_matcher_unificado(doc_oracion)})
+        return fragmentos
+
+    def _fragmentos_reutilizables(self, texto_nuevo):
+        """Cantidad de fragmentos iniciales y finales que se conservan (descontando las oraciones de contexto)."""
+        textos = [f["texto"] for f in self._fragmentos]
+        n_prefijo, pos = 0, 0
+        while n_prefijo < len(textos) and texto_nuevo.startswith(textos[n_prefijo], pos):
+            pos += len(textos[n_prefijo]); n_prefijo += 1
+        if n_prefijo == len(textos) and pos == len(texto_nuevo): return n_prefijo, 0 # texto sin cambios
+        n_sufijo, fin = 0, len(texto_nuevo)
+        while n_sufijo < len(textos) - n_prefijo and fin - len(textos[-1 - n_sufijo]) >= pos and \
+              texto_nuevo.endswith(textos[-1 - n_sufijo], 0, fin):
+            fin -= len(textos[-1 - n_sufijo]); n_sufijo += 1
+        return max(0, n_prefijo - self.oraciones_contexto), max(0, n_sufijo - self.oraciones_contexto)
+
+    def _codificar(self, oraciones):
+        """Embeddings de las oraciones que llegan a la etapa de similitud (en modo cascada, solo las no resueltas por reglas)."""
+        pendientes = list(dict.fromkeys(o for o in oraciones if o not in self._embeddings))
+        if pendientes:
+            nuevos = nlp_pipeline.codificar_con_encoder(pendientes, convert_to_numpy=True)
+            self._embeddings.update(zip(pendientes, np.asarray(nuevos, dtype=np.float32)))
+            self.estadisticas["oraciones_codificadas"] += len(pendientes)
+        if not oraciones: return None
+        return torch.from_numpy(np.stack([self._embeddings[o] for o in oraciones])).to(nlp_pipeline.MODEL_SENTENCE_TRANSFORMERS.device)
+
+    def actualizar(self, texto_entrada, como_registro=False):
+        """
+        Extrae los parámetros de `texto_entrada` reutilizando lo calculado para el texto anterior.
+
+        Returns:
+            dict | ResultadoExtraccion: Igual que nlp_pipeline.extraer_parametros_colas (el registro si `como_registro`).
+        """
+        if not nlp_pipeline.asegurar_modelos_cargados():
+            res_error = nlp_pipeline.inicializar_estructura_salida()
+            res_error["errores"].append("Fallo crítico al cargar modelos NLP o embeddings de frases clave.")
+            return nlp_pipeline.salida_resultado(res_error, como_registro)
+        if texto_entrada == self.texto and self.resultado is not None: return nlp_pipeline.salida_resultado(self.resultado, como_registro)
+
+        span_sesion = trazas.iniciar_span("sesion.actualizar", caracteres=len(texto_entrada))
+        n_prefijo, n_sufijo = self._fragmentos_reutilizables(texto_entrada) if self._fragmentos else (0, 0)
+        prefijo = self._fragmentos[:n_prefijo]
+        sufijo = self._fragmentos[len(self._fragmentos) - n_sufijo:] if n_sufijo else []
+        inicio_zona = sum(len(f["texto"]) for f in prefijo)
+        fin_zona = len(texto_entrada) - sum(len(f["texto"]) for f in sufijo)
+        nuevos = self._crear_fragmentos(texto_entrada[inicio_zona:fin_zona])
+        self._fragmentos = prefijo + nuevos + sufijo
+        self.texto = texto_entrada
+        self.estadisticas["actualizaciones"] += 1
+        self.estadisticas["fragmentos_reutilizados"] += len(prefijo) + len(sufijo)
+        self.estadisticas["fragmentos_reprocesados"] += len(nuevos)
+
+        # Doc completo y matches desplazados a la posición de cada fragmento
+        docs = [f["doc"] for f in self._fragmentos]
+        doc_spacy = Doc.from_docs(docs, ensure_whitespace=False) if docs else nlp_pipeline.NLP_SPACY("")
+        matches_por_familia = {familia: [] for familia in nlp_pipeline.PATRONES_MATCHER}
+        desplazamiento = 0
+        for fragmento in self._fragmentos:
+            for familia, matches in fragmento["matches"].items():
+                matches_por_familia[familia].extend((match_id, start + desplazamiento, end + desplazamiento) for match_id, start, end in matches)
+            desplazamiento += len(fragmento["doc"])
+
+        oraciones_actuales = set(nlp_pipeline.oraciones_de_doc(doc_spacy))
+        self._embeddings = {o: v for o, v in self._embeddings.items() if o in oraciones_actuales}
+        self._valores = {o: v for o, v in self._valores.items() if o in oraciones_actuales}
+
+        resultado = nlp_pipeline.inicializar_estructura_salida(); resultado["texto_original"] = texto_entrada
+        self.resultado = nlp_pipeline.extraer_parametros_de_doc(doc_spacy, resultado, self.umbral_similitud_candidatas,
+                                                               modo_cascada=self.modo_cascada, matches_por_familia=matches_por_familia,
+                                                               valores_por_oracion=self._valores, codificar=self._codificar)
+        span_sesion.terminar(fragmentos_reutilizados=len(prefijo) + len(sufijo), fragmentos_reprocesados=len(nuevos))
+        return nlp_pipeline.salida_resultado(self.resultado, como_registro)